@@ -0,0 +1,24 @@
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision = '20261019_0900'
+down_revision = '20250920_2046'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'user_plans',
+        sa.Column('user_id', sa.String(), sa.ForeignKey('users.id', ondelete='CASCADE'), primary_key=True),
+        sa.Column('version', sa.Integer(), nullable=False),
+        sa.Column('plan', postgresql.JSON(astext_type=sa.Text()), nullable=False),
+        sa.Column('plan_hash', sa.String(length=64), nullable=False),
+        sa.Column('updated_at', sa.DateTime(timezone=True), nullable=False)
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('user_plans')
@@ -0,0 +1,28 @@
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '20261019_0930'
+down_revision = '20261019_0900'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'user_training_state',
+        sa.Column('user_id', sa.String(), sa.ForeignKey('users.id', ondelete='CASCADE'), primary_key=True),
+        sa.Column('updated_at', sa.DateTime(timezone=True), nullable=False),
+        sa.Column('sessions_count', sa.Integer(), nullable=False),
+        sa.Column('acute_load', sa.Float(), nullable=False),
+        sa.Column('chronic_load', sa.Float(), nullable=False),
+        sa.Column('hrv_count', sa.Integer(), nullable=False),
+        sa.Column('hrv_mean', sa.Float(), nullable=True),
+        sa.Column('hrv_m2', sa.Float(), nullable=False),
+        sa.Column('hr_acute', sa.Float(), nullable=True),
+        sa.Column('hr_chronic', sa.Float(), nullable=True)
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('user_training_state')
@@ -0,0 +1,23 @@
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '20261019_1000'
+down_revision = '20261019_0930'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'personalization_events',
+        sa.Column('user_id', sa.String(), sa.ForeignKey('users.id', ondelete='CASCADE'), primary_key=True),
+        sa.Column('requested_at', sa.DateTime(timezone=True), nullable=False),
+        sa.Column('due_at', sa.DateTime(timezone=True), nullable=False)
+    )
+    op.create_index('ix_personalization_events_due_at', 'personalization_events', ['due_at'])
+
+
+def downgrade() -> None:
+    op.drop_index('ix_personalization_events_due_at', table_name='personalization_events')
+    op.drop_table('personalization_events')
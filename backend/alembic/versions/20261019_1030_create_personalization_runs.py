@@ -0,0 +1,41 @@
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision = '20261019_1030'
+down_revision = '20261019_1000'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'personalization_runs',
+        sa.Column('id', sa.String(), primary_key=True),
+        sa.Column('task', sa.String(), nullable=False),
+        sa.Column('started_at', sa.DateTime(timezone=True), nullable=False),
+        sa.Column('finished_at', sa.DateTime(timezone=True), nullable=True),
+        sa.Column('processed_users', sa.Integer(), nullable=False),
+        sa.Column('successful_updates', sa.Integer(), nullable=False),
+        sa.Column('plans_changed', sa.Integer(), nullable=False)
+    )
+    op.create_index('ix_personalization_runs_started_at', 'personalization_runs', ['started_at'])
+
+    op.create_table(
+        'personalization_run_results',
+        sa.Column('id', sa.Integer(), primary_key=True, autoincrement=True),
+        sa.Column('run_id', sa.String(), sa.ForeignKey('personalization_runs.id', ondelete='CASCADE'), nullable=False),
+        sa.Column('user_id', sa.String(), sa.ForeignKey('users.id', ondelete='CASCADE'), nullable=False),
+        sa.Column('plan_updated', sa.Boolean(), nullable=False),
+        sa.Column('error', sa.String(), nullable=True),
+        sa.Column('analysis', postgresql.JSON(astext_type=sa.Text()), nullable=True)
+    )
+    op.create_index('ix_personalization_run_results_run_id', 'personalization_run_results', ['run_id'])
+
+
+def downgrade() -> None:
+    op.drop_index('ix_personalization_run_results_run_id', table_name='personalization_run_results')
+    op.drop_table('personalization_run_results')
+    op.drop_index('ix_personalization_runs_started_at', table_name='personalization_runs')
+    op.drop_table('personalization_runs')
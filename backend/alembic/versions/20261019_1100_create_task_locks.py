@@ -0,0 +1,21 @@
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '20261019_1100'
+down_revision = '20261019_1030'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'task_locks',
+        sa.Column('name', sa.String(), primary_key=True),
+        sa.Column('owner', sa.String(), nullable=False),
+        sa.Column('expires_at', sa.DateTime(timezone=True), nullable=False)
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('task_locks')
@@ -0,0 +1,49 @@
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '20261019_1130'
+down_revision = '20261019_1100'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column('users', sa.Column('deleted_at', sa.DateTime(timezone=True), nullable=True))
+
+    # Let the database cascade deletes instead of materializing id lists
+    op.drop_constraint('sessions_user_id_fkey', 'sessions', type_='foreignkey')
+    op.create_foreign_key(
+        'sessions_user_id_fkey', 'sessions', 'users', ['user_id'], ['id'], ondelete='CASCADE'
+    )
+    op.drop_constraint('session_metrics_session_id_fkey', 'session_metrics', type_='foreignkey')
+    op.create_foreign_key(
+        'session_metrics_session_id_fkey', 'session_metrics', 'sessions', ['session_id'], ['id'], ondelete='CASCADE'
+    )
+    # Chunked deletes look metrics up by session
+    op.create_index('ix_session_metrics_session_id', 'session_metrics', ['session_id'])
+
+    op.create_table(
+        'account_deletion_jobs',
+        sa.Column('id', sa.String(), primary_key=True),
+        sa.Column('user_id', sa.String(), nullable=False),
+        sa.Column('status', sa.String(), nullable=False),
+        sa.Column('metrics_deleted', sa.Integer(), nullable=False),
+        sa.Column('sessions_deleted', sa.Integer(), nullable=False),
+        sa.Column('error', sa.String(), nullable=True),
+        sa.Column('created_at', sa.DateTime(timezone=True), nullable=False),
+        sa.Column('updated_at', sa.DateTime(timezone=True), nullable=False),
+        sa.Column('finished_at', sa.DateTime(timezone=True), nullable=True)
+    )
+    op.create_index('ix_account_deletion_jobs_user_id', 'account_deletion_jobs', ['user_id'])
+
+
+def downgrade() -> None:
+    op.drop_index('ix_account_deletion_jobs_user_id', table_name='account_deletion_jobs')
+    op.drop_table('account_deletion_jobs')
+    op.drop_index('ix_session_metrics_session_id', table_name='session_metrics')
+    op.drop_constraint('session_metrics_session_id_fkey', 'session_metrics', type_='foreignkey')
+    op.create_foreign_key('session_metrics_session_id_fkey', 'session_metrics', 'sessions', ['session_id'], ['id'])
+    op.drop_constraint('sessions_user_id_fkey', 'sessions', type_='foreignkey')
+    op.create_foreign_key('sessions_user_id_fkey', 'sessions', 'users', ['user_id'], ['id'])
+    op.drop_column('users', 'deleted_at')
@@ -0,0 +1,29 @@
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '20261019_1200'
+down_revision = '20261019_1130'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_index('ix_sessions_user_started', 'sessions', ['user_id', 'started_at'])
+
+    op.create_table(
+        'session_summaries',
+        sa.Column('session_id', sa.String(), sa.ForeignKey('sessions.id', ondelete='CASCADE'), primary_key=True),
+        sa.Column('metric_count', sa.Integer(), nullable=False),
+        sa.Column('total_reps', sa.Integer(), nullable=False),
+        sa.Column('avg_hr', sa.Float(), nullable=True),
+        sa.Column('avg_hrv', sa.Float(), nullable=True),
+        sa.Column('avg_rom', sa.Float(), nullable=True),
+        sa.Column('avg_tempo', sa.Float(), nullable=True),
+        sa.Column('last_metric_at', sa.DateTime(timezone=True), nullable=True)
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('session_summaries')
+    op.drop_index('ix_sessions_user_started', table_name='sessions')
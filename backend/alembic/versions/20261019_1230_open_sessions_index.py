@@ -0,0 +1,19 @@
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '20261019_1230'
+down_revision = '20261019_1200'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_index(
+        'ix_sessions_open', 'sessions', ['started_at'],
+        postgresql_where=sa.text('ended_at IS NULL')
+    )
+
+
+def downgrade() -> None:
+    op.drop_index('ix_sessions_open', table_name='sessions')
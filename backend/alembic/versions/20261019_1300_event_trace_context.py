@@ -0,0 +1,16 @@
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '20261019_1300'
+down_revision = '20261019_1230'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column('personalization_events', sa.Column('trace_context', sa.String(), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column('personalization_events', 'trace_context')
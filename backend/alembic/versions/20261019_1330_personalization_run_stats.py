@@ -0,0 +1,21 @@
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision = '20261019_1330'
+down_revision = '20261019_1300'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column('personalization_runs', sa.Column('duration_seconds', sa.Float(), nullable=True))
+    op.add_column('personalization_runs', sa.Column('users_per_second', sa.Float(), nullable=True))
+    op.add_column('personalization_runs', sa.Column('stats', postgresql.JSON(astext_type=sa.Text()), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column('personalization_runs', 'stats')
+    op.drop_column('personalization_runs', 'users_per_second')
+    op.drop_column('personalization_runs', 'duration_seconds')
@@ -0,0 +1,19 @@
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '20261019_1400'
+down_revision = '20261019_1330'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column('personalization_events', sa.Column('leased_until', sa.DateTime(timezone=True), nullable=True))
+    # Events enqueued before this revision have no slot; full runs and due-event processing still claim them
+    op.add_column('personalization_events', sa.Column('slot', sa.Integer(), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column('personalization_events', 'slot')
+    op.drop_column('personalization_events', 'leased_until')
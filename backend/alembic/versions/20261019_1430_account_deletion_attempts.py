@@ -0,0 +1,19 @@
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '20261019_1430'
+down_revision = '20261019_1400'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column(
+        'account_deletion_jobs',
+        sa.Column('attempts', sa.Integer(), nullable=False, server_default='0')
+    )
+
+
+def downgrade() -> None:
+    op.drop_column('account_deletion_jobs', 'attempts')
@@ -0,0 +1,83 @@
+import logging
+import threading
+import time
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class ActiveSessions:
+    """Registry of live sessions keyed by their last heartbeat.
+
+    Ingest and session start record a heartbeat (wall-clock seconds), session
+    end removes the entry. Entries live in a Redis sorted set when a client is
+    given, so every API process sees the same registry; otherwise in an
+    in-process dict. Registry errors never fail a request.
+    """
+
+    def __init__(self, redis_client=None, key: str = "aicoach:active_sessions"):
+        self.redis = redis_client
+        self.key = key
+        self._beats = {}
+        self._lock = threading.Lock()
+
+    def heartbeat(self, session_id: str, at: float = None):
+        at = time.time() if at is None else at
+        if self.redis is not None:
+            try:
+                self.redis.zadd(self.key, {session_id: at})
+            except Exception:
+                logger.warning("Active sessions: Redis heartbeat failed", exc_info=True)
+            return
+        with self._lock:
+            self._beats[session_id] = max(at, self._beats.get(session_id, at))
+
+    def discard(self, session_ids):
+        session_ids = list(session_ids)
+        if not session_ids:
+            return
+        if self.redis is not None:
+            try:
+                self.redis.zrem(self.key, *session_ids)
+            except Exception:
+                logger.warning("Active sessions: Redis removal failed", exc_info=True)
+            return
+        with self._lock:
+            for session_id in session_ids:
+                self._beats.pop(session_id, None)
+
+    def count(self, window: float, now: float = None):
+        """Sessions with a heartbeat in the last ``window`` seconds, or None if Redis failed"""
+        since = (time.time() if now is None else now) - window
+        if self.redis is not None:
+            try:
+                return self.redis.zcount(self.key, since, "+inf")
+            except Exception:
+                logger.warning("Active sessions: Redis count failed", exc_info=True)
+                return None
+        with self._lock:
+            return sum(1 for at in self._beats.values() if at >= since)
+
+    def prune(self, before: float):
+        """Forget sessions whose last heartbeat is older than ``before``"""
+        if self.redis is not None:
+            try:
+                self.redis.zremrangebyscore(self.key, "-inf", f"({before}")
+            except Exception:
+                logger.warning("Active sessions: Redis prune failed", exc_info=True)
+            return
+        with self._lock:
+            self._beats = {sid: at for sid, at in self._beats.items() if at >= before}
+
+
+def build_active_sessions(settings) -> ActiveSessions:
+    redis_client = None
+    if settings.active_sessions_redis_enabled:
+        import redis
+        redis_client = redis.Redis.from_url(settings.redis_url)
+    return ActiveSessions(redis_client=redis_client)
+
+
+# Process-wide registry
+active_sessions = build_active_sessions(settings)
@@ -0,0 +1,64 @@
+"""Bounded-size views of session timeseries for charting.
+
+``time_bucket`` averages samples into fixed-width time buckets (the portable
+stand-in for TimescaleDB's ``time_bucket``); ``lttb`` keeps the visual shape
+of a series with Largest-Triangle-Three-Buckets.
+"""
+import numpy as np
+
+
+def lttb(x: np.ndarray, y: np.ndarray, n_out: int):
+    """Downsample (x, y) to ``n_out`` points with Largest-Triangle-Three-Buckets.
+
+    ``x`` must be sorted. The first and last points are always kept.
+    """
+    n = len(x)
+    if n_out >= n or n_out < 3:
+        return x, y
+
+    keep = np.empty(n_out, dtype=np.int64)
+    keep[0] = 0
+    keep[-1] = n - 1
+    # Bucket edges over the interior points
+    edges = np.linspace(1, n - 1, n_out - 1).astype(np.int64)
+
+    a = 0
+    for i in range(n_out - 2):
+        start, end = edges[i], edges[i + 1]
+        # Average of the next bucket is the third triangle vertex
+        next_start = end
+        next_end = edges[i + 2] if i + 2 < len(edges) else n
+        avg_x = x[next_start:next_end].mean()
+        avg_y = y[next_start:next_end].mean()
+
+        bx = x[start:end]
+        by = y[start:end]
+        areas = np.abs((x[a] - avg_x) * (by - y[a]) - (x[a] - bx) * (avg_y - y[a]))
+        a = start + int(np.argmax(areas))
+        keep[i + 1] = a
+
+    return x[keep], y[keep]
+
+
+def time_bucket(x: np.ndarray, columns: dict, width: float):
+    """Average each column over buckets of ``width`` seconds aligned to ``x[0]``.
+
+    Returns bucket start times, per-column means (NaN where a bucket has no
+    value for that column) and sample counts per bucket; empty buckets are dropped.
+    """
+    if len(x) == 0:
+        return x, {name: values for name, values in columns.items()}, np.zeros(0, dtype=np.int64)
+
+    origin = x[0]
+    index = ((x - origin) // width).astype(np.int64)
+    buckets, inverse, counts = np.unique(index, return_inverse=True, return_counts=True)
+
+    means = {}
+    for name, values in columns.items():
+        present = ~np.isnan(values)
+        sums = np.bincount(inverse, weights=np.where(present, values, 0.0), minlength=len(buckets))
+        n = np.bincount(inverse, weights=present.astype(np.float64), minlength=len(buckets))
+        with np.errstate(invalid="ignore", divide="ignore"):
+            means[name] = sums / n
+
+    return origin + buckets * width, means, counts
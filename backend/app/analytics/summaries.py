@@ -0,0 +1,116 @@
+"""Per-session aggregates, computed once when a session ends.
+
+They feed the user's rolling workload and are stored in ``session_summaries``
+so session listings never aggregate raw metrics.
+"""
+from sqlalchemy import func, select
+
+from app.db.models import SessionMetric, SessionSummary, dialect_insert
+
+# Session ids per IN list when summarizing many sessions at once
+CHUNK_SIZE = 500
+
+
+def summarize_session(db, session_id: str) -> dict:
+    """Aggregate a session's metrics in a single query"""
+    return summarize_sessions(db, [session_id])[session_id]
+
+
+def summarize_sessions(db, session_ids: list) -> dict:
+    """Summaries of many sessions, one grouped query per chunk of ids.
+
+    Sessions without metrics get an empty summary.
+    """
+    rows = {}
+    for start in range(0, len(session_ids), CHUNK_SIZE):
+        rows.update((row[0], row[1:]) for row in _aggregates(db, session_ids[start:start + CHUNK_SIZE]))
+    empty = (0, None, 0, None, None, None, None, None, None)
+    return {session_id: _summary(rows.get(session_id, empty)) for session_id in session_ids}
+
+
+def _aggregates(db, session_ids: list):
+    """Per-session aggregates, one row per session with metrics.
+
+    HRV M2 (the Welford state ``merge_welford`` combines) is summed from
+    deviations around each session's mean, computed in a grouped subquery;
+    ``sum(x²) - n·mean²`` loses all precision for large, tightly spread values.
+    """
+    in_sessions = SessionMetric.session_id.in_(session_ids)
+    means = select(
+        SessionMetric.session_id, func.avg(SessionMetric.hrv).label("hrv_mean")
+    ).where(in_sessions).group_by(SessionMetric.session_id).subquery()
+    deviation = SessionMetric.hrv - means.c.hrv_mean
+    return db.query(
+        SessionMetric.session_id,
+        func.count(SessionMetric.id),
+        func.sum(SessionMetric.rep),
+        func.count(SessionMetric.hrv),
+        func.avg(SessionMetric.hrv),
+        func.sum(deviation * deviation),
+        func.avg(SessionMetric.hr),
+        func.avg(SessionMetric.rom),
+        func.avg(SessionMetric.tempo),
+        func.max(SessionMetric.t)
+    ).join(means, means.c.session_id == SessionMetric.session_id).filter(in_sessions).group_by(SessionMetric.session_id)
+
+
+def _summary(row) -> dict:
+    metric_count, total_reps, hrv_count, hrv_mean, hrv_m2, avg_hr, avg_rom, avg_tempo, last_metric_at = row
+
+    return {
+        "metric_count": metric_count,
+        "total_reps": int(total_reps or 0),
+        "hrv_count": hrv_count,
+        "hrv_mean": _float(hrv_mean),
+        "hrv_m2": float(hrv_m2 or 0.0),
+        "avg_hr": _float(avg_hr),
+        "avg_rom": _float(avg_rom),
+        "avg_tempo": _float(avg_tempo),
+        "last_metric_at": last_metric_at
+    }
+
+
+def save_session_summary(db, session, summary: dict) -> SessionSummary:
+    """Store the summary of a session that just ended (caller commits)"""
+    row = db.get(SessionSummary, session.id)
+    if row is None:
+        row = SessionSummary(session_id=session.id)
+        db.add(row)
+    row.metric_count = summary["metric_count"]
+    row.total_reps = summary["total_reps"]
+    row.avg_hr = summary["avg_hr"]
+    row.avg_hrv = summary["hrv_mean"]
+    row.avg_rom = summary["avg_rom"]
+    row.avg_tempo = summary["avg_tempo"]
+    row.last_metric_at = summary["last_metric_at"]
+    return row
+
+
+def save_session_summaries(db, summaries: dict):
+    """Upsert ``{session_id: summary}`` in one statement per chunk (caller commits)"""
+    rows = [_summary_row(session_id, summary) for session_id, summary in summaries.items()]
+    insert_ = dialect_insert(db)
+    for start in range(0, len(rows), CHUNK_SIZE):
+        stmt = insert_(SessionSummary.__table__).values(rows[start:start + CHUNK_SIZE])
+        stmt = stmt.on_conflict_do_update(
+            index_elements=["session_id"],
+            set_={name: stmt.excluded[name] for name in rows[0] if name != "session_id"}
+        )
+        db.execute(stmt)
+
+
+def _summary_row(session_id: str, summary: dict) -> dict:
+    return {
+        "session_id": session_id,
+        "metric_count": summary["metric_count"],
+        "total_reps": summary["total_reps"],
+        "avg_hr": summary["avg_hr"],
+        "avg_hrv": summary["hrv_mean"],
+        "avg_rom": summary["avg_rom"],
+        "avg_tempo": summary["avg_tempo"],
+        "last_metric_at": summary["last_metric_at"]
+    }
+
+
+def _float(value):
+    return float(value) if value is not None else None
@@ -0,0 +1,135 @@
+"""Online per-user workload metrics.
+
+Training load is tracked as exponentially decayed sums with 7 day (acute) and
+28 day (chronic) time constants, so the acute:chronic ratio is available
+without rescanning raw metrics. HRV uses Welford's running mean/variance and
+session heart rate uses time-aware exponentially weighted averages.
+"""
+import math
+from datetime import datetime, timezone
+
+from app.analytics.summaries import CHUNK_SIZE, summarize_session
+from app.db.models import UserTrainingState
+
+ACUTE_DAYS = 7
+CHRONIC_DAYS = 28
+
+
+def as_utc(dt: datetime) -> datetime:
+    """SQLite returns naive datetimes; treat them as UTC"""
+    return dt.replace(tzinfo=timezone.utc) if dt.tzinfo is None else dt
+
+
+def decay(value: float, elapsed_days: float, span_days: float) -> float:
+    return value * math.exp(-max(elapsed_days, 0.0) / span_days)
+
+
+def ewma(current, sample, elapsed_days: float, span_days: float):
+    """Time-aware EWMA: older estimates lose weight with the gap since the last sample"""
+    if current is None:
+        return sample
+    alpha = 1.0 - math.exp(-max(elapsed_days, 0.0) / span_days)
+    return current + alpha * (sample - current)
+
+
+def merge_welford(count: int, mean, m2: float, b_count: int, b_mean, b_m2: float):
+    """Combine two (count, mean, M2) summaries (Chan et al. parallel update)"""
+    if b_count == 0:
+        return count, mean, m2
+    if count == 0:
+        return b_count, b_mean, b_m2
+    total = count + b_count
+    delta = b_mean - mean
+    mean = mean + delta * b_count / total
+    m2 = m2 + b_m2 + delta * delta * count * b_count / total
+    return total, mean, m2
+
+
+def apply_session(state: UserTrainingState, summary: dict, at: datetime):
+    """Fold one finished session into the user's state.
+
+    A session older than the state (e.g. a crashed session closed later with
+    its last metric time) leaves the state's clock where it is; its load is
+    decayed by how much older it is instead, and it does not move the EWMAs.
+    """
+    elapsed = 0.0
+    if state.updated_at is not None:
+        elapsed = (at - as_utc(state.updated_at)).total_seconds() / 86400
+
+    load = summary["total_reps"]
+    state.acute_load = decay(state.acute_load or 0.0, elapsed, ACUTE_DAYS) + decay(load, -elapsed, ACUTE_DAYS)
+    state.chronic_load = decay(state.chronic_load or 0.0, elapsed, CHRONIC_DAYS) + decay(load, -elapsed, CHRONIC_DAYS)
+
+    state.hrv_count, state.hrv_mean, state.hrv_m2 = merge_welford(
+        state.hrv_count or 0, state.hrv_mean, state.hrv_m2 or 0.0,
+        summary["hrv_count"], summary["hrv_mean"], summary["hrv_m2"]
+    )
+
+    if summary["avg_hr"] is not None:
+        state.hr_acute = ewma(state.hr_acute, summary["avg_hr"], elapsed, ACUTE_DAYS)
+        state.hr_chronic = ewma(state.hr_chronic, summary["avg_hr"], elapsed, CHRONIC_DAYS)
+
+    state.sessions_count = (state.sessions_count or 0) + 1
+    if elapsed >= 0:
+        state.updated_at = at
+
+
+def record_session_workload(db, session, summary: dict = None):
+    """Update the owner's training state for a session that just ended (caller commits)"""
+    if summary is None:
+        summary = summarize_session(db, session.id)
+    state = db.get(UserTrainingState, session.user_id)
+    if state is None:
+        state = UserTrainingState(user_id=session.user_id)
+        db.add(state)
+    apply_session(state, summary, as_utc(session.ended_at))
+    return state
+
+
+def record_sessions_workload(db, sessions, summaries: dict) -> dict:
+    """``record_session_workload`` for many ended sessions (caller commits).
+
+    ``sessions`` are rows with ``id``, ``user_id`` and ``ended_at``, and
+    ``summaries`` maps their ids to summaries. Training states are loaded
+    in one query per chunk of users and the sessions are applied in
+    ``ended_at`` order. Returns the states by user id.
+    """
+    sessions = sorted(sessions, key=lambda s: as_utc(s.ended_at))
+    user_ids = list({s.user_id for s in sessions})
+    states = {}
+    for start in range(0, len(user_ids), CHUNK_SIZE):
+        chunk = user_ids[start:start + CHUNK_SIZE]
+        states.update(
+            (state.user_id, state)
+            for state in db.query(UserTrainingState).filter(UserTrainingState.user_id.in_(chunk))
+        )
+    for s in sessions:
+        state = states.get(s.user_id)
+        if state is None:
+            state = states[s.user_id] = UserTrainingState(user_id=s.user_id)
+            db.add(state)
+        apply_session(state, summaries[s.id], as_utc(s.ended_at))
+    return states
+
+
+def workload_snapshot(state: UserTrainingState, now: datetime) -> dict:
+    """Rolling metrics as of ``now``, with loads decayed since the last session"""
+    elapsed = (now - as_utc(state.updated_at)).total_seconds() / 86400
+    acute = decay(state.acute_load, elapsed, ACUTE_DAYS) / ACUTE_DAYS
+    chronic = decay(state.chronic_load, elapsed, CHRONIC_DAYS) / CHRONIC_DAYS
+
+    hrv_sd = None
+    if state.hrv_count > 1:
+        hrv_sd = math.sqrt(state.hrv_m2 / (state.hrv_count - 1))
+    hr_trend = None
+    if state.hr_acute is not None and state.hr_chronic is not None:
+        hr_trend = state.hr_acute - state.hr_chronic
+
+    return {
+        "acute_load": acute,
+        "chronic_load": chronic,
+        "acute_chronic_ratio": acute / chronic if chronic > 0 else None,
+        "hrv_long_term_mean": state.hrv_mean,
+        "hrv_long_term_sd": hrv_sd,
+        "hr_trend": hr_trend
+    }
@@ -1,33 +1,88 @@
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session as SASession
-from app.db.models import User, Session, SessionMetric, get_db
-from ..schemas import AccountDeleteRequest, AccountDeleteResponse
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Query
+from fastapi.responses import StreamingResponse
+from datetime import datetime, timezone
+from sqlalchemy.orm import Session as SASession, sessionmaker
+from app.config import settings
+from app.db.models import User, AccountDeletionJob, get_db
+from app.exports import csv_chunks, gzip_chunks, ndjson_chunks, stream_history
+from app.workers.accounts import purge_account
+from ..schemas import AccountDeleteRequest, AccountDeleteResponse, AccountDeletionStatusResponse
 
 router = APIRouter(prefix="/v1/account", tags=["accounts"])
 
 @router.post("/delete", response_model=AccountDeleteResponse)
-def delete_account(payload: AccountDeleteRequest, db: SASession = Depends(get_db)):
+def delete_account(payload: AccountDeleteRequest, background_tasks: BackgroundTasks, db: SASession = Depends(get_db)):
     # Find user
     user = db.query(User).filter(User.id == payload.user_id).first()
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     
-    # Delete all user's session metrics
-    user_sessions = db.query(Session).filter(Session.user_id == user.id).all()
-    session_ids = [s.id for s in user_sessions]
+    # Deletion already requested: report the existing job
+    job = None
+    if user.deleted_at is not None:
+        job = db.query(AccountDeletionJob).filter(
+            AccountDeletionJob.user_id == user.id
+        ).order_by(AccountDeletionJob.created_at.desc()).first()
     
-    if session_ids:
-        db.query(SessionMetric).filter(SessionMetric.session_id.in_(session_ids)).delete(synchronize_session=False)
-    
-    # Delete all user's sessions
-    db.query(Session).filter(Session.user_id == user.id).delete(synchronize_session=False)
-    
-    # Delete user
-    db.delete(user)
-    db.commit()
+    if job is None:
+        # Tombstone immediately; the data is purged in bounded chunks afterwards
+        now = datetime.now(timezone.utc)
+        user.deleted_at = now
+        job = AccountDeletionJob(user_id=user.id, status="pending", created_at=now, updated_at=now)
+        db.add(job)
+        db.commit()
+        background_tasks.add_task(purge_account, job.id, sessionmaker(bind=db.get_bind()))
     
     return AccountDeleteResponse(
         user_id=payload.user_id,
         deleted=True,
-        message="Account and all associated data deleted successfully"
+        message="Account deletion scheduled successfully; data is being removed",
+        job_id=job.id,
+        status=job.status
+    )
+
+@router.get("/delete/{job_id}", response_model=AccountDeletionStatusResponse)
+def get_deletion_status(job_id: str, db: SASession = Depends(get_db)):
+    job = db.get(AccountDeletionJob, job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Deletion job not found")
+    
+    return AccountDeletionStatusResponse(
+        job_id=job.id,
+        user_id=job.user_id,
+        status=job.status,
+        metrics_deleted=job.metrics_deleted,
+        sessions_deleted=job.sessions_deleted,
+        attempts=job.attempts,
+        error=job.error,
+        created_at=job.created_at,
+        finished_at=job.finished_at
     )
+
+EXPORT_FORMATS = {
+    "ndjson": (ndjson_chunks, "application/x-ndjson"),
+    "csv": (csv_chunks, "text/csv"),
+}
+
+@router.get("/export")
+def export_account(
+    user_id: str,
+    format: str = Query("ndjson", pattern="^(ndjson|csv)$"),
+    gzip: bool = False,
+    db: SASession = Depends(get_db)
+):
+    """Stream the user's sessions and metrics as NDJSON or CSV, optionally gzip-encoded"""
+    user = db.get(User, user_id)
+    if not user:
+        raise HTTPException(status_code=404, detail="User not found")
+    if user.deleted_at is not None:
+        raise HTTPException(status_code=410, detail="Account is being deleted")
+    
+    encode, media_type = EXPORT_FORMATS[format]
+    # The stream reads on its own connection; the request session closes before it ends
+    body = encode(stream_history(db.get_bind(), user_id, settings.account_export_chunk_size))
+    headers = {"Content-Disposition": f'attachment; filename="{user_id}-export.{format}"'}
+    if gzip:
+        body = gzip_chunks(body)
+        headers["Content-Encoding"] = "gzip"
+    return StreamingResponse(body, media_type=media_type, headers=headers)
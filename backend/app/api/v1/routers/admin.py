@@ -0,0 +1,168 @@
+import hmac
+from datetime import datetime
+from typing import Optional
+from fastapi import APIRouter, Depends, Header, HTTPException, Query
+from fastapi.responses import PlainTextResponse
+from sqlalchemy.orm import Session as SASession
+from app.config import settings
+from app.db.models import PersonalizationRun, PersonalizationRunResult, get_db
+from app.observability.profiling import profiles
+from app.observability.tracing import spans
+from ..schemas import (
+    PersonalizationRunSummary, PersonalizationRunListResponse, PersonalizationRunResultItem,
+    PersonalizationRunResultsResponse,
+    ProfilingSettings, ProfilingStatusResponse, TraceSpan, TraceSummary, TraceListResponse, TraceResponse
+)
+
+
+def require_admin(x_admin_token: Optional[str] = Header(None)):
+    """Allow admin calls only with debug or the configured admin token.
+
+    Reads need it as much as writes: run results hold per-user analyses,
+    traces hold SQL text and paths with user ids, profiles hold stacks.
+    """
+    if settings.debug:
+        return
+    if not settings.admin_token or not x_admin_token or not hmac.compare_digest(
+        x_admin_token.encode(), settings.admin_token.encode()
+    ):
+        raise HTTPException(status_code=403, detail="Admin token required")
+
+
+router = APIRouter(prefix="/v1/admin", tags=["admin"], dependencies=[Depends(require_admin)])
+
+
+def _run_summary(run: PersonalizationRun) -> PersonalizationRunSummary:
+    return PersonalizationRunSummary(
+        id=run.id,
+        task=run.task,
+        started_at=run.started_at,
+        finished_at=run.finished_at,
+        processed_users=run.processed_users,
+        successful_updates=run.successful_updates,
+        plans_changed=run.plans_changed,
+        duration_seconds=run.duration_seconds,
+        users_per_second=run.users_per_second,
+        stats=run.stats
+    )
+
+
+@router.get("/personalization/runs", response_model=PersonalizationRunListResponse)
+def list_runs(
+    task: Optional[str] = None,
+    before: Optional[datetime] = None,
+    limit: int = Query(50, ge=1, le=500),
+    db: SASession = Depends(get_db)
+):
+    """Runs newest first with their timings; ``task`` matches by prefix, so slot runs are included"""
+    query = db.query(PersonalizationRun)
+    if task:
+        query = query.filter(PersonalizationRun.task.startswith(task, autoescape=True))
+    if before is not None:
+        query = query.filter(PersonalizationRun.started_at < before)
+    
+    # Keyset pagination on the start time
+    runs = query.order_by(PersonalizationRun.started_at.desc()).limit(limit + 1).all()
+    has_more = len(runs) > limit
+    runs = runs[:limit]
+    return PersonalizationRunListResponse(
+        items=[_run_summary(run) for run in runs],
+        next_cursor=runs[-1].started_at if has_more else None
+    )
+
+
+@router.get("/personalization/runs/{run_id}/results", response_model=PersonalizationRunResultsResponse)
+def get_run_results(
+    run_id: str,
+    after: int = 0,
+    limit: int = Query(100, ge=1, le=1000),
+    db: SASession = Depends(get_db)
+):
+    run = db.get(PersonalizationRun, run_id)
+    if not run:
+        raise HTTPException(status_code=404, detail="Run not found")
+    
+    # Keyset pagination on the result id
+    rows = db.query(PersonalizationRunResult).filter(
+        PersonalizationRunResult.run_id == run_id,
+        PersonalizationRunResult.id > after
+    ).order_by(PersonalizationRunResult.id).limit(limit + 1).all()
+    
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    return PersonalizationRunResultsResponse(
+        run=_run_summary(run),
+        items=[
+            PersonalizationRunResultItem(
+                id=r.id,
+                user_id=r.user_id,
+                plan_updated=r.plan_updated,
+                error=r.error,
+                analysis=r.analysis
+            )
+            for r in rows
+        ],
+        next_cursor=rows[-1].id if has_more else None
+    )
+
+
+def _profiling_status() -> ProfilingStatusResponse:
+    return ProfilingStatusResponse(
+        enabled=settings.profiling_enabled,
+        sample_rate=settings.profile_sample_rate,
+        interval_ms=settings.profile_interval_ms,
+        profiles=profiles.profiles,
+        distinct_stacks=len(profiles.stacks)
+    )
+
+
+@router.get("/profiling", response_model=ProfilingStatusResponse)
+def get_profiling():
+    return _profiling_status()
+
+
+@router.put("/profiling", response_model=ProfilingStatusResponse)
+def set_profiling(payload: ProfilingSettings):
+    """Toggle profiling for this process at runtime"""
+    settings.profiling_enabled = payload.enabled
+    settings.profile_sample_rate = payload.sample_rate
+    settings.profile_interval_ms = payload.interval_ms
+    return _profiling_status()
+
+
+@router.get("/profiling/flamegraph", response_class=PlainTextResponse)
+def get_flamegraph():
+    """Collapsed stacks aggregated over all profiles (flamegraph.pl / speedscope input)"""
+    return PlainTextResponse(profiles.collapsed())
+
+
+@router.delete("/profiling/flamegraph", response_model=ProfilingStatusResponse)
+def reset_flamegraph():
+    profiles.reset()
+    return _profiling_status()
+
+
+@router.get("/traces", response_model=TraceListResponse)
+def list_traces(limit: int = Query(50, ge=1, le=500)):
+    """Most recent traces in this process's span buffer"""
+    items = []
+    for group in spans.recent_traces(limit):
+        # The root is the span whose parent is not in the buffer (a remote parent or none)
+        ids = {s["span_id"] for s in group}
+        root = next((s for s in group if s["parent_id"] not in ids), group[0])
+        items.append(TraceSummary(
+            trace_id=root["trace_id"],
+            root=root["name"],
+            start=root["start"],
+            duration_ms=root["duration_ms"],
+            span_count=len(group)
+        ))
+    return TraceListResponse(items=items)
+
+
+@router.get("/traces/{trace_id}", response_model=TraceResponse)
+def get_trace(trace_id: str):
+    group = spans.trace(trace_id)
+    if not group:
+        raise HTTPException(status_code=404, detail="Trace not found")
+    return TraceResponse(trace_id=trace_id, spans=[TraceSpan(**s) for s in group])
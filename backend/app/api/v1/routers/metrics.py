@@ -1,12 +1,17 @@
 from fastapi import APIRouter, Depends
 from sqlalchemy.orm import Session as SASession
+from app.active_sessions import active_sessions
 from app.api.v1.schemas import MetricsBatchRequest, MetricsBatchResponse
 from app.db.models import SessionMetric, get_db
+from app.observability import tracing
+from app.observability.metrics import METRIC_BATCH_SIZE, METRIC_ROWS_INGESTED
 
 router = APIRouter(prefix="/v1/metrics", tags=["metrics"])
 
 @router.post("/batch", response_model=MetricsBatchResponse)
+@tracing.traced("metrics.ingest_batch")
 def ingest_batch(payload: MetricsBatchRequest, db: SASession = Depends(get_db)):
+    # Body validation happened before this span starts, inside the request span
     rows = []
     for m in payload.metrics:
         rows.append(
@@ -24,4 +29,7 @@ def ingest_batch(payload: MetricsBatchRequest, db: SASession = Depends(get_db)):
     if rows:
         db.add_all(rows)
         db.commit()
+        active_sessions.heartbeat(payload.session_id)
+    METRIC_ROWS_INGESTED.inc(len(rows))
+    METRIC_BATCH_SIZE.observe(len(rows))
     return MetricsBatchResponse(accepted=len(rows))
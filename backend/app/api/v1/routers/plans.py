@@ -1,12 +1,49 @@
-from fastapi import APIRouter
+from fastapi import APIRouter, Depends
 from datetime import datetime, timezone
+from typing import Optional
+from sqlalchemy.orm import Session as SASession
+from app.cache import plan_cache
+from app.db.models import UserPlan, get_db
 from ..schemas import PlanItem, PlanTodayResponse
 
 router = APIRouter(prefix="/v1/plans", tags=["plans"])
 
+
+def load_plan(db: SASession, user_id: str):
+    """Load the latest stored plan in its cached form (single primary-key lookup)"""
+    stored = db.get(UserPlan, user_id)
+    if stored is None:
+        return None
+    return {
+        "version": stored.version,
+        "plan": stored.plan,
+        "updated_at": stored.updated_at.isoformat()
+    }
+
+
 @router.get("/today", response_model=PlanTodayResponse)
-def get_today_plan():
+def get_today_plan(user_id: Optional[str] = None, db: SASession = Depends(get_db)):
     today = datetime.now(timezone.utc)
-    return PlanTodayResponse(items=[
-        PlanItem(date=today, workout="squat", intensity=1.0)
-    ])
+    
+    cached = plan_cache.get(user_id, lambda: load_plan(db, user_id)) if user_id else None
+    if cached is None:
+        return PlanTodayResponse(items=[
+            PlanItem(date=today, workout="squat", intensity=1.0)
+        ])
+    
+    plan = cached["plan"]
+    return PlanTodayResponse(
+        items=[
+            PlanItem(
+                date=today,
+                workout="squat",
+                intensity=plan["intensity"],
+                focus_areas=plan.get("focus_areas"),
+                recommended_reps=plan.get("recommended_reps"),
+                rest_periods=plan.get("rest_periods"),
+                notes=plan.get("notes")
+            )
+        ],
+        version=cached["version"],
+        updated_at=cached["updated_at"]
+    )
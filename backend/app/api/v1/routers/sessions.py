@@ -1,23 +1,60 @@
-from fastapi import APIRouter, Depends
-from datetime import datetime, timezone
+from fastapi import APIRouter, Depends, HTTPException, Query
+from datetime import datetime, timezone, timedelta
+from typing import Optional
 import uuid
-from app.db.models import Session, User, get_db
+import numpy as np
+from app.active_sessions import active_sessions
+from app.analytics.downsample import lttb, time_bucket
+from app.analytics.summaries import save_session_summary, summarize_session
+from app.analytics.workload import as_utc, record_session_workload
+from app.workers.events import enqueue_repersonalization
+from app.config import settings
+from app.db.models import Session, SessionMetric, User, dialect_insert, get_db
+from sqlalchemy import DateTime, exists, func, insert, literal, select
 from sqlalchemy.orm import Session as SASession
-from ..schemas import SessionStartRequest, SessionStartResponse, SessionEndRequest, SessionEndResponse
+from ..schemas import (
+    SessionStartRequest, SessionStartResponse, SessionEndRequest, SessionEndResponse,
+    MetricPoint, SessionMetricsSeriesResponse, ActiveSessionsResponse
+)
 
 router = APIRouter(prefix="/v1/sessions", tags=["sessions"])
 
+def start_session_statements(db: SASession, user_id: str, session_id: str, now: datetime) -> list:
+    """Statements that create the user if needed and insert the session.
+    
+    The session insert skips tombstoned users and RETURNs the new row. On
+    Postgres the user upsert rides along as a data-modifying CTE, so the whole
+    start is one statement; SQLite runs the two statements back to back.
+    """
+    new_user = dialect_insert(db)(User.__table__).values(id=user_id).on_conflict_do_nothing(
+        index_elements=["id"]
+    )
+    tombstoned = exists().where(User.id == user_id, User.deleted_at.isnot(None))
+    new_session = insert(Session.__table__).from_select(
+        ["id", "user_id", "started_at"],
+        select(
+            literal(session_id),
+            literal(user_id),
+            literal(now, DateTime(timezone=True))
+        ).where(~tombstoned)
+    ).returning(Session.__table__.c.id)
+    
+    if db.get_bind().dialect.name == "postgresql":
+        return [new_session.add_cte(new_user.cte("new_user"))]
+    return [new_user, new_session]
+
 @router.post("/start", response_model=SessionStartResponse)
 def start_session(payload: SessionStartRequest, db: SASession = Depends(get_db)):
-    user = db.query(User).filter(User.id == payload.user_id).first()
-    if not user:
-        user = User(id=payload.user_id)
-        db.add(user)
     now = datetime.now(timezone.utc)
-    s = Session(id=str(uuid.uuid4()), user_id=user.id, started_at=now)
-    db.add(s)
+    session_id = str(uuid.uuid4())
+    for stmt in start_session_statements(db, payload.user_id, session_id, now):
+        result = db.execute(stmt)
+    created = result.first()
     db.commit()
-    return SessionStartResponse(session_id=s.id, started_at=now)
+    if created is None:
+        raise HTTPException(status_code=410, detail="Account is being deleted")
+    active_sessions.heartbeat(session_id, now.timestamp())
+    return SessionStartResponse(session_id=session_id, started_at=now)
 
 @router.post("/end", response_model=SessionEndResponse)
 def end_session(payload: SessionEndRequest, db: SASession = Depends(get_db)):
@@ -25,5 +62,125 @@ def end_session(payload: SessionEndRequest, db: SASession = Depends(get_db)):
     now = datetime.now(timezone.utc)
     if s and s.ended_at is None:
         s.ended_at = now
+        summary = summarize_session(db, s.id)
+        save_session_summary(db, s, summary)
+        record_session_workload(db, s, summary)
+        enqueue_repersonalization(db, s.user_id, now)
         db.commit()
+    active_sessions.discard([payload.session_id])
     return SessionEndResponse(session_id=payload.session_id, ended_at=now)
+
+@router.get("/active", response_model=ActiveSessionsResponse)
+def count_active_sessions(db: SASession = Depends(get_db)):
+    """Sessions with a heartbeat within the stale window.
+    
+    Served from the registry without a database query. If the registry
+    is unavailable, open sessions are counted instead (the sweeper keeps
+    that close, and the partial index on open sessions keeps it cheap).
+    """
+    window = settings.session_stale_after_seconds
+    count = active_sessions.count(window)
+    if count is None:
+        count = db.query(func.count(Session.id)).filter(Session.ended_at.is_(None)).scalar()
+    return ActiveSessionsResponse(active_sessions=count, window_seconds=window)
+
+
+SERIES_FIELDS = ("hr", "rom", "tempo")
+
+
+def _series(times, values: dict) -> dict:
+    return {
+        name: [
+            MetricPoint(t=datetime.fromtimestamp(t, timezone.utc), value=float(v))
+            for t, v in zip(times[name] if isinstance(times, dict) else times, column)
+            if not np.isnan(v)
+        ]
+        for name, column in values.items()
+    }
+
+
+def _bucket_floor(span: float, points: int) -> float:
+    """Narrowest bucket that still yields at most ``points`` buckets over ``span`` seconds"""
+    return span / (points - 1) if span > 0 else 0.0
+
+
+def _timescale_buckets(db: SASession, session_id: str, width: float, points: int):
+    """Bucket in the database with TimescaleDB's time_bucket(), aligned to the first metric"""
+    first, last = db.execute(
+        select(func.min(SessionMetric.t), func.max(SessionMetric.t)).where(SessionMetric.session_id == session_id)
+    ).one()
+    if first is not None:
+        width = max(width, _bucket_floor((last - first).total_seconds(), points))
+    bucket = func.time_bucket(timedelta(seconds=width), SessionMetric.t, first).label("bucket")
+    rows = db.execute(
+        select(bucket, func.count(), *[func.avg(getattr(SessionMetric, f)) for f in SERIES_FIELDS])
+        .where(SessionMetric.session_id == session_id)
+        .group_by(bucket)
+        .order_by(bucket)
+    ).all()
+    times = np.array([as_utc(r[0]).timestamp() for r in rows], dtype=np.float64)
+    values = {
+        f: np.array([np.nan if r[i + 2] is None else r[i + 2] for r in rows], dtype=np.float64)
+        for i, f in enumerate(SERIES_FIELDS)
+    }
+    return times, values, int(sum(r[1] for r in rows)), width
+
+
+@router.get("/{session_id}/metrics", response_model=SessionMetricsSeriesResponse)
+def get_session_metrics(
+    session_id: str,
+    points: int = Query(500, ge=3, le=5000),
+    bucket: Optional[float] = Query(None, gt=0, description="Bucket width in seconds"),
+    mode: str = Query("lttb", pattern="^(lttb|bucket)$"),
+    db: SASession = Depends(get_db)
+):
+    """Session hr/rom/tempo series with a bounded number of points.
+    
+    ``mode=lttb`` keeps at most ``points`` samples per series; ``mode=bucket``
+    (implied by ``bucket``) returns per-bucket averages, with the bucket width
+    derived from ``points`` when not given. A ``bucket`` too narrow for
+    ``points`` is widened, so the response stays bounded either way.
+    """
+    if db.get(Session, session_id) is None:
+        raise HTTPException(status_code=404, detail="Session not found")
+    
+    if bucket is not None:
+        mode = "bucket"
+    
+    if mode == "bucket" and bucket is not None and settings.timescale_enabled \
+            and db.get_bind().dialect.name == "postgresql":
+        times, values, source_points, bucket = _timescale_buckets(db, session_id, bucket, points)
+        return SessionMetricsSeriesResponse(
+            session_id=session_id, mode=mode, source_points=source_points,
+            bucket_seconds=bucket, series=_series(times, values)
+        )
+    
+    rows = db.execute(
+        select(SessionMetric.t, *[getattr(SessionMetric, f) for f in SERIES_FIELDS])
+        .where(SessionMetric.session_id == session_id)
+        .order_by(SessionMetric.t)
+    ).all()
+    times = np.array([as_utc(r[0]).timestamp() for r in rows], dtype=np.float64)
+    values = {
+        f: np.array([np.nan if r[i + 1] is None else r[i + 1] for r in rows], dtype=np.float64)
+        for i, f in enumerate(SERIES_FIELDS)
+    }
+    
+    if mode == "bucket":
+        span = times[-1] - times[0] if len(times) else 0.0
+        if bucket is None:
+            bucket = max(_bucket_floor(span, points), 1e-3) if span > 0 else 1.0
+        bucket = max(bucket, _bucket_floor(span, points))
+        bucket_times, means, _ = time_bucket(times, values, bucket)
+        series = _series(bucket_times, means)
+    else:
+        sampled_times, sampled = {}, {}
+        for name, column in values.items():
+            present = ~np.isnan(column)
+            sampled_times[name], sampled[name] = lttb(times[present], column[present], points)
+        series = _series(sampled_times, sampled)
+    
+    return SessionMetricsSeriesResponse(
+        session_id=session_id, mode=mode, source_points=len(rows),
+        bucket_seconds=bucket, series=series
+    )
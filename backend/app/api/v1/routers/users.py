@@ -0,0 +1,73 @@
+from fastapi import APIRouter, Depends, HTTPException, Query
+from datetime import datetime
+from typing import Optional
+import base64
+import json
+from sqlalchemy import tuple_
+from sqlalchemy.orm import Session as SASession
+from app.analytics.workload import as_utc
+from app.db.models import User, Session, SessionSummary, get_db
+from ..schemas import SessionHistoryItem, SessionHistoryResponse
+
+router = APIRouter(prefix="/v1/users", tags=["users"])
+
+
+def encode_cursor(started_at: datetime, session_id: str) -> str:
+    raw = json.dumps([as_utc(started_at).isoformat(), session_id])
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def decode_cursor(cursor: str):
+    try:
+        started_at, session_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return datetime.fromisoformat(started_at), session_id
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+@router.get("/{user_id}/sessions", response_model=SessionHistoryResponse)
+def list_sessions(
+    user_id: str,
+    limit: int = Query(20, ge=1, le=100),
+    cursor: Optional[str] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    db: SASession = Depends(get_db)
+):
+    if db.get(User, user_id) is None:
+        raise HTTPException(status_code=404, detail="User not found")
+    
+    # Newest first; seeks past the cursor on the (user_id, started_at) index
+    query = db.query(Session, SessionSummary).outerjoin(
+        SessionSummary, SessionSummary.session_id == Session.id
+    ).filter(Session.user_id == user_id)
+    if since is not None:
+        query = query.filter(Session.started_at >= since)
+    if until is not None:
+        query = query.filter(Session.started_at < until)
+    if cursor:
+        query = query.filter(tuple_(Session.started_at, Session.id) < tuple_(*decode_cursor(cursor)))
+    
+    rows = query.order_by(Session.started_at.desc(), Session.id.desc()).limit(limit + 1).all()
+    
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    items = []
+    for session, summary in rows:
+        items.append(SessionHistoryItem(
+            session_id=session.id,
+            started_at=session.started_at,
+            ended_at=session.ended_at,
+            metric_count=summary.metric_count if summary else None,
+            total_reps=summary.total_reps if summary else None,
+            avg_hr=summary.avg_hr if summary else None,
+            avg_hrv=summary.avg_hrv if summary else None,
+            avg_rom=summary.avg_rom if summary else None,
+            avg_tempo=summary.avg_tempo if summary else None
+        ))
+    
+    last = rows[-1][0] if rows else None
+    return SessionHistoryResponse(
+        items=items,
+        next_cursor=encode_cursor(last.started_at, last.id) if has_more else None
+    )
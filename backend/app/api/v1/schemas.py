@@ -1,4 +1,4 @@
-from typing import List, Optional
+from typing import Dict, List, Optional
 from pydantic import BaseModel, Field
 from datetime import datetime
 
@@ -37,9 +37,15 @@ class PlanItem(BaseModel):
     date: datetime
     workout: str
     intensity: float
+    focus_areas: Optional[List[str]] = None
+    recommended_reps: Optional[int] = None
+    rest_periods: Optional[int] = None
+    notes: Optional[str] = None
 
 class PlanTodayResponse(BaseModel):
     items: List[PlanItem]
+    version: Optional[int] = None
+    updated_at: Optional[datetime] = None
 
 class AccountDeleteRequest(BaseModel):
     user_id: str
@@ -48,3 +54,108 @@ class AccountDeleteResponse(BaseModel):
     user_id: str
     deleted: bool
     message: str
+    job_id: Optional[str] = None
+    status: Optional[str] = None
+
+class AccountDeletionStatusResponse(BaseModel):
+    job_id: str
+    user_id: str
+    status: str
+    metrics_deleted: int
+    sessions_deleted: int
+    attempts: int = 0
+    error: Optional[str] = None
+    created_at: datetime
+    finished_at: Optional[datetime] = None
+
+class PersonalizationRunSummary(BaseModel):
+    id: str
+    task: str
+    started_at: datetime
+    finished_at: Optional[datetime] = None
+    processed_users: int
+    successful_updates: int
+    plans_changed: int
+    duration_seconds: Optional[float] = None
+    users_per_second: Optional[float] = None
+    stats: Optional[dict] = None
+
+class PersonalizationRunListResponse(BaseModel):
+    items: List[PersonalizationRunSummary]
+    next_cursor: Optional[datetime] = None
+
+class PersonalizationRunResultItem(BaseModel):
+    id: int
+    user_id: str
+    plan_updated: bool
+    error: Optional[str] = None
+    analysis: Optional[dict] = None
+
+class PersonalizationRunResultsResponse(BaseModel):
+    run: PersonalizationRunSummary
+    items: List[PersonalizationRunResultItem]
+    next_cursor: Optional[int] = None
+
+class ProfilingSettings(BaseModel):
+    enabled: bool
+    sample_rate: float = Field(ge=0.0, le=1.0)
+    interval_ms: float = Field(gt=0)
+
+class ProfilingStatusResponse(ProfilingSettings):
+    profiles: int
+    distinct_stacks: int
+
+class TraceSpan(BaseModel):
+    trace_id: str
+    span_id: str
+    parent_id: Optional[str] = None
+    name: str
+    start: float
+    duration_ms: float
+    attributes: dict
+    links: List[str]
+    status: str
+
+class TraceSummary(BaseModel):
+    trace_id: str
+    root: str
+    start: float
+    duration_ms: float
+    span_count: int
+
+class TraceListResponse(BaseModel):
+    items: List[TraceSummary]
+
+class TraceResponse(BaseModel):
+    trace_id: str
+    spans: List[TraceSpan]
+
+class ActiveSessionsResponse(BaseModel):
+    active_sessions: int
+    window_seconds: int
+
+class SessionHistoryItem(BaseModel):
+    session_id: str
+    started_at: datetime
+    ended_at: Optional[datetime] = None
+    metric_count: Optional[int] = None
+    total_reps: Optional[int] = None
+    avg_hr: Optional[float] = None
+    avg_hrv: Optional[float] = None
+    avg_rom: Optional[float] = None
+    avg_tempo: Optional[float] = None
+
+class SessionHistoryResponse(BaseModel):
+    items: List[SessionHistoryItem]
+    next_cursor: Optional[str] = None
+
+class MetricPoint(BaseModel):
+    t: datetime
+    value: float
+
+class SessionMetricsSeriesResponse(BaseModel):
+    session_id: str
+    mode: str
+    source_points: int
+    bucket_seconds: Optional[float] = None
+    series: Dict[str, List[MetricPoint]]
@@ -0,0 +1,212 @@
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+_MISSING = object()
+
+# Version floor of an invalidation whose new version is unknown: blocks every write
+FENCE_ALL = 2 ** 52
+
+# Compare-and-set for the Redis tier. The key holds either a cached value or
+# an invalidation marker ``{"min_version": n}``; the write is skipped when the
+# stored value or marker has a higher version than the one being written.
+_SET_IF_NOT_OLDER = """
+local current = redis.call('GET', KEYS[1])
+if current then
+    local ok, decoded = pcall(cjson.decode, current)
+    if ok and type(decoded) == 'table' then
+        local floor = decoded['min_version'] or decoded['version']
+        if type(floor) == 'number' and floor > tonumber(ARGV[2]) then
+            return 0
+        end
+    end
+end
+redis.call('SET', KEYS[1], ARGV[1], 'EX', ARGV[3])
+return 1
+"""
+
+
+class _Flight:
+    """A load in progress that concurrent readers of the same key wait on"""
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.value = None
+        self.error = None
+
+
+class PlanCache:
+    """Read-through cache for stored plans.
+
+    Values are ``{"version", "plan", "updated_at"}`` dicts (or ``None`` when the
+    user has no plan) cached per user in an in-process LRU, optionally backed by
+    a shared Redis tier. Concurrent misses for the same user are coalesced so
+    only one caller runs the loader (single-flight). A cached version is never
+    replaced by an older one, in either tier.
+
+    Invalidation replaces the Redis entry with a marker holding the new
+    version, so a reader that loaded the old plan before the write and stores
+    it afterwards is refused. When the new version is unknown the marker
+    refuses all writes for ``fence_ttl`` seconds.
+
+    Keys are per user, not per ``(user, version)``, on purpose: readers only
+    know the user id. A versioned key would cost an extra round trip to look
+    up the current version, or would leave one orphaned entry per
+    recompute, alive until its TTL. Keeping a single key per user with the
+    version inside the value, guarded by the compare-and-set above, gives
+    the same no-stale-overwrite guarantee in one Redis call.
+    """
+
+    def __init__(self, maxsize: int = 10000, ttl: float = 30.0, redis_client=None,
+                 redis_ttl: int = 86400, key_prefix: str = "aicoach:plan:", fence_ttl: int = 60):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.redis = redis_client
+        self.redis_ttl = redis_ttl
+        self.key_prefix = key_prefix
+        self.fence_ttl = fence_ttl
+        self._entries = OrderedDict()
+        self._inflight = {}
+        self._lock = threading.Lock()
+        self._epoch = 0
+
+    def get(self, user_id: str, loader):
+        """Return the cached value for ``user_id``, calling ``loader()`` on a miss"""
+        value = self._get_local(user_id)
+        if value is not _MISSING:
+            return value
+
+        with self._lock:
+            flight = self._inflight.get(user_id)
+            leader = flight is None
+            if leader:
+                flight = self._inflight[user_id] = _Flight()
+            epoch = self._epoch
+
+        if not leader:
+            flight.event.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.value
+
+        try:
+            value = self._get_remote(user_id)
+            if value is _MISSING:
+                value = loader()
+                self._set_remote(user_id, value)
+            self._set_local(user_id, value, epoch)
+            flight.value = value
+            return value
+        except BaseException as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._inflight[user_id]
+            flight.event.set()
+
+    def invalidate(self, user_ids):
+        """Drop cached plans from both tiers.
+
+        ``user_ids`` is either ``{user_id: new_version}`` or plain user ids
+        when the new version is unknown (e.g. the plan was deleted).
+        """
+        versions = user_ids if isinstance(user_ids, dict) else dict.fromkeys(user_ids)
+        with self._lock:
+            self._epoch += 1
+            for user_id in versions:
+                self._entries.pop(user_id, None)
+        if self.redis is None or not versions:
+            return
+        try:
+            pipe = self.redis.pipeline(transaction=False)
+            for user_id, version in versions.items():
+                if version is None:
+                    pipe.set(self.key_prefix + user_id, json.dumps({"min_version": FENCE_ALL}), ex=self.fence_ttl)
+                else:
+                    self._set_if_not_older(pipe, user_id, {"min_version": version}, version)
+            pipe.execute()
+        except Exception:
+            logger.warning("Plan cache: Redis invalidation failed", exc_info=True)
+
+    def clear(self):
+        with self._lock:
+            self._epoch += 1
+            self._entries.clear()
+
+    def _get_local(self, user_id):
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None:
+                return _MISSING
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._entries[user_id]
+                return _MISSING
+            self._entries.move_to_end(user_id)
+            return value
+
+    def _set_local(self, user_id, value, epoch):
+        with self._lock:
+            # An invalidation raced with this load; the value may be stale
+            if epoch != self._epoch:
+                return
+            current = self._entries.get(user_id)
+            if current is not None and _version(current[1]) > _version(value):
+                return
+            self._entries[user_id] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def _get_remote(self, user_id):
+        if self.redis is None:
+            return _MISSING
+        try:
+            raw = self.redis.get(self.key_prefix + user_id)
+        except Exception:
+            logger.warning("Plan cache: Redis read failed", exc_info=True)
+            return _MISSING
+        if raw is None:
+            return _MISSING
+        value = json.loads(raw)
+        # An invalidation marker is a miss
+        return _MISSING if isinstance(value, dict) and "min_version" in value else value
+
+    def _set_remote(self, user_id, value):
+        if self.redis is None:
+            return
+        try:
+            self._set_if_not_older(self.redis, user_id, value, _version(value))
+        except Exception:
+            logger.warning("Plan cache: Redis write failed", exc_info=True)
+
+    def _set_if_not_older(self, client, user_id, value, version: int):
+        client.eval(_SET_IF_NOT_OLDER, 1, self.key_prefix + user_id, json.dumps(value), version, self.redis_ttl)
+
+
+def _version(value) -> int:
+    return value["version"] if value else 0
+
+
+def build_plan_cache(settings) -> PlanCache:
+    redis_client = None
+    if settings.plan_cache_redis_enabled:
+        import redis
+        redis_client = redis.Redis.from_url(settings.redis_url)
+    return PlanCache(
+        maxsize=settings.plan_cache_size,
+        ttl=settings.plan_cache_ttl_seconds,
+        redis_client=redis_client,
+        redis_ttl=settings.plan_cache_redis_ttl_seconds
+    )
+
+
+# Process-wide plan cache
+plan_cache = build_plan_cache(settings)
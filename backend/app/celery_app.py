@@ -1,11 +1,27 @@
 from celery import Celery
+from celery.schedules import crontab
 from app.config import settings
+from app.db.models import engine
+from app.observability import memory, profiling, queries, tracing
+
+
+def personalization_schedule(slots: int, start_hour: int) -> dict:
+    """One beat entry per slot, an hour apart, starting at ``start_hour`` UTC"""
+    return {
+        f"nightly-personalization-slot-{slot}": {
+            "task": "app.workers.personalize.run_personalization",
+            "schedule": crontab(minute=0, hour=(start_hour + slot) % 24),
+            "args": (slot,),
+        }
+        for slot in range(slots)
+    }
+
 
 celery_app = Celery(
     "ai_coach",
     broker=settings.celery_broker_url,
     backend=settings.celery_result_backend,
-    include=["app.workers.personalize"]
+    include=["app.workers.personalize", "app.workers.accounts", "app.workers.sessions"]
 )
 
 # Celery configuration
@@ -16,9 +32,26 @@ celery_app.conf.update(
     timezone="UTC",
     enable_utc=True,
     beat_schedule={
-        "nightly-personalization": {
-            "task": "app.workers.personalize.run_personalization",
-            "schedule": 3600.0 * 24,  # Daily at midnight
+        **personalization_schedule(settings.personalization_slots, settings.personalization_start_hour),
+        "personalization-events": {
+            "task": "app.workers.personalize.process_personalization_events",
+            "schedule": 60.0,  # Debounced per-user recomputes
+        },
+        "resume-account-deletions": {
+            "task": "app.workers.accounts.resume_account_deletions",
+            "schedule": 600.0,
+        },
+        "close-stale-sessions": {
+            "task": "app.workers.sessions.sweep_stale_sessions",
+            "schedule": 300.0,
         },
     },
 )
+
+# Per-task query counts, budgets and slow-query log
+queries.install(engine)
+queries.instrument_celery()
+profiling.instrument_celery()
+memory.instrument_celery()
+tracing.install(engine)
+tracing.instrument_celery()
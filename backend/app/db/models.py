@@ -1,9 +1,12 @@
-from sqlalchemy import Column, String, DateTime, Float, Integer, JSON, ForeignKey, create_engine
+from sqlalchemy import Column, String, DateTime, Float, Integer, Boolean, JSON, ForeignKey, Index, create_engine
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 from sqlalchemy.orm import declarative_base, sessionmaker
 from sqlalchemy.orm import Session as SASession
 from sqlalchemy.sql import func
 import uuid
 from app.config import settings
+from app.observability import tracing
 
 engine = create_engine(settings.database_url, future=True)
 SessionLocal = sessionmaker(bind=engine, autoflush=False, autocommit=False, future=True)
@@ -15,18 +18,30 @@ def generate_uuid():
 class User(Base):
     __tablename__ = "users"
     id = Column(String, primary_key=True)
+    # Set when account deletion is requested; data is purged in the background
+    deleted_at = Column(DateTime(timezone=True), nullable=True)
 
 class Session(Base):
     __tablename__ = "sessions"
     id = Column(String, primary_key=True, default=generate_uuid)
-    user_id = Column(String, ForeignKey("users.id"), nullable=False)
+    user_id = Column(String, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
     started_at = Column(DateTime(timezone=True), nullable=False)
     ended_at = Column(DateTime(timezone=True), nullable=True)
+    
+    __table_args__ = (
+        Index("ix_sessions_user_started", "user_id", "started_at"),
+        # Partial index: only open sessions, for the stale-session sweeper
+        Index(
+            "ix_sessions_open", "started_at",
+            postgresql_where=ended_at.is_(None),
+            sqlite_where=ended_at.is_(None)
+        ),
+    )
 
 class SessionMetric(Base):
     __tablename__ = "session_metrics"
     id = Column(String, primary_key=True, default=generate_uuid)
-    session_id = Column(String, ForeignKey("sessions.id"), nullable=False)
+    session_id = Column(String, ForeignKey("sessions.id", ondelete="CASCADE"), nullable=False, index=True)
     t = Column(DateTime(timezone=True), nullable=False, index=True)
     hr = Column(Float, nullable=True)
     hrv = Column(Float, nullable=True)
@@ -35,11 +50,113 @@ class SessionMetric(Base):
     tempo = Column(Float, nullable=True)
     error_flags = Column(JSON, nullable=True)
 
+class SessionSummary(Base):
+    """Aggregates of a finished session, written once by ``end_session``"""
+    __tablename__ = "session_summaries"
+    session_id = Column(String, ForeignKey("sessions.id", ondelete="CASCADE"), primary_key=True)
+    metric_count = Column(Integer, nullable=False, default=0)
+    total_reps = Column(Integer, nullable=False, default=0)
+    avg_hr = Column(Float, nullable=True)
+    avg_hrv = Column(Float, nullable=True)
+    avg_rom = Column(Float, nullable=True)
+    avg_tempo = Column(Float, nullable=True)
+    last_metric_at = Column(DateTime(timezone=True), nullable=True)
+
+class UserPlan(Base):
+    __tablename__ = "user_plans"
+    user_id = Column(String, ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    version = Column(Integer, nullable=False, default=1)
+    plan = Column(JSON, nullable=False)
+    plan_hash = Column(String(64), nullable=False)
+    updated_at = Column(DateTime(timezone=True), nullable=False)
+
+class UserTrainingState(Base):
+    """Per-user rolling workload, maintained online as sessions end"""
+    __tablename__ = "user_training_state"
+    user_id = Column(String, ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    updated_at = Column(DateTime(timezone=True), nullable=False)
+    sessions_count = Column(Integer, nullable=False, default=0)
+    # Exponentially decayed load sums (7 and 28 day time constants)
+    acute_load = Column(Float, nullable=False, default=0.0)
+    chronic_load = Column(Float, nullable=False, default=0.0)
+    # Welford running HRV statistics
+    hrv_count = Column(Integer, nullable=False, default=0)
+    hrv_mean = Column(Float, nullable=True)
+    hrv_m2 = Column(Float, nullable=False, default=0.0)
+    # Exponentially weighted session heart rate
+    hr_acute = Column(Float, nullable=True)
+    hr_chronic = Column(Float, nullable=True)
+
+class PersonalizationEvent(Base):
+    """Pending per-user re-personalization, coalesced until ``due_at``"""
+    __tablename__ = "personalization_events"
+    user_id = Column(String, ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    requested_at = Column(DateTime(timezone=True), nullable=False)
+    due_at = Column(DateTime(timezone=True), nullable=False, index=True)
+    # traceparent of the request that first asked for the recompute
+    trace_context = Column(String, nullable=True)
+    # Set while a run holds the event; it is not claimed again until then
+    leased_until = Column(DateTime(timezone=True), nullable=True)
+    # Nightly slot of the user, so slot runs claim their events in SQL
+    slot = Column(Integer, nullable=True)
+
+class PersonalizationRun(Base):
+    __tablename__ = "personalization_runs"
+    id = Column(String, primary_key=True, default=generate_uuid)
+    task = Column(String, nullable=False)
+    started_at = Column(DateTime(timezone=True), nullable=False, index=True)
+    finished_at = Column(DateTime(timezone=True), nullable=True)
+    processed_users = Column(Integer, nullable=False, default=0)
+    successful_updates = Column(Integer, nullable=False, default=0)
+    plans_changed = Column(Integer, nullable=False, default=0)
+    duration_seconds = Column(Float, nullable=True)
+    users_per_second = Column(Float, nullable=True)
+    stats = Column(JSON, nullable=True)  # RunStats.summary(): stage timings, per-user latency
+
+class PersonalizationRunResult(Base):
+    """Per-user outcome of a personalization run"""
+    __tablename__ = "personalization_run_results"
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    run_id = Column(String, ForeignKey("personalization_runs.id", ondelete="CASCADE"), nullable=False, index=True)
+    user_id = Column(String, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    plan_updated = Column(Boolean, nullable=False)
+    error = Column(String, nullable=True)
+    analysis = Column(JSON, nullable=True)
+
+class TaskLock(Base):
+    """Database stand-in for a distributed lock, released by expiry if the holder dies"""
+    __tablename__ = "task_locks"
+    name = Column(String, primary_key=True)
+    owner = Column(String, nullable=False)
+    expires_at = Column(DateTime(timezone=True), nullable=False)
+
+class AccountDeletionJob(Base):
+    __tablename__ = "account_deletion_jobs"
+    id = Column(String, primary_key=True, default=generate_uuid)
+    user_id = Column(String, nullable=False, index=True)
+    status = Column(String, nullable=False, default="pending")  # pending, running, completed, failed
+    metrics_deleted = Column(Integer, nullable=False, default=0)
+    sessions_deleted = Column(Integer, nullable=False, default=0)
+    attempts = Column(Integer, nullable=False, default=0)
+    error = Column(String, nullable=True)
+    created_at = Column(DateTime(timezone=True), nullable=False)
+    updated_at = Column(DateTime(timezone=True), nullable=False)
+    finished_at = Column(DateTime(timezone=True), nullable=True)
+
+def dialect_insert(db):
+    """Return the dialect-specific ``insert`` that supports ON CONFLICT clauses"""
+    if db.get_bind().dialect.name == "postgresql":
+        return pg_insert
+    return sqlite_insert
+
 # Dependency
 
 def get_db() -> SASession:
+    # Not activated: the dependency may be entered and closed on different threads
+    session_span = tracing.start_span("db.session")
     db = SessionLocal()
     try:
         yield db
     finally:
         db.close()
+        tracing.end_span(session_span)
@@ -0,0 +1,99 @@
+"""Streaming export of a user's full history.
+
+Rows come from one outer join of sessions and metrics read through a
+server-side cursor, ``chunk_size`` rows at a time, and are encoded chunk by
+chunk, so memory stays flat however long the history is.
+"""
+import csv
+import io
+import json
+import zlib
+
+from sqlalchemy import select
+
+from app.analytics.workload import as_utc
+from app.db.models import Session, SessionMetric
+
+METRIC_FIELDS = ("t", "hr", "hrv", "rep", "rom", "tempo", "error_flags")
+CSV_HEADER = ("session_id", "started_at", "ended_at") + METRIC_FIELDS
+
+
+def history_query(user_id: str):
+    """Sessions (oldest first) with their metrics in time order; sessions without metrics appear once"""
+    return (
+        select(
+            Session.id.label("session_id"), Session.started_at, Session.ended_at,
+            *[getattr(SessionMetric, field) for field in METRIC_FIELDS]
+        )
+        .outerjoin(SessionMetric, SessionMetric.session_id == Session.id)
+        .where(Session.user_id == user_id)
+        .order_by(Session.started_at, Session.id, SessionMetric.t)
+    )
+
+
+def stream_history(engine, user_id: str, chunk_size: int):
+    """Yield lists of row mappings, reading with a server-side cursor on its own connection"""
+    with engine.connect() as conn:
+        result = conn.execution_options(stream_results=True, yield_per=chunk_size).execute(
+            history_query(user_id)
+        )
+        for rows in result.mappings().partitions():
+            yield rows
+
+
+def _iso(value):
+    return as_utc(value).isoformat() if value is not None else None
+
+
+def ndjson_chunks(partitions):
+    """One ``{"type": "session"}`` line per session followed by its ``{"type": "metric"}`` lines"""
+    current = None
+    for rows in partitions:
+        lines = []
+        for row in rows:
+            if row["session_id"] != current:
+                current = row["session_id"]
+                lines.append(json.dumps({
+                    "type": "session", "session_id": current,
+                    "started_at": _iso(row["started_at"]), "ended_at": _iso(row["ended_at"])
+                }))
+            if row["t"] is not None:
+                lines.append(json.dumps({
+                    "type": "metric", "session_id": current, "t": _iso(row["t"]),
+                    **{field: row[field] for field in METRIC_FIELDS[1:]}
+                }))
+        if lines:
+            yield ("\n".join(lines) + "\n").encode()
+
+
+def csv_chunks(partitions):
+    """Flat rows: session columns repeated on each metric, metric columns empty for sessions without metrics"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(CSV_HEADER)
+    yield buffer.getvalue().encode()
+    for rows in partitions:
+        buffer.seek(0)
+        buffer.truncate()
+        for row in rows:
+            flags = ";".join(row["error_flags"]) if row["error_flags"] else ""
+            writer.writerow((
+                row["session_id"], _iso(row["started_at"]), _iso(row["ended_at"]), _iso(row["t"]),
+                row["hr"], row["hrv"], row["rep"], row["rom"], row["tempo"], flags
+            ))
+        yield buffer.getvalue().encode()
+
+
+def gzip_chunks(chunks, level: int = 6):
+    """Compress a byte stream incrementally into one gzip member.
+
+    Each chunk is sync-flushed so the client receives it right away instead
+    of waiting for zlib's internal buffer to fill; chunks are whole
+    partitions, so the per-flush overhead is small.
+    """
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        data = compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH)
+        if data:
+            yield data
+    yield compressor.flush()
@@ -1,10 +1,19 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, Response
 from fastapi.middleware.cors import CORSMiddleware
 from app.api.v1.routers.sessions import router as sessions_router
 from app.api.v1.routers.metrics import router as metrics_router
 from app.api.v1.routers.plans import router as plans_router
 from app.api.v1.routers.accounts import router as accounts_router
+from app.api.v1.routers.users import router as users_router
+from app.api.v1.routers.admin import router as admin_router
 from app.config import settings
+from app.db.models import engine
+from app.observability.metrics import register_pool_collector, registry
+from app.observability import queries, tracing
+from app.observability.capture import TrafficCaptureMiddleware
+from app.observability.middleware import MetricsMiddleware
+from app.observability.profiling import ProfilingMiddleware
+from app.observability.registry import CONTENT_TYPE
 
 app = FastAPI(
     title="AI Coach API", 
@@ -20,12 +29,31 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+queries.install(engine)
+app.add_middleware(queries.QueryStatsMiddleware)
+app.add_middleware(ProfilingMiddleware)
+tracing.install(engine)
+app.add_middleware(tracing.TracingMiddleware)
+app.add_middleware(TrafficCaptureMiddleware)
+
+if settings.metrics_enabled:
+    app.add_middleware(MetricsMiddleware)
+    register_pool_collector(engine)
+
 app.include_router(sessions_router)
 app.include_router(metrics_router)
 app.include_router(plans_router)
 app.include_router(accounts_router)
+app.include_router(users_router)
+app.include_router(admin_router)
 
 
 @app.get("/healthz")
 def healthz():
     return {"ok": True}
+
+
+@app.get("/metrics", include_in_schema=False)
+def metrics():
+    """Prometheus text exposition of the process's metrics"""
+    return Response(registry.render(), media_type=CONTENT_TYPE)
@@ -0,0 +1,224 @@
+"""Capture of incoming API traffic for replay.
+
+``TrafficCaptureMiddleware`` records each request under
+``Settings.traffic_capture_paths``: method, path, query, JSON body, status,
+start time and duration. User ids are replaced with a keyed hash, in bodies,
+query strings and path segments, so a capture from production holds no raw
+identifiers but one athlete's requests still share an id. The ``session_id``
+returned by a session start is kept as well. That lets a replay follow each
+session from start to end and map it onto the ids the target server hands
+out.
+
+Records are JSON lines, buffered and appended to
+``Settings.traffic_capture_dir`` as gzip members, one file per process, so
+workers never interleave writes. Compression and file writes happen on a
+background writer thread, never on the event loop. Concatenated gzip members are one valid
+gzip stream, so ``read_capture`` and ``zcat`` read the files even while
+they grow. ``scripts/replay_traffic.py`` replays them.
+"""
+import atexit
+import gzip
+import hashlib
+import hmac
+import json
+import logging
+import os
+import queue
+import threading
+import time
+from pathlib import Path
+from urllib.parse import parse_qsl, urlencode
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Response bodies are only read for the ``session_id`` of a session start
+RESPONSE_PEEK_BYTES = 4096
+
+
+def anonymize(user_id: str) -> str:
+    """Stable pseudonym for a user id, keyed with ``Settings.secret_key``"""
+    digest = hmac.new(settings.secret_key.encode(), str(user_id).encode(), hashlib.sha256).hexdigest()
+    return f"anon-{digest[:16]}"
+
+
+def anonymize_body(value):
+    """Copy of a JSON value with every ``user_id`` field pseudonymized"""
+    if isinstance(value, dict):
+        return {
+            k: anonymize(v) if k == "user_id" and v is not None else anonymize_body(v)
+            for k, v in value.items()
+        }
+    if isinstance(value, list):
+        return [anonymize_body(v) for v in value]
+    return value
+
+
+def anonymize_query(query: str) -> str:
+    if "user_id=" not in query:
+        return query
+    pairs = parse_qsl(query, keep_blank_values=True)
+    return urlencode([(k, anonymize(v) if k == "user_id" else v) for k, v in pairs])
+
+
+def anonymize_path(path: str, path_params: dict) -> str:
+    user_id = path_params.get("user_id")
+    if not user_id:
+        return path
+    return "/".join(anonymize(part) if part == user_id else part for part in path.split("/"))
+
+
+class CaptureLog:
+    """Buffers capture records and appends them as gzip members from a writer thread"""
+
+    def __init__(self):
+        self._records = []
+        self._lock = threading.Lock()
+        self._last_flush = time.monotonic()
+        self._pending = queue.Queue()
+        self._writer = None
+        self.name = f"capture-{time.strftime('%Y%m%dT%H%M%S')}-{os.getpid()}.jsonl.gz"
+
+    def path(self) -> Path:
+        return Path(settings.traffic_capture_dir) / self.name
+
+    def add(self, record: dict):
+        with self._lock:
+            self._records.append(json.dumps(record, separators=(",", ":"), default=str))
+            due = (
+                len(self._records) >= settings.traffic_capture_flush_records
+                or time.monotonic() - self._last_flush >= settings.traffic_capture_flush_seconds
+            )
+            records = self._take() if due else None
+        if records:
+            self._submit(records)
+
+    def flush(self):
+        """Write everything buffered so far and wait until it is on disk"""
+        with self._lock:
+            records = self._take()
+        self._submit(records)
+        self._pending.join()
+
+    def _take(self) -> list:
+        records, self._records = self._records, []
+        self._last_flush = time.monotonic()
+        return records
+
+    def _submit(self, records: list):
+        if not records:
+            return
+        # Started on first use, so a process that forks after import gets its own writer
+        with self._lock:
+            if self._writer is None or not self._writer.is_alive():
+                self._writer = threading.Thread(target=self._run, name="capture-writer", daemon=True)
+                self._writer.start()
+        self._pending.put(records)
+
+    def _run(self):
+        # One writer keeps the members whole and in order
+        while True:
+            records = self._pending.get()
+            try:
+                self._write(records)
+            finally:
+                self._pending.task_done()
+
+    def _write(self, records: list):
+        path = self.path()
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            with open(path, "ab") as f:
+                f.write(gzip.compress(("\n".join(records) + "\n").encode()))
+        except OSError:
+            logger.warning("Could not write %d captured requests to %s", len(records), path, exc_info=True)
+
+
+capture_log = CaptureLog()
+atexit.register(capture_log.flush)
+
+
+def read_capture(paths) -> list:
+    """Records from capture files or directories of them, ordered by start time"""
+    files = []
+    for path in map(Path, paths):
+        files.extend(sorted(path.glob("*.jsonl.gz")) if path.is_dir() else [path])
+    records = []
+    for path in files:
+        with gzip.open(path, "rt") as f:
+            records.extend(json.loads(line) for line in f if line.strip())
+    records.sort(key=lambda r: r["ts"])
+    return records
+
+
+def _captured(path: str) -> bool:
+    return any(path.startswith(prefix) for prefix in settings.traffic_capture_paths)
+
+
+class TrafficCaptureMiddleware:
+    """Appends each matching request to the capture log once its response is sent"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not settings.traffic_capture_enabled or not _captured(scope["path"]):
+            await self.app(scope, receive, send)
+            return
+
+        start = time.time()
+        t0 = time.perf_counter()
+        body = bytearray()
+        response = bytearray()
+        status = None
+
+        async def receive_wrapper():
+            message = await receive()
+            if message["type"] == "http.request" and len(body) <= settings.traffic_capture_max_body:
+                body.extend(message.get("body", b""))
+            return message
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            elif message["type"] == "http.response.body" and len(response) < RESPONSE_PEEK_BYTES:
+                response.extend(message.get("body", b""))
+            await send(message)
+
+        try:
+            await self.app(scope, receive_wrapper, send_wrapper)
+        finally:
+            record = {
+                "ts": round(start, 6),
+                "ms": round((time.perf_counter() - t0) * 1000, 3),
+                "m": scope["method"],
+                "p": anonymize_path(scope["path"], scope.get("path_params") or {}),
+                "q": anonymize_query(scope.get("query_string", b"").decode("latin-1")),
+                "st": status,
+                "b": _body(bytes(body))
+            }
+            session_id = _session_id(bytes(response)) if scope["path"].endswith("/sessions/start") else None
+            if session_id:
+                record["sid"] = session_id
+            capture_log.add(record)
+
+
+def _body(raw: bytes):
+    if not raw:
+        return None
+    if len(raw) > settings.traffic_capture_max_body:
+        return {"truncated": len(raw)}
+    try:
+        return anonymize_body(json.loads(raw))
+    except ValueError:
+        # Not JSON; the body can't be pseudonymized, so only its size is kept
+        return {"unparsed": len(raw)}
+
+
+def _session_id(raw: bytes):
+    try:
+        return json.loads(raw).get("session_id")
+    except (ValueError, AttributeError):
+        return None
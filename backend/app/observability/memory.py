@@ -0,0 +1,146 @@
+"""tracemalloc-based memory reports for worker tasks.
+
+With ``Settings.memory_profiling_enabled`` every Celery task runs inside
+``profile_memory``: tracemalloc snapshots are taken at task start, at
+checkpoints (``maybe_checkpoint`` every ``memory_checkpoint_users`` users in
+``personalize_users``) and at task end. Each snapshot is diffed against the
+previous one by allocation site. The report, with traced and peak RSS
+figures, is written as JSON to ``Settings.memory_profile_dir``.
+"""
+import contextvars
+import json
+import logging
+import os
+import resource
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+_current = contextvars.ContextVar("memory_profile", default=None)
+
+
+def peak_rss_mb() -> float:
+    # ru_maxrss is reported in kilobytes on Linux
+    return round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+
+
+class MemoryProfile:
+    def __init__(self, name: str, top: int = None):
+        self.name = name
+        self.top = top or settings.memory_top_sites
+        self.checkpoints = []
+        self._previous = None
+        self._next_users = settings.memory_checkpoint_users
+        self._started_tracing = False
+
+    def start(self):
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(settings.memory_trace_frames)
+            self._started_tracing = True
+        tracemalloc.reset_peak()
+        self._previous = tracemalloc.take_snapshot()
+        self.started_at = time.time()
+        self.checkpoint("start", diff=False)
+        return self
+
+    def checkpoint(self, label: str, diff: bool = True):
+        current, peak = tracemalloc.get_traced_memory()
+        entry = {
+            "label": label,
+            "seconds": round(time.time() - self.started_at, 3),
+            "traced_mb": round(current / 2 ** 20, 3),
+            "traced_peak_mb": round(peak / 2 ** 20, 3),
+            "peak_rss_mb": peak_rss_mb()
+        }
+        if diff:
+            snapshot = tracemalloc.take_snapshot().filter_traces((
+                tracemalloc.Filter(False, tracemalloc.__file__),
+                tracemalloc.Filter(False, "<frozen importlib._bootstrap*>"),
+            ))
+            stats = snapshot.compare_to(self._previous, "lineno")
+            entry["top_growth"] = [
+                {
+                    "site": f"{stat.traceback[0].filename}:{stat.traceback[0].lineno}",
+                    "size_diff_kb": round(stat.size_diff / 1024, 1),
+                    "count_diff": stat.count_diff,
+                    "size_kb": round(stat.size / 1024, 1)
+                }
+                for stat in stats[:self.top]
+            ]
+            self._previous = snapshot
+        self.checkpoints.append(entry)
+        return entry
+
+    def maybe_checkpoint(self, processed_users: int):
+        if self._next_users and processed_users >= self._next_users:
+            self.checkpoint(f"users={processed_users}")
+            while self._next_users <= processed_users:
+                self._next_users += settings.memory_checkpoint_users
+
+    def stop(self) -> dict:
+        self.checkpoint("end")
+        if self._started_tracing:
+            tracemalloc.stop()
+        return {"task": self.name, "started_at": self.started_at, "checkpoints": self.checkpoints}
+
+
+def _write(report: dict) -> str:
+    os.makedirs(settings.memory_profile_dir, exist_ok=True)
+    safe = "".join(c if c.isalnum() or c in "-_." else "_" for c in report["task"])
+    path = os.path.join(settings.memory_profile_dir, f"{int(report['started_at'] * 1000)}-{safe}.json")
+    with open(path, "w") as f:
+        json.dump(report, f, indent=2)
+    return path
+
+
+@contextmanager
+def profile_memory(name: str):
+    """Trace allocations in the block and persist the report; yields the ``MemoryProfile``"""
+    profile = MemoryProfile(name).start()
+    token = _current.set(profile)
+    try:
+        yield profile
+    finally:
+        _current.reset(token)
+        report = profile.stop()
+        try:
+            path = _write(report)
+        except OSError:
+            logger.warning("Could not write memory report for %s", name, exc_info=True)
+        else:
+            end = report["checkpoints"][-1]
+            logger.info(
+                "%s: traced peak %.1f MB, peak RSS %.1f MB; report in %s",
+                name, end["traced_peak_mb"], end["peak_rss_mb"], path
+            )
+
+
+def maybe_checkpoint(processed_users: int):
+    """Checkpoint the active memory profile every ``memory_checkpoint_users`` users (no-op when off)"""
+    profile = _current.get()
+    if profile is not None:
+        profile.maybe_checkpoint(processed_users)
+
+
+def instrument_celery():
+    """Profile every task's memory while ``memory_profiling_enabled`` is set"""
+    from celery.signals import task_postrun, task_prerun
+
+    running = {}
+
+    @task_prerun.connect(weak=False)
+    def start(task_id=None, task=None, **kwargs):
+        if settings.memory_profiling_enabled:
+            scope = profile_memory(task.name if task else "task")
+            scope.__enter__()
+            running[task_id] = scope
+
+    @task_postrun.connect(weak=False)
+    def stop(task_id=None, **kwargs):
+        scope = running.pop(task_id, None)
+        if scope is not None:
+            scope.__exit__(None, None, None)
@@ -0,0 +1,43 @@
+"""Application metrics recorded by the API and exposed on ``GET /metrics``."""
+from app.observability.registry import Registry
+
+registry = Registry()
+
+HTTP_REQUEST_DURATION = registry.histogram(
+    "aicoach_http_request_duration_seconds",
+    "HTTP request latency by router",
+    ("router", "method", "status"),
+)
+HTTP_REQUESTS_IN_FLIGHT = registry.gauge(
+    "aicoach_http_requests_in_flight",
+    "HTTP requests currently being served",
+)
+METRIC_ROWS_INGESTED = registry.counter(
+    "aicoach_metric_rows_ingested_total",
+    "Session metric rows accepted by /v1/metrics/batch",
+)
+METRIC_BATCH_SIZE = registry.histogram(
+    "aicoach_metric_batch_size",
+    "Rows per /v1/metrics/batch request",
+    buckets=(1, 5, 10, 25, 50, 100, 250, 500, 1000, 2500),
+)
+DB_POOL_CONNECTIONS = registry.gauge(
+    "aicoach_db_pool_connections",
+    "Database pool connections by state",
+    ("state",),
+)
+
+
+def register_pool_collector(engine):
+    """Sample the engine's pool on every scrape (pools without a size, like SQLite's, are skipped)"""
+    pool = engine.pool
+
+    def collect():
+        if not hasattr(pool, "checkedout"):
+            return
+        DB_POOL_CONNECTIONS.set(pool.checkedout(), "checked_out")
+        DB_POOL_CONNECTIONS.set(pool.checkedin(), "idle")
+        DB_POOL_CONNECTIONS.set(max(pool.overflow(), 0), "overflow")
+        DB_POOL_CONNECTIONS.set(pool.size(), "size")
+
+    registry.add_collector(collect)
@@ -0,0 +1,46 @@
+import time
+
+from app.observability.metrics import HTTP_REQUEST_DURATION, HTTP_REQUESTS_IN_FLIGHT
+
+
+class MetricsMiddleware:
+    """Pure ASGI middleware timing each HTTP request.
+
+    Latency is labelled with the matched router's first tag (``sessions``,
+    ``metrics``, ``plans``, ...), so label cardinality stays bounded by the
+    number of routers rather than by paths.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = 500
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        HTTP_REQUESTS_IN_FLIGHT.inc()
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            HTTP_REQUESTS_IN_FLIGHT.dec()
+            HTTP_REQUEST_DURATION.observe(
+                time.perf_counter() - start, _router_label(scope), scope["method"], status
+            )
+
+
+def _router_label(scope) -> str:
+    route = scope.get("route")
+    if route is None:
+        return "unmatched"
+    tags = getattr(route, "tags", None)
+    return tags[0] if tags else "root"
@@ -0,0 +1,182 @@
+"""On-demand statistical CPU profiling for requests and worker tasks.
+
+A ``StackSampler`` thread snapshots Python stacks with
+``sys._current_frames()`` every ``Settings.profile_interval_ms`` and counts
+them in collapsed flamegraph form (``root;module:func;... count``), the input
+of ``flamegraph.pl`` and speedscope. Nothing runs until a request or task is
+selected: a request opts in with the ``X-Profile: 1`` header or is picked
+at ``Settings.profile_sample_rate``; Celery tasks are picked at the same rate.
+
+Tasks are sampled on their own thread. Sync request handlers run on a
+threadpool thread that is not known up front, so request profiles sample
+every busy thread of the process; concurrent requests show up under the
+same root, which is fine for finding where ingest time goes under load.
+"""
+import logging
+import os
+import random
+import sys
+import threading
+import time
+from collections import Counter
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+PROFILE_HEADER = b"x-profile"
+
+# Top frames of threads that are blocked rather than burning CPU
+_IDLE_FRAMES = {
+    ("threading", "wait"),
+    ("threading", "_wait_for_tstate_lock"),
+    ("selectors", "select"),
+    ("queue", "get"),
+    ("socket", "accept"),
+}
+
+
+def collapse(frame, root: str = "") -> str:
+    parts = []
+    while frame is not None:
+        code = frame.f_code
+        parts.append(f"{frame.f_globals.get('__name__', '?')}:{code.co_name}")
+        frame = frame.f_back
+    if root:
+        parts.append(root)
+    return ";".join(reversed(parts))
+
+
+def _idle(frame) -> bool:
+    return (frame.f_globals.get("__name__"), frame.f_code.co_name) in _IDLE_FRAMES
+
+
+class StackSampler:
+    """Samples stacks of ``thread_ids`` (all other threads when ``None``) until stopped"""
+
+    def __init__(self, root: str, interval: float, thread_ids=None):
+        self.root = root
+        self.interval = interval
+        self.thread_ids = thread_ids
+        self.stacks = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self) -> Counter:
+        self._stop.set()
+        self._thread.join()
+        return self.stacks
+
+    def _run(self):
+        own = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            self.sample(own)
+
+    def sample(self, own=None):
+        self.samples += 1
+        for thread_id, frame in sys._current_frames().items():
+            if thread_id == own or (self.thread_ids is not None and thread_id not in self.thread_ids):
+                continue
+            if _idle(frame) or frame.f_globals.get("__name__") == __name__:
+                continue
+            self.stacks[collapse(frame, self.root)] += 1
+
+
+class ProfileStore:
+    """Collapsed stacks aggregated over all profiles taken in this process"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.stacks = Counter()
+        self.profiles = 0
+
+    def add(self, name: str, stacks: Counter):
+        with self._lock:
+            self.stacks.update(stacks)
+            self.profiles += 1
+        if settings.profile_dir and stacks:
+            _write(name, stacks)
+
+    def collapsed(self) -> str:
+        with self._lock:
+            items = sorted(self.stacks.items())
+        return "".join(f"{stack} {count}\n" for stack, count in items)
+
+    def reset(self):
+        with self._lock:
+            self.stacks.clear()
+            self.profiles = 0
+
+
+def _write(name: str, stacks: Counter):
+    os.makedirs(settings.profile_dir, exist_ok=True)
+    safe = "".join(c if c.isalnum() or c in "-_." else "_" for c in name).strip("_")
+    path = os.path.join(settings.profile_dir, f"{int(time.time() * 1000)}-{safe}.collapsed")
+    try:
+        with open(path, "w") as f:
+            f.writelines(f"{stack} {count}\n" for stack, count in sorted(stacks.items()))
+    except OSError:
+        logger.warning("Could not write profile %s", path, exc_info=True)
+
+
+# Process-wide aggregate served by the admin endpoint
+profiles = ProfileStore()
+
+
+def _selected(requested: bool) -> bool:
+    if requested and settings.profiling_enabled:
+        return True
+    rate = settings.profile_sample_rate
+    return rate > 0 and random.random() < rate
+
+
+def _interval() -> float:
+    return settings.profile_interval_ms / 1000
+
+
+class ProfilingMiddleware:
+    """Profiles requests that ask for it (``X-Profile: 1``) or are picked by the sample rate"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        requested = dict(scope["headers"]).get(PROFILE_HEADER) in (b"1", b"true")
+        if not _selected(requested):
+            await self.app(scope, receive, send)
+            return
+
+        name = f"{scope['method']} {scope['path']}"
+        sampler = StackSampler(name, _interval()).start()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            profiles.add(name, sampler.stop())
+
+
+def instrument_celery():
+    """Profile a sampled fraction of Celery tasks on the task's own thread"""
+    from celery.signals import task_postrun, task_prerun
+
+    running = {}
+
+    @task_prerun.connect(weak=False)
+    def start(task_id=None, task=None, **kwargs):
+        if _selected(False):
+            name = task.name if task else "task"
+            running[task_id] = (name, StackSampler(name, _interval(), {threading.get_ident()}).start())
+
+    @task_postrun.connect(weak=False)
+    def stop(task_id=None, **kwargs):
+        entry = running.pop(task_id, None)
+        if entry is not None:
+            name, sampler = entry
+            profiles.add(name, sampler.stop())
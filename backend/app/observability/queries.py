@@ -0,0 +1,211 @@
+"""Per-request and per-task SQL query accounting.
+
+``install(engine)`` hooks the engine's cursor events. Queries executed while
+a ``track_queries()`` scope is active (every HTTP request through
+``QueryStatsMiddleware``, every Celery task through ``instrument_celery``)
+are counted and timed into that scope's ``QueryStats``. Statements slower
+than ``Settings.slow_query_ms`` are logged with their ``EXPLAIN`` plan, and
+scopes that exceed the query budget or repeat one statement many times
+(the N+1 pattern) are logged as well.
+"""
+import contextvars
+import heapq
+import logging
+import time
+import weakref
+from collections import Counter
+from contextlib import contextmanager
+
+from sqlalchemy import event
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+SLOWEST_KEPT = 5
+
+_current = contextvars.ContextVar("query_stats", default=None)
+_installed = weakref.WeakSet()
+
+
+class QueryStats:
+    def __init__(self, name: str = ""):
+        self.name = name
+        self.count = 0
+        self.total_seconds = 0.0
+        self.statements = Counter()
+        self._slowest = []  # min-heap of (seconds, seq, statement, params shape)
+
+    def record(self, statement: str, parameters, seconds: float, executemany: bool):
+        self.count += 1
+        self.total_seconds += seconds
+        self.statements[statement] += 1
+        entry = (seconds, self.count, statement, param_shape(parameters, executemany))
+        if len(self._slowest) < SLOWEST_KEPT:
+            heapq.heappush(self._slowest, entry)
+        elif seconds > self._slowest[0][0]:
+            heapq.heapreplace(self._slowest, entry)
+
+    @property
+    def slowest(self) -> list:
+        return [
+            {"seconds": round(s, 6), "statement": stmt, "params": shape}
+            for s, _, stmt, shape in sorted(self._slowest, reverse=True)
+        ]
+
+    def repeated(self, threshold: int) -> list:
+        """Statements executed at least ``threshold`` times (likely N+1 loops)"""
+        return [(stmt, n) for stmt, n in self.statements.most_common() if n >= threshold]
+
+    def report(self):
+        """Log budget overruns and repeated statements for the finished scope"""
+        budget = settings.query_budget
+        if budget and self.count > budget:
+            logger.warning(
+                "%s ran %d queries (budget %d, %.1f ms); slowest: %s",
+                self.name, self.count, budget, self.total_seconds * 1000, self.slowest
+            )
+        threshold = settings.n_plus_one_threshold
+        if threshold:
+            for statement, n in self.repeated(threshold):
+                logger.warning("%s: possible N+1, statement ran %d times: %s", self.name, n, statement)
+
+
+def param_shape(parameters, executemany: bool = False) -> str:
+    """Describe bound parameters without their values"""
+    if executemany:
+        first = parameters[0] if parameters else ()
+        return f"executemany x{len(parameters)} of {param_shape(first)}"
+    if isinstance(parameters, dict):
+        return "{" + ", ".join(sorted(parameters)) + "}"
+    if parameters is None:
+        return "()"
+    return f"({len(parameters)} positional)"
+
+
+def current_stats():
+    return _current.get()
+
+
+@contextmanager
+def track_queries(name: str = ""):
+    """Count queries in this context (and threads it spawns via copied contexts)"""
+    stats = QueryStats(name)
+    token = _current.set(stats)
+    try:
+        yield stats
+    finally:
+        _current.reset(token)
+
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+
+@contextmanager
+def assert_max_queries(budget: int):
+    """Fail when the block runs more than ``budget`` queries (test helper)"""
+    with track_queries(f"<budget {budget}>") as stats:
+        yield stats
+    if stats.count > budget:
+        listing = "\n".join(f"  {n} x {stmt}" for stmt, n in stats.statements.most_common())
+        raise QueryBudgetExceeded(f"{stats.count} queries exceeded the budget of {budget}:\n{listing}")
+
+
+def _explain(cursor, dialect_name: str, statement: str, parameters):
+    prefix = {"postgresql": "EXPLAIN ", "sqlite": "EXPLAIN QUERY PLAN "}.get(dialect_name)
+    if prefix is None or not statement.lstrip().upper().startswith(("SELECT", "WITH")):
+        return None
+    # A fresh DBAPI cursor so the explain neither re-enters these hooks nor disturbs the result being read
+    explain_cursor = cursor.connection.cursor()
+    try:
+        explain_cursor.execute(prefix + statement, parameters)
+        return "\n".join(" ".join(str(col) for col in row) for row in explain_cursor.fetchall())
+    except Exception as e:
+        return f"<explain failed: {e}>"
+    finally:
+        explain_cursor.close()
+
+
+def install(engine):
+    """Attach the timing hooks to ``engine`` (idempotent)"""
+    if engine in _installed:
+        return
+    _installed.add(engine)
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def before(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def after(conn, cursor, statement, parameters, context, executemany):
+        seconds = time.perf_counter() - conn.info["query_start"].pop()
+        stats = _current.get()
+        if stats is not None:
+            stats.record(statement, parameters, seconds, executemany)
+        if settings.slow_query_ms and seconds * 1000 >= settings.slow_query_ms:
+            plan = None
+            if settings.slow_query_explain and not executemany:
+                plan = _explain(cursor, conn.dialect.name, statement, parameters)
+            logger.warning(
+                "Slow query (%.1f ms, params %s): %s%s",
+                seconds * 1000, param_shape(parameters, executemany), statement,
+                f"\nPlan:\n{plan}" if plan else ""
+            )
+
+    @event.listens_for(engine, "handle_error")
+    def failed(context):
+        # A failing statement never reaches after_cursor_execute; drop its start time
+        stack = context.connection.info.get("query_start") if context.connection is not None else None
+        if stack:
+            stack.pop()
+
+
+class QueryStatsMiddleware:
+    """Tracks each HTTP request's queries; in debug mode reports them in ``X-DB-*`` headers"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        with track_queries(f"{scope['method']} {scope['path']}") as stats:
+            async def send_wrapper(message):
+                if message["type"] == "http.response.start" and settings.debug:
+                    message.setdefault("headers", [])
+                    message["headers"] = list(message["headers"]) + [
+                        (b"x-db-queries", str(stats.count).encode()),
+                        (b"x-db-time-ms", f"{stats.total_seconds * 1000:.2f}".encode()),
+                    ]
+                await send(message)
+
+            await self.app(scope, receive, send_wrapper)
+        stats.report()
+
+
+def instrument_celery():
+    """Track queries per Celery task through the task_prerun/task_postrun signals"""
+    from celery.signals import task_postrun, task_prerun
+
+    scopes = {}
+
+    @task_prerun.connect(weak=False)
+    def start(task_id=None, task=None, **kwargs):
+        stats = QueryStats(task.name if task else "task")
+        scopes[task_id] = (stats, _current.set(stats))
+
+    @task_postrun.connect(weak=False)
+    def stop(task_id=None, task=None, **kwargs):
+        scope = scopes.pop(task_id, None)
+        if scope is None:
+            return
+        stats, token = scope
+        _current.reset(token)
+        logger.info(
+            "%s ran %d queries in %.1f ms; slowest: %s",
+            stats.name, stats.count, stats.total_seconds * 1000, stats.slowest
+        )
+        stats.report()
@@ -0,0 +1,387 @@
+"""Lightweight in-process tracing.
+
+Spans form traces across the HTTP request, the ``get_db`` session, ORM
+flushes, commits and individual SQL statements. In workers they cover the
+Celery task and the personalization stages. Trace context travels in W3C
+``traceparent`` form:
+- in from clients, via the request header
+- into Celery tasks, via a message header
+- into local pool tasks, as an argument
+- through the re-personalization outbox, via ``personalization_events.trace_context``;
+  it is recorded as span links because events from many requests coalesce
+  into one run
+
+Finished spans go to an in-memory ring buffer, served by
+``/v1/admin/traces``, and optionally to a JSON-lines file. No collector is
+needed. Spans are only recorded inside a sampled trace, so nothing is
+recorded while ``Settings.tracing_enabled`` is off.
+"""
+import atexit
+import contextvars
+import json
+import logging
+import os
+import random
+import threading
+import time
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+from functools import wraps
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session as SASession
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+MAX_LINKS = 50
+STATEMENT_CHARS = 300
+
+_current = contextvars.ContextVar("trace_span", default=None)
+
+
+class Span:
+    __slots__ = ("trace_id", "span_id", "parent_id", "name", "start", "_t0", "duration_ms",
+                 "attributes", "links", "status", "_token")
+
+    def __init__(self, name: str, trace_id: str, parent_id: str = None, attributes: dict = None):
+        self.trace_id = trace_id
+        self.span_id = os.urandom(8).hex()
+        self.parent_id = parent_id
+        self.name = name
+        self.start = time.time()
+        self._t0 = time.perf_counter()
+        self.duration_ms = None
+        self.attributes = attributes or {}
+        self.links = []
+        self.status = "ok"
+        self._token = None
+
+    @property
+    def traceparent(self) -> str:
+        return f"00-{self.trace_id}-{self.span_id}-01"
+
+    def set(self, **attributes):
+        self.attributes.update(attributes)
+
+    def finish(self):
+        if self.duration_ms is None:
+            self.duration_ms = round((time.perf_counter() - self._t0) * 1000, 3)
+            spans.export(self)
+
+    def to_dict(self) -> dict:
+        return {
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "start": self.start,
+            "duration_ms": self.duration_ms,
+            "attributes": self.attributes,
+            "links": self.links,
+            "status": self.status
+        }
+
+
+class SpanBuffer:
+    """Ring buffer of finished spans, optionally mirrored to a JSON-lines file.
+
+    The file stays open between spans (reopened if ``Settings.trace_file``
+    changes) and is written under its own lock, so readers of the buffer
+    never wait on file I/O.
+    """
+
+    def __init__(self, maxlen: int):
+        self._spans = deque(maxlen=maxlen)
+        self._lock = threading.Lock()
+        self._file_lock = threading.Lock()
+        self._file = None
+
+    def export(self, span: Span):
+        record = span.to_dict()
+        with self._lock:
+            self._spans.append(record)
+        path = settings.trace_file
+        if path:
+            line = json.dumps(record, default=str) + "\n"
+            with self._file_lock:
+                try:
+                    self._open(path).write(line)
+                except OSError:
+                    logger.warning("Could not write span to %s", path, exc_info=True)
+
+    def _open(self, path: str):
+        """The open trace file for ``path``, line-buffered so it can be tailed"""
+        if self._file is None or self._file.name != path:
+            self._close()
+            self._file = open(path, "a", buffering=1)
+        return self._file
+
+    def _close(self):
+        if self._file is not None:
+            try:
+                self._file.close()
+            except OSError:
+                pass
+            self._file = None
+
+    def close(self):
+        with self._file_lock:
+            self._close()
+
+    def trace(self, trace_id: str) -> list:
+        with self._lock:
+            return sorted((s for s in self._spans if s["trace_id"] == trace_id), key=lambda s: s["start"])
+
+    def recent_traces(self, limit: int) -> list:
+        """Newest traces first, each as its list of buffered spans"""
+        with self._lock:
+            records = list(self._spans)
+        traces = OrderedDict()
+        for record in reversed(records):
+            traces.setdefault(record["trace_id"], []).append(record)
+            if len(traces) > limit:
+                traces.popitem()
+                break
+        return [sorted(group, key=lambda s: s["start"]) for group in traces.values()]
+
+    def clear(self):
+        with self._lock:
+            self._spans.clear()
+
+
+spans = SpanBuffer(settings.trace_buffer_size)
+atexit.register(spans.close)
+
+
+def parse_traceparent(value):
+    """(trace_id, parent span id, sampled) from a W3C traceparent, or None if malformed"""
+    if not value:
+        return None
+    parts = value.strip().split("-")
+    if len(parts) != 4 or len(parts[1]) != 32 or len(parts[2]) != 16 or len(parts[3]) != 2:
+        return None
+    try:
+        flags = int(parts[3], 16)
+    except ValueError:
+        return None
+    return parts[1], parts[2], bool(flags & 1)
+
+
+def current_span():
+    return _current.get()
+
+
+def current_traceparent():
+    span = _current.get()
+    return span.traceparent if span is not None else None
+
+
+def start_span(name: str, activate: bool = False, **attributes):
+    """Child of the current span, or ``None`` outside a trace; the caller finishes it"""
+    parent = _current.get()
+    if parent is None:
+        return None
+    span = Span(name, parent.trace_id, parent.span_id, attributes)
+    if activate:
+        span._token = _current.set(span)
+    return span
+
+
+def end_span(span, error: bool = False):
+    if span is None:
+        return
+    if error:
+        span.status = "error"
+    if span._token is not None:
+        _current.reset(span._token)
+        span._token = None
+    span.finish()
+
+
+@contextmanager
+def span(name: str, **attributes):
+    """Child span around the block (a no-op outside a trace)"""
+    child = start_span(name, activate=True, **attributes)
+    try:
+        yield child
+    except BaseException:
+        end_span(child, error=True)
+        raise
+    end_span(child)
+
+
+@contextmanager
+def trace(name: str, traceparent: str = None, remote: bool = False, **attributes):
+    """Root span of a trace, continuing ``traceparent`` when given.
+
+    A parent whose sampled flag is off is never recorded. New traces are
+    sampled at ``Settings.trace_sample_rate``, and so are sampled parents
+    from outside the system (``remote``, e.g. HTTP clients), so callers
+    cannot force recording. Sampled parents from our own workers always
+    record. Yields ``None`` when not recording.
+    """
+    parent = parse_traceparent(traceparent)
+    if parent is not None and not parent[2]:
+        record = False
+    elif parent is not None and not remote:
+        record = True
+    else:
+        record = random.random() < settings.trace_sample_rate
+    if not settings.tracing_enabled or not record:
+        yield None
+        return
+    trace_id, parent_id = parent[:2] if parent else (os.urandom(16).hex(), None)
+    root = Span(name, trace_id, parent_id, attributes)
+    root._token = _current.set(root)
+    try:
+        yield root
+    except BaseException:
+        end_span(root, error=True)
+        raise
+    end_span(root)
+
+
+def traced(name: str):
+    """Decorator: run the function in a child span"""
+    def decorate(fn):
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+def add_links(traceparents):
+    """Link the current span to the traces that caused its work"""
+    current = _current.get()
+    if current is None:
+        return
+    for value in traceparents:
+        if value and len(current.links) < MAX_LINKS and value not in current.links:
+            current.links.append(value)
+
+
+_installed = set()
+
+
+def install(engine):
+    """SQL statement spans for ``engine``, plus ORM flush and commit spans (idempotent)"""
+    if id(engine) in _installed:
+        return
+    _installed.add(id(engine))
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def before(conn, cursor, statement, parameters, context, executemany):
+        sql = start_span("db.query", statement=statement[:STATEMENT_CHARS])
+        if sql is not None and executemany:
+            sql.set(rows=len(parameters))
+        conn.info.setdefault("trace_spans", []).append(sql)
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def after(conn, cursor, statement, parameters, context, executemany):
+        end_span(conn.info["trace_spans"].pop())
+
+    @event.listens_for(engine, "handle_error")
+    def failed(context):
+        stack = context.connection.info.get("trace_spans") if context.connection is not None else None
+        if stack:
+            end_span(stack.pop(), error=True)
+
+    _install_session_hooks()
+
+
+_session_hooks = []
+
+
+def _install_session_hooks():
+    if _session_hooks:
+        return
+    _session_hooks.append(True)
+
+    def opener(name):
+        def open_span(session, *args):
+            session.info.setdefault("trace_spans", []).append(start_span(name, activate=True))
+        return open_span
+
+    def closer(name, error=False):
+        def close_span(session, *args):
+            stack = session.info.get("trace_spans") or []
+            # Unwind to the matching span; anything above it never finished
+            while stack:
+                child = stack.pop()
+                finished = child is None or child.name == name
+                end_span(child, error=error or not finished)
+                if finished:
+                    break
+        return close_span
+
+    event.listen(SASession, "before_flush", opener("orm.flush"))
+    event.listen(SASession, "after_flush_postexec", closer("orm.flush"))
+    event.listen(SASession, "before_commit", opener("db.commit"))
+    event.listen(SASession, "after_commit", closer("db.commit"))
+    event.listen(SASession, "after_rollback", closer("db.commit", error=True))
+
+
+class TracingMiddleware:
+    """Root span per HTTP request; continues an incoming ``traceparent`` and returns ``X-Trace-Id``"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not settings.tracing_enabled:
+            await self.app(scope, receive, send)
+            return
+
+        traceparent = dict(scope["headers"]).get(b"traceparent", b"").decode("latin-1")
+        with trace(f"{scope['method']} {scope['path']}", traceparent, remote=True) as root:
+            if root is None:
+                await self.app(scope, receive, send)
+                return
+
+            async def send_wrapper(message):
+                if message["type"] == "http.response.start":
+                    root.set(status=message["status"])
+                    message["headers"] = list(message.get("headers", [])) + [
+                        (b"x-trace-id", root.trace_id.encode())
+                    ]
+                await send(message)
+
+            await self.app(scope, receive, send_wrapper)
+            route = scope.get("route")
+            if route is not None:
+                root.set(route=getattr(route, "path", None))
+
+
+def instrument_celery():
+    """Trace Celery tasks, continuing the publisher's trace from the message headers"""
+    from celery.signals import before_task_publish, task_postrun, task_prerun
+
+    running = {}
+
+    @before_task_publish.connect(weak=False)
+    def inject(headers=None, **kwargs):
+        traceparent = current_traceparent()
+        if traceparent and headers is not None:
+            headers["traceparent"] = traceparent
+
+    @task_prerun.connect(weak=False)
+    def start(task_id=None, task=None, **kwargs):
+        request = task.request if task else None
+        traceparent = getattr(request, "traceparent", None) or (getattr(request, "headers", None) or {}).get("traceparent")
+        scope = trace(task.name if task else "task", traceparent, task_id=task_id)
+        scope.__enter__()
+        running[task_id] = scope
+
+    @task_postrun.connect(weak=False)
+    def stop(task_id=None, state=None, **kwargs):
+        scope = running.pop(task_id, None)
+        if scope is None:
+            return
+        root = current_span()
+        if root is not None and state is not None:
+            root.set(state=state)
+        scope.__exit__(None, None, None)
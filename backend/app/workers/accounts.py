@@ -0,0 +1,124 @@
+"""Background purge of deleted accounts.
+
+``POST /v1/account/delete`` tombstones the user and creates an
+``AccountDeletionJob``; ``purge_account`` then removes the data in bounded
+chunks, committing after each chunk so no long transaction holds locks on
+the metrics hypertable.
+"""
+from celery import current_app as celery_app
+from datetime import datetime, timezone, timedelta
+from sqlalchemy import delete, select
+
+from app.cache import plan_cache
+from app.config import settings
+from app.db.models import (
+    AccountDeletionJob, PersonalizationEvent, PersonalizationRunResult, Session, SessionLocal,
+    SessionMetric, SessionSummary, User, UserPlan, UserTrainingState
+)
+from app.workers.locks import task_lock
+
+# Jobs not updated for this long are assumed to have lost their executor
+STALLED_JOB_AFTER = timedelta(minutes=10)
+
+
+def _delete_chunk(db, key, ids) -> int:
+    """Delete the rows whose ``key`` column is in ``ids``"""
+    stmt = delete(key.table).where(key.in_(ids)).execution_options(synchronize_session=False)
+    return db.execute(stmt).rowcount
+
+
+def purge_account(job_id: str, session_factory, chunk_size: int = None):
+    """Delete a tombstoned user's data chunk by chunk, recording progress on the job"""
+    chunk_size = chunk_size or settings.account_delete_chunk_size
+
+    with task_lock(f"account-deletion:{job_id}", session_factory) as acquired:
+        if not acquired:
+            return
+
+        db = session_factory()
+        try:
+            job = db.get(AccountDeletionJob, job_id)
+            if job is None or job.status == "completed":
+                return
+            job.status = "running"
+            job.attempts = (job.attempts or 0) + 1
+            job.updated_at = datetime.now(timezone.utc)
+            db.commit()
+
+            user_sessions = select(Session.id).where(Session.user_id == job.user_id)
+
+            while True:
+                chunk = select(SessionMetric.id).where(
+                    SessionMetric.session_id.in_(user_sessions)
+                ).limit(chunk_size)
+                deleted = _delete_chunk(db, SessionMetric.id, chunk)
+                job.metrics_deleted += deleted
+                job.updated_at = datetime.now(timezone.utc)
+                db.commit()
+                if deleted < chunk_size:
+                    break
+
+            while True:
+                chunk = select(SessionSummary.session_id).where(
+                    SessionSummary.session_id.in_(user_sessions)
+                ).limit(chunk_size)
+                deleted = _delete_chunk(db, SessionSummary.session_id, chunk)
+                job.updated_at = datetime.now(timezone.utc)
+                db.commit()
+                if deleted < chunk_size:
+                    break
+
+            while True:
+                deleted = _delete_chunk(db, Session.id, user_sessions.limit(chunk_size))
+                job.sessions_deleted += deleted
+                job.updated_at = datetime.now(timezone.utc)
+                db.commit()
+                if deleted < chunk_size:
+                    break
+
+            # Per-user rows cascade from users on Postgres; deleted explicitly for SQLite
+            for model in (UserPlan, UserTrainingState, PersonalizationEvent, PersonalizationRunResult):
+                db.query(model).filter(model.user_id == job.user_id).delete(synchronize_session=False)
+            db.query(User).filter(User.id == job.user_id).delete(synchronize_session=False)
+
+            job.status = "completed"
+            job.finished_at = job.updated_at = datetime.now(timezone.utc)
+            db.commit()
+            plan_cache.invalidate([job.user_id])
+
+        except Exception as e:
+            db.rollback()
+            job = db.get(AccountDeletionJob, job_id)
+            job.status = "failed"
+            job.error = str(e)
+            job.updated_at = datetime.now(timezone.utc)
+            db.commit()
+            raise
+        finally:
+            db.close()
+
+
+@celery_app.task
+def resume_account_deletions():
+    """Restart deletion jobs whose executor died (e.g. an API restart).
+
+    Jobs that already ran ``Settings.account_delete_max_attempts`` times stay
+    failed for an operator to look at.
+    """
+
+    db = SessionLocal()
+    try:
+        cutoff = datetime.now(timezone.utc) - STALLED_JOB_AFTER
+        job_ids = [
+            row.id for row in db.query(AccountDeletionJob.id).filter(
+                AccountDeletionJob.status.in_(["pending", "running", "failed"]),
+                AccountDeletionJob.updated_at < cutoff,
+                AccountDeletionJob.attempts < settings.account_delete_max_attempts
+            )
+        ]
+    finally:
+        db.close()
+
+    for job_id in job_ids:
+        purge_account(job_id, SessionLocal)
+    return {"resumed_jobs": len(job_ids)}
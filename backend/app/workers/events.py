@@ -0,0 +1,116 @@
+"""Debounced per-user re-personalization events.
+
+``end_session`` records an event in ``personalization_events`` within its own
+transaction. Further sessions before the event is due coalesce into the same
+row, and a periodic task claims due events in batches and recomputes those
+users' plans.
+
+Claiming leases an event rather than deleting it: ``leased_until`` is set
+``Settings.repersonalize_lease_seconds`` ahead, and no other claim (due-event
+processing or a nightly sweep) takes the event until then. The event is
+deleted by ``complete_events`` once the plans are stored. If the run fails or
+the worker dies, the event can be claimed again when the lease runs out. A
+session that ends during the run refreshes ``requested_at``, so its event
+outlives the run and that later session is not lost.
+
+Each event stores its user's nightly slot, so a slot run claims only its
+own events, filtered in SQL.
+"""
+import zlib
+from datetime import datetime, timezone, timedelta
+
+from sqlalchemy import or_, tuple_
+
+from app.config import settings
+from app.db.models import PersonalizationEvent, dialect_insert
+from app.observability import tracing
+
+
+def slot_for_user(user_id: str, slots: int = None) -> int:
+    """Stable time-of-day slot for a user (CRC32 of the id)"""
+    return zlib.crc32(user_id.encode()) % (slots or settings.personalization_slots)
+
+
+def enqueue_repersonalization(db, user_id: str, now: datetime = None):
+    """Request a plan recompute for ``user_id`` (caller commits)"""
+    enqueue_repersonalizations(db, [user_id], now)
+
+
+def enqueue_repersonalizations(db, user_ids, now: datetime = None):
+    """Request plan recomputes for many users in one upsert per chunk (caller commits)"""
+    now = now or datetime.now(timezone.utc)
+    due_at = now + timedelta(seconds=settings.repersonalize_debounce_seconds)
+    trace_context = tracing.current_traceparent()
+    rows = [
+        {
+            "user_id": user_id, "requested_at": now, "due_at": due_at,
+            "trace_context": trace_context, "slot": slot_for_user(user_id)
+        }
+        for user_id in dict.fromkeys(user_ids)
+    ]
+    insert_ = dialect_insert(db)
+    for start in range(0, len(rows), 500):
+        stmt = insert_(PersonalizationEvent.__table__).values(rows[start:start + 500])
+        # A pending event keeps its due time; only the latest request time is noted
+        stmt = stmt.on_conflict_do_update(
+            index_elements=["user_id"],
+            set_={"requested_at": stmt.excluded.requested_at}
+        )
+        db.execute(stmt)
+
+
+def claim_due_events(db, now: datetime = None, limit: int = None, slot: int = None, user_ids=None) -> dict:
+    """Lease the events that are due and return ``{user_id: requested_at}``.
+
+    With ``now=None`` every pending event is claimed regardless of due time.
+    Events leased by another run are skipped either way. ``slot`` and
+    ``user_ids`` optionally restrict the claim. Rows locked by a concurrent
+    claimer are skipped on Postgres. Pass the result to ``complete_events``
+    after the plans are stored.
+    """
+    clock = now or datetime.now(timezone.utc)
+    query = db.query(
+        PersonalizationEvent.user_id, PersonalizationEvent.requested_at, PersonalizationEvent.trace_context
+    ).filter(
+        or_(PersonalizationEvent.leased_until.is_(None), PersonalizationEvent.leased_until <= clock)
+    )
+    if now is not None:
+        query = query.filter(PersonalizationEvent.due_at <= now)
+    if slot is not None:
+        query = query.filter(PersonalizationEvent.slot == slot)
+    if user_ids is not None:
+        query = query.filter(PersonalizationEvent.user_id.in_(list(user_ids)))
+    query = query.order_by(PersonalizationEvent.due_at)
+    if limit:
+        query = query.limit(limit)
+    rows = query.with_for_update(skip_locked=True).all()
+    claims = {row.user_id: row.requested_at for row in rows}
+    # The requests behind these events become links of the run's trace
+    tracing.add_links(row.trace_context for row in rows)
+
+    if claims:
+        lease_until = datetime.now(timezone.utc) + timedelta(seconds=settings.repersonalize_lease_seconds)
+        _set_lease(db, list(claims), lease_until)
+    db.commit()
+    return claims
+
+
+def complete_events(db, claims: dict):
+    """Delete claimed events whose users were not requested again during the run.
+
+    Events that were requested again stay, with their lease released.
+    """
+    pairs = list(claims.items())
+    for start in range(0, len(pairs), 500):
+        db.query(PersonalizationEvent).filter(
+            tuple_(PersonalizationEvent.user_id, PersonalizationEvent.requested_at).in_(pairs[start:start + 500])
+        ).delete(synchronize_session=False)
+    _set_lease(db, list(claims), None)
+    db.commit()
+
+
+def _set_lease(db, user_ids: list, leased_until):
+    for start in range(0, len(user_ids), 500):
+        db.query(PersonalizationEvent).filter(
+            PersonalizationEvent.user_id.in_(user_ids[start:start + 500])
+        ).update({PersonalizationEvent.leased_until: leased_until}, synchronize_session=False)
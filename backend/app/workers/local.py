@@ -0,0 +1,185 @@
+"""Broker-less execution of worker tasks on a local process pool.
+
+With ``Settings.task_backend = "local"`` tasks run on a ``ProcessPoolExecutor``
+instead of going through Redis and a Celery worker. Each pool process gets
+its own database engine. Run a task from the command line with::
+
+    python -m app.workers.local run_personalization
+    python -m app.workers.local run_personalization 2      # arguments are parsed as JSON
+
+Without a broker there is no Celery beat either. ``--schedule`` runs the
+beat schedule in the foreground: event recomputes, stale-session sweeps,
+resumed account deletions and the nightly slots. Run one such process per
+deployment::
+
+    python -m app.workers.local --schedule
+"""
+import argparse
+import importlib
+import json
+import logging
+import os
+import sys
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone, timedelta
+
+from sqlalchemy import create_engine
+
+from app.config import settings
+from app.observability import tracing
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+_in_worker = False
+
+
+def _init_worker(database_url: str):
+    """Give the pool process its own engine instead of the parent's connections"""
+    global _in_worker
+    _in_worker = True
+
+    from app.db import models
+    from app.workers import personalize
+
+    if database_url:
+        bind = create_engine(database_url, future=True)
+        models.SessionLocal.configure(bind=bind)
+        personalize.SessionLocal.configure(bind=bind)
+    else:
+        bind = models.engine
+        models.engine.dispose(close=False)
+    tracing.install(bind)
+
+
+def _run_task(task_name: str, args: tuple, kwargs: dict, traceparent: str = None):
+    run = _import_task(task_name)
+    with tracing.trace(task_name, traceparent):
+        return run(*args, **kwargs)
+
+
+def get_executor(database_url: str = "") -> ProcessPoolExecutor:
+    global _executor
+    if _executor is None:
+        _executor = ProcessPoolExecutor(
+            max_workers=settings.local_workers or os.cpu_count(),
+            initializer=_init_worker,
+            initargs=(database_url,)
+        )
+    return _executor
+
+
+def shutdown():
+    global _executor
+    if _executor is not None:
+        _executor.shutdown()
+        _executor = None
+
+
+def parallel_available() -> bool:
+    """Whether fan-out to the pool is possible from this process"""
+    return settings.task_backend == "local" and not _in_worker
+
+
+def submit(task, *args, **kwargs):
+    """Run a Celery task's function on the pool; returns a ``Future``"""
+    return get_executor().submit(_run_task, task.name, args, kwargs, tracing.current_traceparent())
+
+
+def _import_task(task_name: str):
+    module_name, attr = task_name.rsplit(".", 1)
+    task = getattr(importlib.import_module(module_name), attr)
+    return getattr(task, "run", task)
+
+
+def _utcnow() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+def schedule_entries(beat_schedule: dict, tasks: dict = None, now=None) -> list:
+    """``(name, run, args, schedule)`` per beat entry; numeric schedules become intervals.
+
+    Task names are looked up in ``tasks`` first and imported otherwise.
+    ``now`` is the clock given to interval schedules.
+    """
+    from celery.schedules import schedule
+
+    tasks = tasks or {}
+    entries = []
+    for name, entry in beat_schedule.items():
+        every = entry["schedule"]
+        if isinstance(every, (int, float)):
+            every = schedule(timedelta(seconds=every), nowfun=now)
+        run = tasks.get(entry["task"]) or _import_task(entry["task"])
+        entries.append((name, run, tuple(entry.get("args", ())), every))
+    return entries
+
+
+def run_schedule(beat_schedule: dict = None, stop: threading.Event = None, tick: float = 1.0,
+                 tasks: dict = None, now=None, wait=None):
+    """Run due beat entries in this process until ``stop`` is set.
+
+    Like Celery beat, each entry first runs one interval after start. Entries
+    run one at a time; a failing entry is logged and retried on its next due time.
+    ``tasks``, ``now`` and ``wait`` (called with ``tick`` between passes) replace
+    the task lookup, clock and sleep, e.g. in tests.
+    """
+    if beat_schedule is None:
+        from app.celery_app import celery_app
+        beat_schedule = celery_app.conf.beat_schedule
+    now = now or _utcnow
+    stop = stop or threading.Event()
+    wait = wait or stop.wait
+    entries = schedule_entries(beat_schedule, tasks, now)
+    started = now()
+    last_run = {name: started for name, _, _, _ in entries}
+
+    while not stop.is_set():
+        for name, run, args, every in entries:
+            due, _ = every.is_due(last_run[name])
+            if not due or stop.is_set():
+                continue
+            last_run[name] = now()
+            try:
+                logger.info("Running scheduled %s", name)
+                run(*args)
+            except Exception:
+                logger.exception("Scheduled %s failed", name)
+        wait(tick)
+
+
+def _argument(value: str):
+    try:
+        return json.loads(value)
+    except ValueError:
+        return value
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(prog="python -m app.workers.local")
+    parser.add_argument("task", nargs="?", help="task in app.workers.personalize, e.g. run_personalization")
+    parser.add_argument("args", nargs="*", type=_argument, help="task arguments, parsed as JSON (strings as-is)")
+    parser.add_argument("--schedule", action="store_true", help="run the beat schedule until interrupted")
+    args = parser.parse_args(argv)
+    if not args.schedule and not args.task:
+        parser.error("a task or --schedule is required")
+
+    settings.task_backend = "local"
+    try:
+        if args.schedule:
+            logging.basicConfig(level=settings.log_level)
+            try:
+                run_schedule()
+            except KeyboardInterrupt:
+                pass
+        else:
+            from app.workers import personalize
+            print(getattr(personalize, args.task).run(*args.args))
+    finally:
+        shutdown()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
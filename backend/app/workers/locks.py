@@ -0,0 +1,156 @@
+"""Distributed locks that keep scheduled runs from overlapping.
+
+``Settings.lock_backend`` selects Redis (``SET NX PX`` with a compare-and-delete
+release) or the ``task_locks`` table. Both expire after ``ttl`` seconds so a
+crashed holder cannot block later runs forever. While ``task_locks`` holds
+them, a background thread extends them every third of the ttl, so a long
+run keeps its locks.
+"""
+import logging
+import threading
+import uuid
+from contextlib import contextmanager
+from datetime import datetime, timezone, timedelta
+
+from app.config import settings
+from app.db.models import TaskLock, dialect_insert
+
+logger = logging.getLogger(__name__)
+
+_REDIS_EXTEND = """
+if redis.call("get", KEYS[1]) == ARGV[1] then
+    return redis.call("pexpire", KEYS[1], ARGV[2])
+end
+return 0
+"""
+
+_REDIS_RELEASE = """
+if redis.call("get", KEYS[1]) == ARGV[1] then
+    return redis.call("del", KEYS[1])
+end
+return 0
+"""
+
+
+class RedisLock:
+    def __init__(self, client, name: str, ttl: int):
+        self.client = client
+        self.name = name
+        self.key = "aicoach:lock:" + name
+        self.ttl = ttl
+        self.token = str(uuid.uuid4())
+
+    def acquire(self) -> bool:
+        return bool(self.client.set(self.key, self.token, nx=True, px=self.ttl * 1000))
+
+    def extend(self) -> bool:
+        return bool(self.client.eval(_REDIS_EXTEND, 1, self.key, self.token, self.ttl * 1000))
+
+    def release(self):
+        self.client.eval(_REDIS_RELEASE, 1, self.key, self.token)
+
+
+class DatabaseLock:
+    def __init__(self, session_factory, name: str, ttl: int):
+        self.session_factory = session_factory
+        self.name = name
+        self.ttl = ttl
+        self.token = str(uuid.uuid4())
+
+    def acquire(self) -> bool:
+        now = datetime.now(timezone.utc)
+        table = TaskLock.__table__
+        with self.session_factory() as db:
+            stmt = dialect_insert(db)(table).values(
+                name=self.name, owner=self.token, expires_at=now + timedelta(seconds=self.ttl)
+            )
+            # Take over only locks whose holder let them expire
+            stmt = stmt.on_conflict_do_update(
+                index_elements=[table.c.name],
+                set_={"owner": stmt.excluded.owner, "expires_at": stmt.excluded.expires_at},
+                where=table.c.expires_at < now
+            )
+            acquired = db.execute(stmt).rowcount == 1
+            db.commit()
+        return acquired
+
+    def extend(self) -> bool:
+        """Push the expiry ``ttl`` seconds ahead, if the lock is still ours"""
+        expires_at = datetime.now(timezone.utc) + timedelta(seconds=self.ttl)
+        with self.session_factory() as db:
+            extended = db.query(TaskLock).filter(
+                TaskLock.name == self.name,
+                TaskLock.owner == self.token
+            ).update({TaskLock.expires_at: expires_at}, synchronize_session=False)
+            db.commit()
+        return extended == 1
+
+    def release(self):
+        with self.session_factory() as db:
+            db.query(TaskLock).filter(
+                TaskLock.name == self.name,
+                TaskLock.owner == self.token
+            ).delete(synchronize_session=False)
+            db.commit()
+
+
+def make_lock(name: str, ttl: int, session_factory):
+    if settings.lock_backend == "redis":
+        import redis
+        return RedisLock(redis.Redis.from_url(settings.redis_url), name, ttl)
+    return DatabaseLock(session_factory, name, ttl)
+
+
+@contextmanager
+def task_lock(name: str, session_factory, ttl: int = None):
+    """Yield True while holding ``name``, or False if another holder has it"""
+    with task_locks([name], session_factory, ttl) as acquired:
+        yield acquired
+
+
+@contextmanager
+def task_locks(names: list, session_factory, ttl: int = None):
+    """Yield True while holding every lock in ``names``, or False if any is held elsewhere.
+
+    Locks are taken in order and the ones already taken are released again
+    when a later one is busy.
+    """
+    ttl = ttl or settings.personalization_lock_ttl_seconds
+    held = []
+    try:
+        for name in names:
+            lock = make_lock(name, ttl, session_factory)
+            if not lock.acquire():
+                break
+            held.append(lock)
+        else:
+            with _renewing(held, ttl):
+                yield True
+            return
+        yield False
+    finally:
+        for lock in reversed(held):
+            lock.release()
+
+
+@contextmanager
+def _renewing(locks: list, ttl: int):
+    """Extend ``locks`` every third of ``ttl`` until the block exits"""
+    stop = threading.Event()
+
+    def renew():
+        while not stop.wait(ttl / 3):
+            for lock in locks:
+                try:
+                    if not lock.extend():
+                        logger.warning("Lock %s expired before it could be extended", lock.name)
+                except Exception:
+                    logger.warning("Could not extend lock", exc_info=True)
+
+    thread = threading.Thread(target=renew, name="lock-renewal", daemon=True)
+    thread.start()
+    try:
+        yield
+    finally:
+        stop.set()
+        thread.join()
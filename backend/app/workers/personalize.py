@@ -2,81 +2,248 @@ from celery import current_app as celery_app
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy import func, and_
 from datetime import datetime, timezone, timedelta
+import hashlib
 import json
 import statistics
-import os
+import time
 
-from app.db.models import User, Session, SessionMetric, engine
+from app.analytics.workload import workload_snapshot
+from app.cache import plan_cache
+from app.config import settings
+from app.db.models import Session, SessionMetric, UserPlan, UserTrainingState, dialect_insert, engine
+from app.observability import memory, tracing
+from app.workers import local
+from app.workers.events import claim_due_events, complete_events, slot_for_user
+from app.workers.locks import task_locks
+from app.workers.plan_rules import load_plan_rules
+from app.workers.runs import RunResultSink, RunStats, start_run, finish_run
 
 # Create database session for worker
 SessionLocal = sessionmaker(bind=engine)
 
+# Compiled plan rule table
+plan_rules = load_plan_rules(settings.plan_rules_path)
+
+# Users analyzed, planned and stored together
+PERSONALIZE_CHUNK_SIZE = 500
+
+# Number of plans written per INSERT ... ON CONFLICT statement
+PLAN_UPSERT_CHUNK_SIZE = 1000
+
+@celery_app.task
+def run_personalization(slot: int = None):
+    """Nightly catch-up sweep.
+    
+    Plans are normally recomputed shortly after each session through debounced
+    events; this picks up events that have not fired yet and active users
+    that still have no plan. With ``slot`` only users hashed into that slot
+    are swept, so the night's load is spread over several hourly runs. A
+    distributed lock per slot keeps runs from overlapping; a run without
+    ``slot`` covers every slot and so takes all of their locks. Returns counters
+    and stage timings only; per-user outcomes are written to
+    ``personalization_run_results``.
+    """
+    
+    slots = range(settings.personalization_slots) if slot is None else [slot]
+    lock_names = [f"personalization:slot:{s}" for s in slots]
+    with task_locks(lock_names, SessionLocal) as acquired:
+        if not acquired:
+            return {"skipped": True, "reason": "a personalization run for these slots is in progress"}
+        
+        db = SessionLocal()
+        try:
+            run = start_run(db, "run_personalization" if slot is None else f"run_personalization[slot={slot}]")
+            stats = RunStats()
+            seven_days_ago = datetime.now(timezone.utc) - timedelta(days=7)
+            
+            in_slot = None
+            if slot is not None:
+                in_slot = lambda user_id: slot_for_user(user_id) == slot
+            
+            with stats.stage("select_users"):
+                claims = claim_due_events(db, slot=slot)
+                user_ids = set(claims)
+                
+                # Users active in the last 7 days without any stored plan
+                missing_plan = db.query(Session.user_id).outerjoin(
+                    UserPlan, UserPlan.user_id == Session.user_id
+                ).filter(
+                    Session.started_at >= seven_days_ago,
+                    UserPlan.user_id.is_(None)
+                ).distinct()
+                user_ids.update(
+                    row.user_id for row in missing_plan
+                    if in_slot is None or in_slot(row.user_id)
+                )
+            
+            counts = personalize_all(db, sorted(user_ids), seven_days_ago, run, stats)
+            complete_events(db, claims)
+            return finish_run(db, run, counts, stats)
+            
+        finally:
+            db.close()
+
+
 @celery_app.task
-def run_personalization():
-    """Nightly personalization job - analyze last 7 days and adjust plans"""
+def process_personalization_events():
+    """Recompute plans for users whose debounced events are due"""
     
     db = SessionLocal()
     try:
-        # Get all users who had activity in the last 7 days
-        seven_days_ago = datetime.now(timezone.utc) - timedelta(days=7)
-        
-        active_users = db.query(User).join(Session).filter(
-            Session.started_at >= seven_days_ago
-        ).distinct().all()
-        
-        results = []
+        return process_due_events(db)
+    finally:
+        db.close()
+
+
+@celery_app.task
+def personalize_shard(user_ids: list, since: str, run_id: str):
+    """Personalize one shard of users; the fan-out unit for parallel execution.
+    
+    Returns the shard's counters plus its ``RunStats`` as a dict under ``stats``.
+    """
+    
+    db = SessionLocal()
+    try:
+        stats = RunStats()
+        counts = personalize_users(db, user_ids, datetime.fromisoformat(since), RunResultSink(db, run_id), stats=stats)
+        return {**counts, "stats": stats.to_dict()}
+    finally:
+        db.close()
+
+
+def personalize_all(db, user_ids: list, since: datetime, run, stats: RunStats = None) -> dict:
+    """Personalize inline, or spread shards over the local process pool when enabled"""
+    
+    if not local.parallel_available() or len(user_ids) <= PERSONALIZE_CHUNK_SIZE:
+        return personalize_users(db, user_ids, since, RunResultSink(db, run.id), stats=stats)
+    
+    futures = [
+        local.submit(personalize_shard, user_ids[start:start + PERSONALIZE_CHUNK_SIZE], since.isoformat(), run.id)
+        for start in range(0, len(user_ids), PERSONALIZE_CHUNK_SIZE)
+    ]
+    counts = {"processed_users": 0, "successful_updates": 0, "plans_changed": 0}
+    for future in futures:
+        shard = future.result()
+        shard_stats = shard.pop("stats")
+        if stats is not None:
+            stats.merge(shard_stats)
+        for key, value in shard.items():
+            counts[key] += value
+    return counts
+
+
+def process_due_events(db, now: datetime = None) -> dict:
+    now = now or datetime.now(timezone.utc)
+    stats = RunStats()
+    with stats.stage("select_users"):
+        claims = claim_due_events(db, now, settings.repersonalize_batch_size)
+    if not claims:
+        return {"processed_users": 0, "successful_updates": 0, "plans_changed": 0}
+    
+    run = start_run(db, "process_personalization_events")
+    counts = personalize_users(db, list(claims), now - timedelta(days=7), RunResultSink(db, run.id), stats=stats)
+    complete_events(db, claims)
+    return finish_run(db, run, counts, stats)
+
+
+def personalize_users(db, user_ids: list, since: datetime, sink=None,
+                      chunk_size: int = PERSONALIZE_CHUNK_SIZE, stats: RunStats = None) -> dict:
+    """Analyze users chunk by chunk, generating and storing each chunk's plans in bulk.
+    
+    Per-user outcomes go to ``sink`` as they are produced; only counters are
+    kept, so memory stays bounded by the chunk size. Stage times and per-user
+    analysis latency are added to ``stats``.
+    """
+    
+    counts = {"processed_users": 0, "successful_updates": 0, "plans_changed": 0}
+    stats = stats if stats is not None else RunStats()
+    
+    for start in range(0, len(user_ids), chunk_size):
+        chunk = user_ids[start:start + chunk_size]
+        with stats.stage("load"), tracing.span("personalize.load", users=len(chunk)):
+            chunk_data = load_performance_data(db, chunk, since)
+        stats.metric_rows_loaded += sum(len(metrics) for _, metrics, _ in chunk_data.values())
+        now = datetime.now(timezone.utc)
+        analyses = {}
         
-        for user in active_users:
-            try:
-                user_analysis = analyze_user_performance(db, user.id, seven_days_ago)
-                updated_plan = generate_personalized_plan(user_analysis)
-                
-                # Store updated plan (in production, this would go to a plans table)
-                store_user_plan(user.id, updated_plan)
+        with stats.stage("analyze"), tracing.span("personalize.analyze", users=len(chunk)) as analyze_span:
+            for user_id in chunk:
+                user_start = time.perf_counter()
+                try:
+                    user_analysis = summarize_performance(*chunk_data[user_id], now)
+                    analyses[user_id] = user_analysis
+                    outcome = {
+                        "user_id": user_id,
+                        "analysis": user_analysis,
+                        "plan_updated": True
+                    }
+                    counts["successful_updates"] += 1
+                    
+                except Exception as e:
+                    outcome = {
+                        "user_id": user_id,
+                        "error": str(e),
+                        "plan_updated": False
+                    }
                 
-                results.append({
-                    "user_id": user.id,
-                    "analysis": user_analysis,
-                    "plan_updated": True
-                })
-                
-            except Exception as e:
-                results.append({
-                    "user_id": user.id,
-                    "error": str(e),
-                    "plan_updated": False
-                })
+                stats.observe_user(time.perf_counter() - user_start)
+                counts["processed_users"] += 1
+                if sink is not None:
+                    sink.add(outcome)
+            if analyze_span is not None:
+                analyze_span.set(failed=len(chunk) - len(analyses))
         
-        return {
-            "processed_users": len(results),
-            "successful_updates": len([r for r in results if r.get("plan_updated")]),
-            "results": results
-        }
+        # Evaluate the rule table for the whole chunk at once
+        with stats.stage("generate"), tracing.span("personalize.generate", users=len(analyses)):
+            plans = dict(zip(analyses, generate_personalized_plans(list(analyses.values()))))
         
-    finally:
-        db.close()
+        # Store plans in bulk; unchanged plans are skipped by the upsert
+        with stats.stage("store"), tracing.span("personalize.store", plans=len(plans)):
+            counts["plans_changed"] += store_user_plans(db, plans)
+        memory.maybe_checkpoint(counts["processed_users"])
+    
+    if sink is not None:
+        sink.flush()
+    return counts
 
 
-def analyze_user_performance(db, user_id: str, since: datetime) -> dict:
-    """Analyze user's performance over the last 7 days"""
+def load_performance_data(db, user_ids: list, since: datetime) -> dict:
+    """Sessions count, metric rows and training state for many users in three queries.
     
-    # Get user's sessions in the period
-    sessions = db.query(Session).filter(
-        and_(
-            Session.user_id == user_id,
-            Session.started_at >= since
-        )
-    ).all()
+    Returns ``{user_id: (session_count, metrics, state)}`` where metrics are
+    row tuples with ``hr``, ``hrv``, ``rep``, ``tempo`` and ``error_flags``.
+    """
     
-    if not sessions:
-        return {"error": "No sessions found"}
+    in_period = and_(Session.user_id.in_(user_ids), Session.started_at >= since)
     
-    session_ids = [s.id for s in sessions]
+    session_counts = dict(
+        db.query(Session.user_id, func.count(Session.id)).filter(in_period).group_by(Session.user_id).all()
+    )
     
-    # Get all metrics for these sessions
-    metrics = db.query(SessionMetric).filter(
-        SessionMetric.session_id.in_(session_ids)
-    ).all()
+    metrics = {user_id: [] for user_id in user_ids}
+    rows = db.query(
+        Session.user_id, SessionMetric.hr, SessionMetric.hrv, SessionMetric.rep,
+        SessionMetric.tempo, SessionMetric.error_flags
+    ).join(Session, Session.id == SessionMetric.session_id).filter(in_period)
+    for row in rows:
+        metrics[row.user_id].append(row)
+    
+    states = {
+        state.user_id: state
+        for state in db.query(UserTrainingState).filter(UserTrainingState.user_id.in_(user_ids))
+    }
+    
+    return {
+        user_id: (session_counts.get(user_id, 0), metrics[user_id], states.get(user_id))
+        for user_id in user_ids
+    }
+
+
+def summarize_performance(session_count: int, metrics: list, state, now: datetime) -> dict:
+    """Analysis of one user's period from the rows ``load_performance_data`` returned"""
+    
+    if not session_count:
+        return {"error": "No sessions found"}
     
     if not metrics:
         return {"error": "No metrics found"}
@@ -110,9 +277,13 @@ def analyze_user_performance(db, user_id: str, since: datetime) -> dict:
     avg_hr = statistics.mean(hr_values) if hr_values else None
     avg_tempo = statistics.mean(tempo_values) if tempo_values else None
     
+    # Long-horizon workload is kept online per user, no extra raw data scanned
+    workload = workload_snapshot(state, now) if state else {}
+    
     return {
+        **workload,
         "period_days": 7,
-        "total_sessions": len(sessions),
+        "total_sessions": session_count,
         "total_reps": total_reps,
         "hrv_baseline": hrv_baseline,
         "error_rate": error_rate,
@@ -123,78 +294,69 @@ def analyze_user_performance(db, user_id: str, since: datetime) -> dict:
     }
 
 
+def analyze_user_performance(db, user_id: str, since: datetime) -> dict:
+    """Analyze user's performance over the last 7 days"""
+    data = load_performance_data(db, [user_id], since)[user_id]
+    return summarize_performance(*data, datetime.now(timezone.utc))
+
+
 def generate_personalized_plan(analysis: dict) -> dict:
     """Generate personalized plan based on user analysis"""
-    
-    if "error" in analysis:
-        # Default plan for users with insufficient data
-        return {
-            "intensity": 1.0,
-            "focus_areas": ["form"],
-            "recommended_reps": 15,
-            "rest_periods": 60,
-            "notes": "Building baseline data"
-        }
-    
-    base_intensity = 1.0
-    focus_areas = []
-    
-    # Adjust intensity based on error rate
-    if analysis["error_rate"] > 0.3:  # High error rate
-        base_intensity *= 0.95  # Reduce intensity by 5%
-        focus_areas.append("form")
-    elif analysis["error_rate"] < 0.1:  # Low error rate
-        base_intensity *= 1.025  # Increase intensity by 2.5%
-        focus_areas.append("progression")
-    
-    # Adjust based on HRV (recovery indicator)
-    if analysis["hrv_baseline"]:
-        if analysis["hrv_baseline"] < 30:  # Poor recovery
-            base_intensity *= 0.95
-            focus_areas.append("recovery")
-        elif analysis["hrv_baseline"] > 50:  # Good recovery
-            base_intensity *= 1.025
-    
-    # Focus on specific errors
-    common_errors = analysis.get("common_errors", {})
-    if "depth" in common_errors:
-        focus_areas.append("depth")
-    if "valgus" in common_errors:
-        focus_areas.append("knee_alignment")
-    if "tempo_fast" in common_errors or "tempo_slow" in common_errors:
-        focus_areas.append("tempo_control")
-    
-    # Clamp intensity between 0.8 and 1.2
-    base_intensity = max(0.8, min(1.2, base_intensity))
-    
-    # Calculate recommended reps based on recent volume
-    recent_reps_per_session = analysis["total_reps"] / analysis["total_sessions"]
-    recommended_reps = max(10, min(25, int(recent_reps_per_session * base_intensity)))
-    
-    return {
-        "intensity": round(base_intensity, 3),
-        "focus_areas": list(set(focus_areas)),
-        "recommended_reps": recommended_reps,
-        "rest_periods": 60 if base_intensity > 1.0 else 45,
-        "notes": f"Based on {analysis['total_sessions']} sessions, {analysis['error_rate']:.1%} error rate"
-    }
+    return plan_rules.plan(analysis)
 
 
-def store_user_plan(user_id: str, plan: dict):
-    """Store user's personalized plan (stub - in production would use database)"""
-    
-    # For now, store in a simple file (in production, use database table)
-    plans_dir = "/tmp/ai_coach_plans"
-    os.makedirs(plans_dir, exist_ok=True)
+def generate_personalized_plans(analyses: list) -> list:
+    """Generate plans for many users in one vectorized pass over the rule table"""
+    return plan_rules.generate(analyses)
+
+
+def plan_hash(plan: dict) -> str:
+    """Stable content hash used to detect unchanged plans"""
+    return hashlib.sha256(json.dumps(plan, sort_keys=True).encode()).hexdigest()
+
+
+def store_user_plans(db, plans: dict, chunk_size: int = PLAN_UPSERT_CHUNK_SIZE) -> int:
+    """Upsert plans into ``user_plans``, one INSERT ... ON CONFLICT per chunk.
+
+    Each stored plan bumps the user's version by one; plans identical to the
+    stored one are skipped so their rows are not rewritten. Cached reads of
+    changed plans are invalidated. Returns the number of plans inserted or
+    changed.
+    """
+    if not plans:
+        return 0
     
-    plan_file = f"{plans_dir}/{user_id}_plan.json"
-    with open(plan_file, "w") as f:
-        json.dump({
+    now = datetime.now(timezone.utc)
+    insert_ = dialect_insert(db)
+    table = UserPlan.__table__
+    rows = [
+        {
             "user_id": user_id,
+            "version": 1,
             "plan": plan,
-            "updated_at": datetime.now(timezone.utc).isoformat(),
-            "version": 1
-        }, f, indent=2)
+            "plan_hash": plan_hash(plan),
+            "updated_at": now
+        }
+        for user_id, plan in plans.items()
+    ]
+    
+    changed = {}
+    for start in range(0, len(rows), chunk_size):
+        stmt = insert_(table).values(rows[start:start + chunk_size])
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[table.c.user_id],
+            set_={
+                "version": table.c.version + 1,
+                "plan": stmt.excluded.plan,
+                "plan_hash": stmt.excluded.plan_hash,
+                "updated_at": stmt.excluded.updated_at
+            },
+            where=table.c.plan_hash != stmt.excluded.plan_hash
+        )
+        changed.update(db.execute(stmt.returning(table.c.user_id, table.c.version)).all())
+    db.commit()
+    plan_cache.invalidate(changed)
+    return len(changed)
 
 
 @celery_app.task
@@ -0,0 +1,231 @@
+"""Declarative plan rules and their vectorized evaluator.
+
+The rule table is plain data (it can be loaded from a JSON file via
+``Settings.plan_rules_path``) and is compiled once into a ``PlanRules``
+evaluator that turns columns of per-user analyses into all plans in one pass.
+A single plan is evaluated from the same table with plain Python, where
+NumPy's per-call overhead would dominate.
+"""
+import copy
+import json
+import operator
+
+import numpy as np
+
+DEFAULT_PLAN_RULES = {
+    "base_intensity": 1.0,
+    # Applied in order; every matching rule multiplies intensity and adds its focus tag.
+    # Missing values (None) never match; ``ignore_zero`` treats 0 as missing too.
+    "intensity_rules": [
+        {"field": "error_rate", "op": ">", "value": 0.3, "multiplier": 0.95, "focus": "form"},
+        {"field": "error_rate", "op": "<", "value": 0.1, "multiplier": 1.025, "focus": "progression"},
+        {"field": "hrv_baseline", "op": "<", "value": 30, "multiplier": 0.95, "focus": "recovery", "ignore_zero": True},
+        {"field": "hrv_baseline", "op": ">", "value": 50, "multiplier": 1.025, "ignore_zero": True},
+        {"field": "acute_chronic_ratio", "op": ">", "value": 1.5, "multiplier": 0.95, "focus": "recovery"}
+    ],
+    # A focus tag is added when any of the listed errors was seen
+    "error_focus": [
+        {"errors": ["depth"], "focus": "depth"},
+        {"errors": ["valgus"], "focus": "knee_alignment"},
+        {"errors": ["tempo_fast", "tempo_slow"], "focus": "tempo_control"}
+    ],
+    "intensity_clamp": [0.8, 1.2],
+    "reps_clamp": [10, 25],
+    # Rest is ``high`` when the clamped intensity is above ``threshold``
+    "rest_periods": {"threshold": 1.0, "high": 60, "low": 45},
+    "notes": "Based on {total_sessions} sessions, {error_rate:.1%} error rate",
+    # Plan for users with insufficient data
+    "default_plan": {
+        "intensity": 1.0,
+        "focus_areas": ["form"],
+        "recommended_reps": 15,
+        "rest_periods": 60,
+        "notes": "Building baseline data"
+    }
+}
+
+_OPS = {
+    ">": np.greater,
+    ">=": np.greater_equal,
+    "<": np.less,
+    "<=": np.less_equal
+}
+
+_SCALAR_OPS = {
+    ">": operator.gt,
+    ">=": operator.ge,
+    "<": operator.lt,
+    "<=": operator.le
+}
+
+
+class PlanRules:
+    """Compiled rule table.
+
+    ``evaluate`` works on columns (NumPy arrays, one entry per user);
+    ``generate`` is the path from analysis dicts to plan dicts and ``plan``
+    its scalar counterpart. Every returned plan is a fresh dict the caller
+    may modify.
+    """
+
+    def __init__(self, table: dict):
+        self.table = table
+        self.base_intensity = float(table["base_intensity"])
+        self.intensity_rules = []
+        for rule in table["intensity_rules"]:
+            if rule["op"] not in _OPS:
+                raise ValueError(f"Unsupported rule operator: {rule['op']!r}")
+            self.intensity_rules.append(rule)
+        self.error_focus = table["error_focus"]
+        self.fields = sorted({rule["field"] for rule in self.intensity_rules})
+        self.error_names = sorted({e for rule in self.error_focus for e in rule["errors"]})
+
+        # Focus tags in output order (plans list them sorted, without duplicates)
+        tags = {rule["focus"] for rule in self.intensity_rules if rule.get("focus")}
+        tags.update(rule["focus"] for rule in self.error_focus)
+        self.focus_tags = sorted(tags)
+        self._tag_weights = 1 << np.arange(len(self.focus_tags), dtype=np.int64)
+        # Tag tuples indexed by focus bitmask
+        self._focus_by_mask = [
+            tuple(tag for j, tag in enumerate(self.focus_tags) if mask >> j & 1)
+            for mask in range(1 << len(self.focus_tags))
+        ]
+
+        self.intensity_min, self.intensity_max = table["intensity_clamp"]
+        self.reps_min, self.reps_max = table["reps_clamp"]
+        self.rest = table["rest_periods"]
+        self.notes = table["notes"]
+        self.default_plan = table["default_plan"]
+        self._default_plan = json.loads(json.dumps(self.default_plan))
+        # Only these need a deep copy per plan; scalars are shared safely
+        self._default_nested = [k for k, v in self._default_plan.items() if isinstance(v, (list, dict))]
+
+    def _default(self) -> dict:
+        """A copy of the default plan for a user without data"""
+        plan = dict(self._default_plan)
+        for key in self._default_nested:
+            plan[key] = copy.deepcopy(plan[key])
+        return plan
+
+    def columns(self, analyses: list) -> dict:
+        """Convert analysis dicts into the columnar input of ``evaluate``"""
+        columns = {
+            "has_data": np.array(["error" not in a for a in analyses], dtype=bool),
+            "total_reps": np.array([a.get("total_reps", 0) for a in analyses], dtype=np.float64),
+            "total_sessions": np.array([a.get("total_sessions", 1) for a in analyses], dtype=np.int64)
+        }
+        for field in self.fields:
+            # NumPy converts None to NaN, which no comparison matches
+            columns[field] = np.array([a.get(field) for a in analyses], dtype=np.float64)
+        errors = [a.get("common_errors") or () for a in analyses]
+        for name in self.error_names:
+            columns["error:" + name] = np.array([name in e for e in errors], dtype=bool)
+        return columns
+
+    def evaluate(self, columns: dict) -> dict:
+        """Evaluate all rows at once.
+
+        Returns ``intensity`` (rounded), ``recommended_reps``, ``rest_periods``
+        and a boolean ``focus`` matrix whose columns follow ``focus_tags``.
+        Rows without data are left for the caller to replace by the default plan.
+        """
+        n = len(columns["has_data"])
+        intensity = np.full(n, self.base_intensity)
+        focus = np.zeros((n, len(self.focus_tags)), dtype=bool)
+
+        for rule in self.intensity_rules:
+            values = columns[rule["field"]]
+            mask = _OPS[rule["op"]](values, rule["value"])
+            if rule.get("ignore_zero"):
+                mask &= values != 0
+            intensity = np.where(mask, intensity * rule["multiplier"], intensity)
+            if rule.get("focus"):
+                focus[:, self.focus_tags.index(rule["focus"])] |= mask
+
+        for rule in self.error_focus:
+            seen = np.zeros(n, dtype=bool)
+            for name in rule["errors"]:
+                seen |= columns["error:" + name]
+            focus[:, self.focus_tags.index(rule["focus"])] |= seen
+
+        intensity = np.clip(intensity, self.intensity_min, self.intensity_max)
+
+        sessions = np.maximum(columns["total_sessions"], 1)
+        reps_per_session = columns["total_reps"] / sessions
+        reps = np.trunc(reps_per_session * intensity)
+        reps = np.clip(reps, self.reps_min, self.reps_max).astype(np.int64)
+
+        rest = np.where(intensity > self.rest["threshold"], self.rest["high"], self.rest["low"])
+
+        return {
+            "has_data": columns["has_data"],
+            "intensity": np.round(intensity, 3),
+            "recommended_reps": reps,
+            "rest_periods": rest,
+            "focus": focus
+        }
+
+    def generate(self, analyses: list) -> list:
+        """Plans for a list of analysis dicts, in one vectorized pass"""
+        if not analyses:
+            return []
+        out = self.evaluate(self.columns(analyses))
+        # Back to Python objects column by column; per-row NumPy scalar access is slow
+        masks = (out["focus"] @ self._tag_weights).tolist()
+        rows = zip(
+            analyses, out["has_data"].tolist(), out["intensity"].tolist(), masks,
+            out["recommended_reps"].tolist(), out["rest_periods"].tolist()
+        )
+        focus_by_mask = self._focus_by_mask
+        notes = self.notes.format_map
+        return [
+            {
+                "intensity": intensity,
+                "focus_areas": list(focus_by_mask[mask]),
+                "recommended_reps": reps,
+                "rest_periods": rest,
+                "notes": notes(analysis)
+            } if has_data else self._default()
+            for analysis, has_data, intensity, mask, reps, rest in rows
+        ]
+
+    def plan(self, analysis: dict) -> dict:
+        """One plan, with the same rules evaluated in plain Python"""
+        if "error" in analysis:
+            return self._default()
+
+        intensity = self.base_intensity
+        mask = 0
+        for rule in self.intensity_rules:
+            value = analysis.get(rule["field"])
+            if value is None or (rule.get("ignore_zero") and value == 0):
+                continue
+            if _SCALAR_OPS[rule["op"]](value, rule["value"]):
+                intensity *= rule["multiplier"]
+                if rule.get("focus"):
+                    mask |= 1 << self.focus_tags.index(rule["focus"])
+
+        errors = analysis.get("common_errors") or ()
+        for rule in self.error_focus:
+            if any(name in errors for name in rule["errors"]):
+                mask |= 1 << self.focus_tags.index(rule["focus"])
+
+        intensity = max(self.intensity_min, min(self.intensity_max, intensity))
+        reps_per_session = analysis.get("total_reps", 0) / max(analysis.get("total_sessions", 1), 1)
+        reps = max(self.reps_min, min(self.reps_max, int(reps_per_session * intensity)))
+
+        return {
+            "intensity": round(intensity, 3),
+            "focus_areas": list(self._focus_by_mask[mask]),
+            "recommended_reps": reps,
+            "rest_periods": self.rest["high"] if intensity > self.rest["threshold"] else self.rest["low"],
+            "notes": self.notes.format_map(analysis)
+        }
+
+
+def load_plan_rules(path: str = "") -> PlanRules:
+    """Compile the rule table from ``path`` (JSON) or the built-in defaults"""
+    if path:
+        with open(path) as f:
+            return PlanRules(json.load(f))
+    return PlanRules(DEFAULT_PLAN_RULES)
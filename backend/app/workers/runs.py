@@ -0,0 +1,163 @@
+"""Bookkeeping for personalization runs.
+
+Tasks return only compact counters; per-user outcomes are streamed in batches
+into ``personalization_run_results`` so the result backend never holds them.
+Stage timings and the per-user latency histogram are kept in ``RunStats`` and
+stored on the run row, so job duration can be followed as the user base grows.
+"""
+import bisect
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+from sqlalchemy import insert
+
+from app.analytics.workload import as_utc
+from app.db.models import PersonalizationRun, PersonalizationRunResult
+
+RESULT_BATCH_SIZE = 500
+
+# Upper bounds (ms) of the per-user latency histogram; the last bucket is open
+LATENCY_BOUNDS_MS = (0.05, 0.1, 0.2, 0.5, 1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000)
+
+
+class RunResultSink:
+    """Buffers per-user outcomes and writes them with one multi-row INSERT per batch"""
+
+    def __init__(self, db, run_id: str, batch_size: int = RESULT_BATCH_SIZE):
+        self.db = db
+        self.run_id = run_id
+        self.batch_size = batch_size
+        self._rows = []
+
+    def add(self, outcome: dict):
+        self._rows.append({
+            "run_id": self.run_id,
+            "user_id": outcome["user_id"],
+            "plan_updated": outcome["plan_updated"],
+            "error": outcome.get("error"),
+            "analysis": outcome.get("analysis")
+        })
+        if len(self._rows) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        if not self._rows:
+            return
+        self.db.execute(insert(PersonalizationRunResult), self._rows)
+        self.db.commit()
+        self._rows = []
+
+
+class RunStats:
+    """Wall time per stage and a histogram of per-user analysis latency.
+
+    Shards of a fanned-out run keep their own and are merged into the run's,
+    which is why latency is a fixed-bucket histogram rather than raw samples.
+    Stage times of parallel shards add up, so they can exceed the run's
+    duration.
+    """
+
+    def __init__(self):
+        self.stages = {}
+        self.latency_counts = [0] * (len(LATENCY_BOUNDS_MS) + 1)
+        self.latency_sum_ms = 0.0
+        self.latency_max_ms = 0.0
+        self.metric_rows_loaded = 0
+
+    @contextmanager
+    def stage(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.stages[name] = self.stages.get(name, 0.0) + time.perf_counter() - start
+
+    def observe_user(self, seconds: float):
+        ms = seconds * 1000
+        self.latency_counts[bisect.bisect_left(LATENCY_BOUNDS_MS, ms)] += 1
+        self.latency_sum_ms += ms
+        self.latency_max_ms = max(self.latency_max_ms, ms)
+
+    def to_dict(self) -> dict:
+        return {
+            "stages": self.stages,
+            "latency_counts": self.latency_counts,
+            "latency_sum_ms": self.latency_sum_ms,
+            "latency_max_ms": self.latency_max_ms,
+            "metric_rows_loaded": self.metric_rows_loaded
+        }
+
+    def merge(self, other: dict):
+        for name, seconds in other["stages"].items():
+            self.stages[name] = self.stages.get(name, 0.0) + seconds
+        self.latency_counts = [a + b for a, b in zip(self.latency_counts, other["latency_counts"])]
+        self.latency_sum_ms += other["latency_sum_ms"]
+        self.latency_max_ms = max(self.latency_max_ms, other["latency_max_ms"])
+        self.metric_rows_loaded += other["metric_rows_loaded"]
+
+    def percentile_ms(self, q: float):
+        """Upper bound of the bucket holding the ``q`` quantile (the max for the open bucket).
+
+        Rounded like ``summary()`` rounds the max, so a stored percentile never exceeds it.
+        """
+        count = sum(self.latency_counts)
+        if not count:
+            return None
+        rank = q * count
+        seen = 0
+        for bound, n in zip(LATENCY_BOUNDS_MS, self.latency_counts):
+            seen += n
+            if seen >= rank:
+                return round(min(bound, self.latency_max_ms), 4)
+        return round(self.latency_max_ms, 4)
+
+    def summary(self) -> dict:
+        """What is stored on the run row"""
+        count = sum(self.latency_counts)
+        return {
+            "stages_seconds": {name: round(seconds, 4) for name, seconds in self.stages.items()},
+            "metric_rows_loaded": self.metric_rows_loaded,
+            "user_latency_ms": {
+                "count": count,
+                "mean": round(self.latency_sum_ms / count, 4) if count else None,
+                "p50": self.percentile_ms(0.5),
+                "p95": self.percentile_ms(0.95),
+                "p99": self.percentile_ms(0.99),
+                "max": round(self.latency_max_ms, 4) if count else None,
+                "buckets_ms": list(LATENCY_BOUNDS_MS),
+                "counts": self.latency_counts
+            }
+        }
+
+
+def start_run(db, task: str) -> PersonalizationRun:
+    run = PersonalizationRun(task=task, started_at=datetime.now(timezone.utc))
+    db.add(run)
+    db.commit()
+    return run
+
+
+def finish_run(db, run: PersonalizationRun, counts: dict, stats: RunStats = None) -> dict:
+    """Record the run's counters and timings and return the compact task result"""
+    finished_at = datetime.now(timezone.utc)
+    duration = (finished_at - as_utc(run.started_at)).total_seconds()
+    run.finished_at = finished_at
+    run.processed_users = counts["processed_users"]
+    run.successful_updates = counts["successful_updates"]
+    run.plans_changed = counts["plans_changed"]
+    run.duration_seconds = round(duration, 3)
+    run.users_per_second = round(run.processed_users / duration, 1) if duration > 0 else None
+    run.stats = stats.summary() if stats is not None else None
+    db.commit()
+    result = {
+        "run_id": run.id,
+        "processed_users": run.processed_users,
+        "successful_updates": run.successful_updates,
+        "plans_changed": run.plans_changed,
+        "duration_seconds": run.duration_seconds,
+        "users_per_second": run.users_per_second
+    }
+    if stats is not None:
+        result["stages_seconds"] = run.stats["stages_seconds"]
+    return result
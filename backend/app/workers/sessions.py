@@ -0,0 +1,62 @@
+"""Closing sessions whose client never called ``/v1/sessions/end``.
+
+A session counts as stale once it has had no metrics (or, without metrics,
+no start) for ``Settings.session_stale_after_seconds``. All stale sessions
+are closed with one ``UPDATE`` that sets ``ended_at`` to the last metric
+time, then get the same summary, workload and re-personalization
+bookkeeping as a normal end, batched: one grouped aggregate for the
+summaries, one upsert for them, one query for the training states and one
+upsert for the events.
+"""
+from celery import current_app as celery_app
+from datetime import datetime, timezone, timedelta
+from sqlalchemy import func, select, update
+
+from app.active_sessions import active_sessions
+from app.analytics.summaries import save_session_summaries, summarize_sessions
+from app.analytics.workload import record_sessions_workload
+from app.config import settings
+from app.db.models import Session, SessionLocal, SessionMetric
+from app.workers.events import enqueue_repersonalizations
+
+
+def close_stale_sessions(db, now: datetime = None, stale_after: int = None) -> list:
+    """Close stale open sessions and return their ids"""
+    now = now or datetime.now(timezone.utc)
+    stale_after = stale_after or settings.session_stale_after_seconds
+    cutoff = now - timedelta(seconds=stale_after)
+
+    last_metric = select(func.max(SessionMetric.t)).where(
+        SessionMetric.session_id == Session.id
+    ).scalar_subquery()
+    last_seen = func.coalesce(last_metric, Session.started_at)
+
+    stmt = (
+        update(Session)
+        .where(Session.ended_at.is_(None), Session.started_at < cutoff, last_seen < cutoff)
+        .values(ended_at=last_seen)
+        .returning(Session.id, Session.user_id, Session.ended_at)
+        .execution_options(synchronize_session=False)
+    )
+    closed = db.execute(stmt).all()
+    session_ids = [row.id for row in closed]
+
+    if closed:
+        summaries = summarize_sessions(db, session_ids)
+        save_session_summaries(db, summaries)
+        record_sessions_workload(db, closed, summaries)
+        enqueue_repersonalizations(db, [row.user_id for row in closed], now)
+    db.commit()
+
+    active_sessions.discard(session_ids)
+    active_sessions.prune(cutoff.timestamp())
+    return session_ids
+
+
+@celery_app.task
+def sweep_stale_sessions():
+    db = SessionLocal()
+    try:
+        return {"closed_sessions": len(close_stale_sessions(db))}
+    finally:
+        db.close()
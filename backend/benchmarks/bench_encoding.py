@@ -0,0 +1,54 @@
+"""JSON response encoding: FastAPI's default path versus Pydantic's serializer."""
+import json
+import random
+from datetime import datetime, timezone, timedelta
+
+from fastapi.encoders import jsonable_encoder
+
+from app.api.v1.schemas import (
+    MetricPoint, PlanItem, PlanTodayResponse, SessionHistoryItem, SessionHistoryResponse,
+    SessionMetricsSeriesResponse
+)
+from benchmarks.harness import benchmark
+
+START = datetime(2025, 1, 6, 7, 0, tzinfo=timezone.utc)
+
+
+def responses() -> dict:
+    rng = random.Random(9)
+    return {
+        "plan_today": PlanTodayResponse(
+            items=[PlanItem(date=START, workout="squat", intensity=1.025, focus_areas=["depth", "form"],
+                            recommended_reps=15, rest_periods=60, notes="Based on 3 sessions")],
+            version=4, updated_at=START
+        ),
+        "session_history_100": SessionHistoryResponse(items=[
+            SessionHistoryItem(session_id=f"s{i}", started_at=START + timedelta(hours=i),
+                               ended_at=START + timedelta(hours=i, minutes=30), metric_count=600,
+                               total_reps=rng.randint(20, 80))
+            for i in range(100)
+        ]),
+        "metrics_series_1500": SessionMetricsSeriesResponse(
+            session_id="s1", mode="lttb", source_points=36000,
+            series={
+                name: [MetricPoint(t=START + timedelta(seconds=i), value=rng.uniform(0, 150)) for i in range(500)]
+                for name in ("hr", "rom", "tempo")
+            }
+        ),
+    }
+
+
+RESPONSES = responses()
+
+
+@benchmark("encode_fastapi_default", tuple(RESPONSES))
+def encode_default(name):
+    """jsonable_encoder + json.dumps, as JSONResponse does"""
+    model = RESPONSES[name]
+    return (lambda: json.dumps(jsonable_encoder(model)).encode()), None
+
+
+@benchmark("encode_model_dump_json", tuple(RESPONSES))
+def encode_pydantic(name):
+    model = RESPONSES[name]
+    return (lambda: model.model_dump_json().encode()), None
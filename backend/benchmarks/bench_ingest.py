@@ -0,0 +1,27 @@
+"""Persisting metric batches through the ingest handler."""
+from sqlalchemy import delete
+
+from app.api.v1.routers.metrics import ingest_batch
+from app.api.v1.schemas import MetricsBatchRequest
+from app.db.models import Session, SessionMetric, User
+from benchmarks.bench_validation import START, batch_payload
+from benchmarks.harness import benchmark, memory_db
+
+
+@benchmark("ingest_batch", (3, 100, 1000))
+def ingest(size):
+    db = memory_db()
+    db.add(User(id="bench-user"))
+    db.add(Session(id="bench-session", user_id="bench-user", started_at=START))
+    db.commit()
+    payload = MetricsBatchRequest.model_validate(batch_payload(size))
+
+    def call():
+        ingest_batch(payload, db)
+
+    def teardown():
+        # Keep the table the same size for every repeat
+        db.execute(delete(SessionMetric))
+        db.commit()
+
+    return call, teardown
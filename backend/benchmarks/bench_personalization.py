@@ -0,0 +1,107 @@
+"""Performance analysis and plan generation on fixed datasets."""
+import random
+from datetime import datetime, timezone, timedelta
+
+from sqlalchemy import insert
+
+from app.db.models import Session, SessionMetric, User, generate_uuid
+from app.workers.personalize import (
+    analyze_user_performance, generate_personalized_plan, generate_personalized_plans,
+    load_performance_data, summarize_performance
+)
+from benchmarks.harness import benchmark, memory_db
+
+# (users, sessions per user, samples per session)
+DATASETS = {
+    "small": (1, 3, 45),
+    "large": (1, 20, 600),
+    "chunk": (200, 3, 45),
+}
+
+
+def seed_dataset(name: str, seed: int = 3):
+    users, sessions, samples = DATASETS[name]
+    rng = random.Random(seed)
+    db = memory_db()
+    now = datetime.now(timezone.utc)
+    user_ids = [f"bench-{name}-{u}" for u in range(users)]
+    session_rows, metric_rows = [], []
+    for user_id in user_ids:
+        for s in range(sessions):
+            session_id = generate_uuid()
+            started_at = now - timedelta(days=6, hours=-s)
+            session_rows.append({"id": session_id, "user_id": user_id, "started_at": started_at})
+            for i in range(samples):
+                metric_rows.append({
+                    "id": generate_uuid(),
+                    "session_id": session_id,
+                    "t": started_at + timedelta(seconds=i),
+                    "hr": 110 + rng.randint(0, 40),
+                    "hrv": 40 + rng.uniform(-5, 10),
+                    "rep": i // 3 if i % 3 == 2 else None,
+                    "rom": rng.uniform(0.4, 0.9),
+                    "tempo": rng.uniform(1.0, 2.5),
+                    "error_flags": rng.choice([["depth"], ["valgus"], ["tempo_fast"], None, None])
+                })
+    db.execute(insert(User), [{"id": user_id} for user_id in user_ids])
+    db.execute(insert(Session), session_rows)
+    db.execute(insert(SessionMetric), metric_rows)
+    db.commit()
+    return db, user_ids, now - timedelta(days=7)
+
+
+@benchmark("analyze_user_performance", ("small", "large"))
+def analyze_one(dataset):
+    db, user_ids, since = seed_dataset(dataset)
+    return (lambda: analyze_user_performance(db, user_ids[0], since)), None
+
+
+@benchmark("analyze_chunk", ("chunk",))
+def analyze_chunk(dataset):
+    """The batched path personalize_users takes for one chunk"""
+    db, user_ids, since = seed_dataset(dataset)
+    now = datetime.now(timezone.utc)
+
+    def call():
+        data = load_performance_data(db, user_ids, since)
+        return [summarize_performance(*data[user_id], now) for user_id in user_ids]
+
+    return call, None
+
+
+def sample_analyses(count: int, seed: int = 5) -> list:
+    rng = random.Random(seed)
+    return [
+        {
+            "period_days": 7,
+            "total_sessions": rng.randint(1, 7),
+            "total_reps": rng.randint(10, 200),
+            "hrv_baseline": rng.choice([None, rng.uniform(20, 60)]),
+            "error_rate": rng.random() * 0.5,
+            "common_errors": rng.choice([{}, {"depth": 3}, {"valgus": 2, "tempo_fast": 1}]),
+            "avg_heart_rate": rng.uniform(110, 160),
+            "avg_tempo": rng.uniform(1.0, 2.5),
+            "total_metrics": rng.randint(30, 900),
+            "acute_chronic_ratio": rng.choice([None, rng.uniform(0.5, 2.0)])
+        }
+        for _ in range(count)
+    ]
+
+
+@benchmark("generate_personalized_plan")
+def generate_one(_):
+    analysis = sample_analyses(1)[0]
+    return (lambda: generate_personalized_plan(analysis)), None
+
+
+@benchmark("generate_personalized_plans", (1000, 100000))
+def generate_many(count):
+    analyses = sample_analyses(count)
+    return (lambda: generate_personalized_plans(analyses)), None
+
+
+@benchmark("generate_personalized_plan_loop", (1000, 100000))
+def generate_many_scalar(count):
+    """The per-user path over the same analyses, as the baseline for the batch path"""
+    analyses = sample_analyses(count)
+    return (lambda: [generate_personalized_plan(a) for a in analyses]), None
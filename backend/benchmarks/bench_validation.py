@@ -0,0 +1,46 @@
+"""Request validation for metric batches."""
+import json
+import random
+from datetime import datetime, timezone, timedelta
+
+from app.api.v1.schemas import MetricsBatchRequest
+from benchmarks.harness import benchmark
+
+BATCH_SIZES = (1, 10, 100, 1000, 10000)
+
+
+START = datetime(2025, 1, 6, 7, 0, tzinfo=timezone.utc)
+
+
+def batch_payload(size: int, seed: int = 1) -> dict:
+    rng = random.Random(seed)
+    start = START
+    return {
+        "session_id": "bench-session",
+        "metrics": [
+            {
+                "t": (start + timedelta(seconds=i)).isoformat(),
+                "hr": 120 + rng.randint(-10, 25),
+                "hrv": 40 + rng.uniform(-5, 10),
+                "rep": i // 3 if i % 3 == 2 else None,
+                "rom": rng.uniform(0.4, 0.9),
+                "tempo": rng.uniform(1.0, 2.5),
+                "error_flags": ["depth"] if rng.random() > 0.8 else None
+            }
+            for i in range(size)
+        ]
+    }
+
+
+@benchmark("validate_batch_dict", BATCH_SIZES)
+def validate_dict(size):
+    """What FastAPI does: validate the already-decoded JSON body"""
+    payload = batch_payload(size)
+    return (lambda: MetricsBatchRequest.model_validate(payload)), None
+
+
+@benchmark("validate_batch_json", BATCH_SIZES)
+def validate_json(size):
+    """Decode and validate raw bytes in one pass"""
+    body = json.dumps(batch_payload(size)).encode()
+    return (lambda: MetricsBatchRequest.model_validate_json(body)), None
@@ -0,0 +1,85 @@
+"""Tiny timing harness for the in-process benchmarks.
+
+Each case is calibrated to run for at least ``min_time`` seconds per repeat
+(like ``timeit.autorange``), then timed ``repeat`` times with the garbage
+collector off. The median time per call is the headline number; min and
+spread show how stable it was. Data comes from fixed seeds, so numbers are
+comparable between runs on the same machine.
+"""
+import gc
+import os
+import statistics
+import time
+
+# Benchmarks run against in-memory SQLite, never a configured database
+os.environ.setdefault("TESTING", "1")
+os.environ.setdefault("DATABASE_URL", "sqlite:///:memory:")
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+REGISTRY = []
+
+
+def benchmark(name: str, params=(None,)):
+    """Register ``fn(param) -> (call, teardown | None)``; ``call()`` is what gets timed"""
+    def decorate(fn):
+        for param in params:
+            REGISTRY.append((f"{name}[{param}]" if param is not None else name, fn, param))
+        return fn
+    return decorate
+
+
+def memory_db():
+    """Fresh in-memory SQLite database with the full schema"""
+    from app.db.models import Base
+    engine = create_engine(
+        "sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool
+    )
+    Base.metadata.create_all(engine)
+    return sessionmaker(bind=engine, autoflush=False, autocommit=False)()
+
+
+def _time(call, loops: int) -> float:
+    gc_was_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        start = time.perf_counter()
+        for _ in range(loops):
+            call()
+        return time.perf_counter() - start
+    finally:
+        if gc_was_enabled:
+            gc.enable()
+
+
+def measure(call, teardown=None, repeat: int = 5, min_time: float = 0.2) -> dict:
+    call()  # Warm-up (imports, caches, SQLite statement cache)
+    if teardown is not None:
+        teardown()
+
+    loops = 1
+    while True:
+        elapsed = _time(call, loops)
+        if teardown is not None:
+            teardown()
+        if elapsed >= min_time or loops >= 1_000_000:
+            break
+        loops *= 2 if elapsed == 0 else max(2, min(10, int(min_time / elapsed) + 1))
+
+    per_call = []
+    for _ in range(repeat):
+        per_call.append(_time(call, loops) / loops)
+        if teardown is not None:
+            teardown()
+
+    median = statistics.median(per_call)
+    return {
+        "loops": loops,
+        "repeat": repeat,
+        "median_us": round(median * 1e6, 3),
+        "min_us": round(min(per_call) * 1e6, 3),
+        "stdev_pct": round(statistics.pstdev(per_call) / median * 100, 2) if median else 0.0,
+        "ops_per_second": round(1 / median, 1) if median else None
+    }
@@ -0,0 +1,74 @@
+"""
+Run the in-process micro-benchmarks.
+
+    cd backend
+    python -m benchmarks.run                      # everything
+    python -m benchmarks.run -k validate -k ingest
+    python -m benchmarks.run --output after.json --compare before.json
+
+Results are printed as a table and optionally written as JSON; --compare
+adds the change in median time per call against an earlier JSON file
+(negative is faster).
+"""
+import argparse
+import json
+import platform
+import sys
+from datetime import datetime, timezone
+from pathlib import Path
+
+from benchmarks import harness
+
+MODULES = ("bench_validation", "bench_ingest", "bench_personalization", "bench_encoding")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("-k", dest="filters", action="append", default=[],
+                        help="only run benchmarks whose name contains this (repeatable)")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--min-time", type=float, default=0.2, help="seconds per repeat")
+    parser.add_argument("--output", help="write results as JSON")
+    parser.add_argument("--compare", metavar="BASELINE", help="earlier JSON results to compare against")
+    args = parser.parse_args(argv)
+
+    import importlib
+    for module in MODULES:
+        importlib.import_module(f"benchmarks.{module}")
+
+    baseline = {}
+    if args.compare:
+        baseline = {r["name"]: r for r in json.loads(Path(args.compare).read_text())["results"]}
+
+    results = []
+    print(f"{'benchmark':<48} {'median':>12} {'min':>12} {'stdev':>7} {'ops/s':>12} {'change':>8}")
+    for name, setup, param in harness.REGISTRY:
+        if args.filters and not any(f in name for f in args.filters):
+            continue
+        call, teardown = setup(param)
+        result = {"name": name, **harness.measure(call, teardown, args.repeat, args.min_time)}
+        previous = baseline.get(name)
+        change = ""
+        if previous:
+            result["change_pct"] = round((result["median_us"] - previous["median_us"]) / previous["median_us"] * 100, 1)
+            change = f"{result['change_pct']:+.1f}%"
+        results.append(result)
+        print(
+            f"{name:<48} {result['median_us']:>10.1f}us {result['min_us']:>10.1f}us "
+            f"{result['stdev_pct']:>6.1f}% {result['ops_per_second']:>12} {change:>8}"
+        )
+        sys.stdout.flush()
+
+    if args.output:
+        Path(args.output).write_text(json.dumps({
+            "created_at": datetime.now(timezone.utc).isoformat(),
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "repeat": args.repeat,
+            "min_time": args.min_time,
+            "results": results
+        }, indent=2) + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,268 @@
+#!/usr/bin/env python3
+"""
+Load test a running API with concurrent virtual athletes.
+
+Each athlete follows the workout in tests/test_realistic_workout.py: start a
+session, post a metrics batch every 3 seconds through warm-up, main set and
+cool-down, end the session, and repeat until the test is over. Runs on one
+asyncio loop with httpx, so thousands of athletes need no threads.
+
+    python scripts/loadtest.py --athletes 2000 --mode ramp --ramp-seconds 120 --duration 300
+    python scripts/loadtest.py --athletes 500 --mode soak --duration 3600 --report-interval 60
+    python scripts/loadtest.py --athletes 200 --time-scale 0.1 --output run.json --compare baseline.json
+
+``ramp`` starts athletes evenly over --ramp-seconds then holds; ``soak``
+starts them all at once and also reports every --report-interval seconds
+so drift over a long run is visible. The JSON report has throughput,
+p50/p95/p99 latency and error rates per endpoint.
+"""
+import argparse
+import asyncio
+import json
+import random
+import sys
+import time
+from datetime import datetime, timezone, timedelta
+from pathlib import Path
+
+import httpx
+import numpy as np
+
+ENDPOINTS = ("sessions.start", "metrics.batch", "sessions.end")
+
+
+class Stats:
+    """Latencies and errors per endpoint, for the whole run and the current window"""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.total = self._empty()
+        self.window = self._empty()
+        self.window_started = self.started
+        self.metric_rows = 0
+
+    @staticmethod
+    def _empty():
+        return {name: {"latencies": [], "errors": {}} for name in ENDPOINTS}
+
+    def record(self, endpoint: str, seconds: float, error: str = None):
+        for bucket in (self.total, self.window):
+            entry = bucket[endpoint]
+            entry["latencies"].append(seconds)
+            if error is not None:
+                entry["errors"][error] = entry["errors"].get(error, 0) + 1
+
+    def roll_window(self) -> dict:
+        now = time.perf_counter()
+        report = summarize(self.window, now - self.window_started)
+        report["elapsed_seconds"] = round(now - self.started, 1)
+        self.window = self._empty()
+        self.window_started = now
+        return report
+
+
+def summarize(buckets: dict, seconds: float) -> dict:
+    endpoints = {}
+    for name, entry in buckets.items():
+        latencies = np.array(entry["latencies"]) * 1000
+        count = len(latencies)
+        errors = sum(entry["errors"].values())
+        endpoints[name] = {
+            "requests": count,
+            "rps": round(count / seconds, 1) if seconds else None,
+            "errors": errors,
+            "error_rate": round(errors / count, 4) if count else 0.0,
+            "error_kinds": entry["errors"],
+            "p50_ms": round(float(np.percentile(latencies, 50)), 2) if count else None,
+            "p95_ms": round(float(np.percentile(latencies, 95)), 2) if count else None,
+            "p99_ms": round(float(np.percentile(latencies, 99)), 2) if count else None,
+            "max_ms": round(float(latencies.max()), 2) if count else None,
+            "mean_ms": round(float(latencies.mean()), 2) if count else None
+        }
+    requests = sum(e["requests"] for e in endpoints.values())
+    return {
+        "seconds": round(seconds, 1),
+        "requests": requests,
+        "rps": round(requests / seconds, 1) if seconds else None,
+        "endpoints": endpoints
+    }
+
+
+def workout_batch(minute: int, batch: int, at: datetime, reps: int, size: int):
+    """One metrics batch of the realistic workout; returns (metrics, reps so far)"""
+    if minute < 2:  # Warm-up
+        hr = 100 + minute * 10
+        depth = 0.3 + (batch % 5) * 0.1
+        tempo = 0.8
+        error_flags = ["depth"] if depth < 0.4 else None
+    elif minute < 8:  # Main set
+        hr = 120 + minute * 5 + (batch % 3) * 2
+        depth = 0.5 + (batch % 4) * 0.15
+        tempo = 1.2 + (batch % 3) * 0.3
+        error_flags = ["tempo_fast"] if tempo > 2.5 else []
+        if depth > 0.8:
+            reps += 1
+    else:  # Cool-down
+        hr = max(90, 140 - (minute - 8) * 15)
+        depth = 0.2 + (batch % 3) * 0.1
+        tempo = 0.5
+        error_flags = None
+
+    metrics = [
+        {
+            "t": (at + timedelta(seconds=i)).isoformat(),
+            "hr": hr + i,
+            "hrv": 40.0 + minute * 2 + i * 0.5,
+            "rep": reps if i == size - 1 else None,
+            "rom": depth,
+            "tempo": tempo,
+            "error_flags": error_flags
+        }
+        for i in range(size)
+    ]
+    return metrics, reps
+
+
+async def call(client: httpx.AsyncClient, stats: Stats, endpoint: str, path: str, payload: dict):
+    start = time.perf_counter()
+    try:
+        resp = await client.post(path, json=payload)
+    except httpx.HTTPError as e:
+        stats.record(endpoint, time.perf_counter() - start, type(e).__name__)
+        return None
+    error = None if resp.status_code < 400 else f"HTTP {resp.status_code}"
+    stats.record(endpoint, time.perf_counter() - start, error)
+    return resp if error is None else None
+
+
+async def athlete(index: int, client, stats: Stats, args, start_delay: float, deadline: float):
+    await asyncio.sleep(start_delay)
+    rng = random.Random(args.seed + index)
+    user_id = f"load-athlete-{index}"
+    interval = args.batch_interval * args.time_scale
+    batches_per_minute = max(int(60 / args.batch_interval), 1)
+
+    while time.perf_counter() < deadline:
+        resp = await call(client, stats, "sessions.start", "/v1/sessions/start", {"user_id": user_id})
+        if resp is None:
+            await asyncio.sleep(interval)
+            continue
+        session_id = resp.json()["session_id"]
+        started = datetime.now(timezone.utc)
+        reps = 0
+
+        # Desynchronize athletes so batches don't arrive in lockstep
+        await asyncio.sleep(rng.uniform(0, interval))
+        for minute in range(args.workout_minutes):
+            for batch in range(batches_per_minute):
+                if time.perf_counter() >= deadline:
+                    break
+                at = started + timedelta(minutes=minute, seconds=batch * args.batch_interval)
+                metrics, reps = workout_batch(minute, batch, at, reps, args.metrics_per_batch)
+                if await call(client, stats, "metrics.batch", "/v1/metrics/batch",
+                              {"session_id": session_id, "metrics": metrics}) is not None:
+                    stats.metric_rows += len(metrics)
+                await asyncio.sleep(interval)
+
+        await call(client, stats, "sessions.end", "/v1/sessions/end", {"session_id": session_id})
+
+
+async def reporter(stats: Stats, interval: float, windows: list):
+    while True:
+        await asyncio.sleep(interval)
+        window = stats.roll_window()
+        windows.append(window)
+        batch = window["endpoints"]["metrics.batch"]
+        print(
+            f"[{window['elapsed_seconds']:>7}s] {window['rps']} req/s, "
+            f"batch p95 {batch['p95_ms']} ms, p99 {batch['p99_ms']} ms, errors {batch['errors']}",
+            file=sys.stderr
+        )
+
+
+async def run(args) -> dict:
+    limits = httpx.Limits(max_connections=args.connections, max_keepalive_connections=args.connections)
+    timeout = httpx.Timeout(args.timeout)
+    stats = Stats()
+    windows = []
+
+    ramp = args.ramp_seconds if args.mode == "ramp" else 0.0
+    deadline = time.perf_counter() + ramp + args.duration
+
+    async with httpx.AsyncClient(base_url=args.base_url, limits=limits, timeout=timeout) as client:
+        report_task = None
+        if args.report_interval:
+            report_task = asyncio.create_task(reporter(stats, args.report_interval, windows))
+        await asyncio.gather(*[
+            athlete(i, client, stats, args, ramp * i / args.athletes, deadline)
+            for i in range(args.athletes)
+        ])
+        if report_task is not None:
+            report_task.cancel()
+
+    elapsed = time.perf_counter() - stats.started
+    result = summarize(stats.total, elapsed)
+    result["metric_rows"] = stats.metric_rows
+    result["metric_rows_per_second"] = round(stats.metric_rows / elapsed, 1)
+    return {
+        "params": vars(args),
+        "started_at": datetime.now(timezone.utc).isoformat(),
+        "total": result,
+        "windows": windows
+    }
+
+
+def compare(report: dict, baseline: dict) -> dict:
+    """Relative change of the headline numbers against a previous report"""
+    def change(new, old):
+        if new is None or not old:
+            return None
+        return round((new - old) / old * 100, 1)
+
+    deltas = {"rps_pct": change(report["total"]["rps"], baseline["total"]["rps"]), "endpoints": {}}
+    for name, entry in report["total"]["endpoints"].items():
+        old = baseline["total"]["endpoints"].get(name)
+        if old is None:
+            continue
+        deltas["endpoints"][name] = {
+            key + "_pct": change(entry[key], old[key]) for key in ("p50_ms", "p95_ms", "p99_ms")
+        }
+        deltas["endpoints"][name]["error_rate_delta"] = round(entry["error_rate"] - old["error_rate"], 4)
+    return deltas
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--base-url", default="http://localhost:8000")
+    parser.add_argument("--athletes", type=int, default=100, help="concurrent virtual athletes")
+    parser.add_argument("--mode", choices=("ramp", "soak"), default="ramp")
+    parser.add_argument("--ramp-seconds", type=float, default=60.0, help="ramp mode: time to start all athletes")
+    parser.add_argument("--duration", type=float, default=120.0, help="seconds at full load (after the ramp)")
+    parser.add_argument("--report-interval", type=float, default=None,
+                        help="print and record a window report this often (soak default: 60)")
+    parser.add_argument("--workout-minutes", type=int, default=10)
+    parser.add_argument("--batch-interval", type=float, default=3.0, help="workout seconds between batches")
+    parser.add_argument("--metrics-per-batch", type=int, default=3)
+    parser.add_argument("--time-scale", type=float, default=1.0,
+                        help="multiply real waits by this (0.1 = ten times faster than real time)")
+    parser.add_argument("--connections", type=int, default=200, help="HTTP connection pool size")
+    parser.add_argument("--timeout", type=float, default=30.0)
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--output", help="also write the JSON report to this file")
+    parser.add_argument("--compare", metavar="BASELINE", help="include changes against a previous JSON report")
+    args = parser.parse_args()
+    if args.report_interval is None and args.mode == "soak":
+        args.report_interval = 60.0
+
+    report = asyncio.run(run(args))
+    if args.compare:
+        report["compared_to"] = args.compare
+        report["changes"] = compare(report, json.loads(Path(args.compare).read_text()))
+    text = json.dumps(report, indent=2)
+    print(text)
+    if args.output:
+        Path(args.output).write_text(text + "\n")
+
+
+if __name__ == "__main__":
+    main()
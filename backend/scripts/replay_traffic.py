@@ -0,0 +1,212 @@
+#!/usr/bin/env python3
+"""
+Replay captured API traffic against a test server.
+
+Reads files written by the traffic capture middleware (set
+TRAFFIC_CAPTURE_ENABLED=true on the API) and re-issues the requests with
+their original gaps divided by --speed. --speed 0 sends as fast as the
+server answers.
+
+Requests are grouped into streams by session:
+- a stream is a session's start, its metric batches and its end
+- requests without a session (plan reads, history) are each their own stream
+- within a stream, requests are sent one after another in captured order
+- streams run concurrently, so the server sees the same overlap of
+  sessions as production did, compressed in time
+
+Session starts return new ids, and later requests in the stream are
+rewritten to use them. Sessions already open when the capture began keep
+their captured ids. Metric timestamps are moved forward by the time since
+capture so the rows look fresh (--keep-timestamps to disable).
+
+    python scripts/replay_traffic.py traffic-capture/ --base-url http://localhost:8000 --speed 10
+    python scripts/replay_traffic.py capture-*.jsonl.gz --speed 0 --concurrency 500 --output replay.json
+
+The JSON report has per-endpoint throughput and latency (as in
+loadtest.py). It also gives how far sends fell behind schedule; a large
+schedule lag means the replayer or server could not keep up with --speed.
+"""
+import argparse
+import asyncio
+import json
+import sys
+import time
+from collections import defaultdict
+from datetime import datetime, timezone, timedelta
+from pathlib import Path
+
+import httpx
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app.observability.capture import read_capture
+from loadtest import compare, summarize
+
+
+def endpoint_name(record: dict) -> str:
+    """Method and path with ids folded, e.g. ``GET /v1/users/{id}/sessions``"""
+    parts = [
+        "{id}" if part.startswith("anon-") or len(part) == 36 and part.count("-") == 4 else part
+        for part in record["p"].split("/")
+    ]
+    return f"{record['m']} {'/'.join(parts)}"
+
+
+def session_of(record: dict):
+    body = record.get("b")
+    if isinstance(body, dict) and body.get("session_id"):
+        return body["session_id"]
+    return record.get("sid")
+
+
+def build_streams(records: list) -> list:
+    streams = defaultdict(list)
+    for index, record in enumerate(records):
+        streams[session_of(record) or f"request-{index}"].append(record)
+    return list(streams.values())
+
+
+def rewrite(record: dict, session_ids: dict, shift: timedelta):
+    """Path and body with captured session ids mapped to replayed ones"""
+    path = "/".join(session_ids.get(part, part) for part in record["p"].split("/"))
+    if record["q"]:
+        path += "?" + record["q"]
+    body = record.get("b")
+    if not isinstance(body, dict) or "truncated" in body or "unparsed" in body:
+        return path, None
+    body = dict(body)
+    if body.get("session_id") in session_ids:
+        body["session_id"] = session_ids[body["session_id"]]
+    if shift and isinstance(body.get("metrics"), list):
+        body["metrics"] = [_shift_metric(m, shift) for m in body["metrics"]]
+    return path, body
+
+
+def _shift_metric(metric: dict, shift: timedelta) -> dict:
+    if not isinstance(metric, dict) or not isinstance(metric.get("t"), str):
+        return metric
+    try:
+        t = datetime.fromisoformat(metric["t"].replace("Z", "+00:00"))
+    except ValueError:
+        return metric
+    return {**metric, "t": (t + shift).isoformat()}
+
+
+class Replay:
+    def __init__(self, client: httpx.AsyncClient, args, origin: float, shift: timedelta):
+        self.client = client
+        self.args = args
+        self.origin = origin
+        self.shift = shift
+        self.semaphore = asyncio.Semaphore(args.concurrency)
+        self.session_ids = {}
+        self.buckets = defaultdict(lambda: {"latencies": [], "errors": {}})
+        self.lags = []
+        self.status_changes = 0
+        self.started = None
+
+    def record(self, endpoint: str, seconds: float, error: str = None):
+        entry = self.buckets[endpoint]
+        entry["latencies"].append(seconds)
+        if error is not None:
+            entry["errors"][error] = entry["errors"].get(error, 0) + 1
+
+    async def send(self, record: dict):
+        if self.args.speed > 0:
+            due = self.started + (record["ts"] - self.origin) / self.args.speed
+            delay = due - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            self.lags.append(max(time.perf_counter() - due, 0.0))
+
+        path, body = rewrite(record, self.session_ids, self.shift)
+        endpoint = endpoint_name(record)
+        async with self.semaphore:
+            start = time.perf_counter()
+            try:
+                resp = await self.client.request(record["m"], path, json=body)
+            except httpx.HTTPError as e:
+                self.record(endpoint, time.perf_counter() - start, type(e).__name__)
+                return
+        error = None if resp.status_code < 400 else f"HTTP {resp.status_code}"
+        self.record(endpoint, time.perf_counter() - start, error)
+        if record["st"] is not None and (resp.status_code < 400) != (record["st"] < 400):
+            self.status_changes += 1
+
+        if record.get("sid") and error is None:
+            new_id = resp.json().get("session_id")
+            if new_id:
+                self.session_ids[record["sid"]] = new_id
+
+    async def stream(self, records: list):
+        for record in records:
+            await self.send(record)
+
+    async def run(self, streams: list):
+        self.started = time.perf_counter()
+        await asyncio.gather(*[self.stream(records) for records in streams])
+        return time.perf_counter() - self.started
+
+
+async def run(args, records: list) -> dict:
+    origin = records[0]["ts"]
+    shift = timedelta(0)
+    if not args.keep_timestamps:
+        shift = datetime.now(timezone.utc) - datetime.fromtimestamp(origin, timezone.utc)
+    streams = build_streams(records)
+
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    async with httpx.AsyncClient(base_url=args.base_url, limits=limits, timeout=httpx.Timeout(args.timeout)) as client:
+        replay = Replay(client, args, origin, shift)
+        elapsed = await replay.run(streams)
+
+    total = summarize(replay.buckets, elapsed)
+    lags = np.array(replay.lags) * 1000
+    total["schedule_lag_ms"] = {
+        "p50": round(float(np.percentile(lags, 50)), 2),
+        "p95": round(float(np.percentile(lags, 95)), 2),
+        "max": round(float(lags.max()), 2)
+    } if len(lags) else None
+    total["status_changes"] = replay.status_changes
+    return {
+        "params": vars(args),
+        "started_at": datetime.now(timezone.utc).isoformat(),
+        "captured": {
+            "requests": len(records),
+            "streams": len(streams),
+            "sessions_started": sum(1 for r in records if r.get("sid")),
+            "seconds": round(records[-1]["ts"] - origin, 1)
+        },
+        "total": total
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("capture", nargs="+", help="capture files or directories of them")
+    parser.add_argument("--base-url", default="http://localhost:8000")
+    parser.add_argument("--speed", type=float, default=1.0, help="time compression (1, 10, ...; 0 = as fast as possible)")
+    parser.add_argument("--concurrency", type=int, default=200, help="maximum requests in flight")
+    parser.add_argument("--timeout", type=float, default=30.0)
+    parser.add_argument("--keep-timestamps", action="store_true", help="send metric timestamps as captured")
+    parser.add_argument("--output", help="also write the JSON report to this file")
+    parser.add_argument("--compare", metavar="BASELINE", help="include changes against a previous JSON report")
+    args = parser.parse_args()
+
+    records = read_capture(args.capture)
+    if not records:
+        parser.error("no captured requests found")
+
+    report = asyncio.run(run(args, records))
+    if args.compare:
+        report["compared_to"] = args.compare
+        report["changes"] = compare(report, json.loads(Path(args.compare).read_text()))
+    text = json.dumps(report, indent=2)
+    print(text)
+    if args.output:
+        Path(args.output).write_text(text + "\n")
+
+
+if __name__ == "__main__":
+    main()
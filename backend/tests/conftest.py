@@ -1,5 +1,6 @@
 import os
 import pytest
+from datetime import datetime, timezone, timedelta
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
 from fastapi.testclient import TestClient
@@ -15,7 +16,9 @@ os.environ.setdefault("TESTING", "1")
 os.environ.setdefault("DATABASE_URL", "sqlite:///:memory:")
 
 from app.main import app
-from app.db.models import Base, get_db
+from app.config import settings
+from app.db.models import Base, Session, SessionMetric, User, get_db
+from app.observability import queries, tracing
 
 # SQLite in-memory engine for tests
 engine = create_engine(
@@ -24,6 +27,8 @@ engine = create_engine(
     poolclass=StaticPool,
 )
 TestingSessionLocal = sessionmaker(bind=engine, autoflush=False, autocommit=False)
+queries.install(engine)
+tracing.install(engine)
 
 # Create all tables for tests
 Base.metadata.create_all(bind=engine)
@@ -38,7 +43,69 @@ def override_get_db():
 
 app.dependency_overrides[get_db] = override_get_db
 
+# The shared client authenticates against the admin endpoints
+ADMIN_TOKEN = "test-admin-token"
+settings.admin_token = ADMIN_TOKEN
+
 
 @pytest.fixture(scope="session")
 def client():
-    return TestClient(app)
+    return TestClient(app, headers={"X-Admin-Token": ADMIN_TOKEN})
+
+
+@pytest.fixture
+def db_session():
+    db = TestingSessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+@pytest.fixture
+def workout(client):
+    """Record one finished session with two metric rows (one depth fault) for a user"""
+    def record(user_id):
+        session_id = client.post("/v1/sessions/start", json={"user_id": user_id}).json()["session_id"]
+        now = datetime.now(timezone.utc).isoformat()
+        client.post("/v1/metrics/batch", json={
+            "session_id": session_id,
+            "metrics": [
+                {"t": now, "hr": 120, "hrv": 45.0, "rep": 12, "error_flags": ["depth"]},
+                {"t": now, "hr": 125, "hrv": 44.0, "rep": 14},
+            ]
+        })
+        client.post("/v1/sessions/end", json={"session_id": session_id})
+    return record
+
+
+def _per_session(value, count):
+    return list(value) if isinstance(value, (list, tuple)) else [value] * count
+
+
+def _seed_history(db, user_id, starts, ended=False, metrics=0, metric=None, session_ids=None):
+    """Add ``user_id`` with one session per start time and commit; returns the session ids.
+
+    ``ended`` (a bool, or one per session) ends a session at its start time.
+    ``metrics`` (a count, or one per session) adds rows one second apart from
+    the start, with columns from ``metric(i)``. Session ids default to
+    ``{user_id}-s00``, ``{user_id}-s01``, ...
+    """
+    session_ids = session_ids or [f"{user_id}-s{i:02d}" for i in range(len(starts))]
+    db.add(User(id=user_id))
+    for session_id, started, is_ended, count in zip(
+        session_ids, starts, _per_session(ended, len(starts)), _per_session(metrics, len(starts))
+    ):
+        db.add(Session(id=session_id, user_id=user_id, started_at=started, ended_at=started if is_ended else None))
+        db.add_all([
+            SessionMetric(session_id=session_id, t=started + timedelta(seconds=i), **(metric(i) if metric else {}))
+            for i in range(count)
+        ])
+    db.commit()
+    return session_ids
+
+
+@pytest.fixture
+def seed_history():
+    """``_seed_history(db, user_id, starts, ...)``, for any session factory's ``db``"""
+    return _seed_history
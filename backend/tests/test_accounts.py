@@ -1,4 +1,16 @@
-from datetime import datetime, timezone
+import csv
+import gzip
+import io
+import json
+import zlib
+from datetime import datetime, timezone, timedelta
+
+from sqlalchemy.orm import sessionmaker
+
+from app.config import settings
+from app.db.models import AccountDeletionJob, Session, SessionMetric, SessionSummary, User
+from app.exports import gzip_chunks
+from app.workers import accounts
 
 
 def test_account_deletion(client):
@@ -76,3 +88,132 @@ def test_delete_user_with_multiple_sessions(client):
     delete_resp = client.post("/v1/account/delete", json={"user_id": user_id})
     assert delete_resp.status_code == 200
     assert delete_resp.json()["deleted"] is True
+
+
+def test_deletion_job_purges_in_chunks(client, db_session, monkeypatch):
+    """Data is removed by a background job that reports its progress"""
+    
+    monkeypatch.setattr(settings, "account_delete_chunk_size", 1)
+    
+    user_id = "chunked-delete-user"
+    session_ids = []
+    for _ in range(2):
+        session_id = client.post("/v1/sessions/start", json={"user_id": user_id}).json()["session_id"]
+        session_ids.append(session_id)
+        now = datetime.now(timezone.utc).isoformat()
+        client.post("/v1/metrics/batch", json={
+            "session_id": session_id,
+            "metrics": [{"t": now, "hr": 120 + i, "rep": i} for i in range(4)]
+        })
+        client.post("/v1/sessions/end", json={"session_id": session_id})
+    
+    delete_resp = client.post("/v1/account/delete", json={"user_id": user_id})
+    assert delete_resp.status_code == 200
+    job_id = delete_resp.json()["job_id"]
+    
+    status_resp = client.get(f"/v1/account/delete/{job_id}")
+    assert status_resp.status_code == 200
+    status = status_resp.json()
+    assert status["status"] == "completed"
+    assert status["metrics_deleted"] == 8
+    assert status["sessions_deleted"] == 2
+    assert status["attempts"] == 1
+    
+    assert db_session.get(User, user_id) is None
+    assert db_session.query(Session).filter(Session.user_id == user_id).count() == 0
+    assert db_session.query(SessionMetric).filter(SessionMetric.session_id.in_(session_ids)).count() == 0
+    assert db_session.query(SessionSummary).filter(SessionSummary.session_id.in_(session_ids)).count() == 0
+
+
+def test_resume_stops_after_max_attempts(db_session, monkeypatch):
+    monkeypatch.setattr(accounts, "SessionLocal", sessionmaker(bind=db_session.get_bind()))
+    monkeypatch.setattr(settings, "account_delete_max_attempts", 3)
+    stalled = datetime.now(timezone.utc) - accounts.STALLED_JOB_AFTER - timedelta(minutes=1)
+    for user_id, attempts in (("exhausted-delete-user", 3), ("retried-delete-user", 1)):
+        db_session.add(User(id=user_id, deleted_at=stalled))
+        db_session.add(AccountDeletionJob(
+            id=f"{user_id}-job", user_id=user_id, status="failed", attempts=attempts,
+            created_at=stalled, updated_at=stalled
+        ))
+    db_session.commit()
+    
+    accounts.resume_account_deletions()
+    
+    db_session.expire_all()
+    exhausted = db_session.get(AccountDeletionJob, "exhausted-delete-user-job")
+    assert (exhausted.status, exhausted.attempts) == ("failed", 3)
+    retried = db_session.get(AccountDeletionJob, "retried-delete-user-job")
+    assert (retried.status, retried.attempts) == ("completed", 2)
+
+
+def test_tombstoned_user_cannot_start_sessions(client, db_session):
+    """A user is blocked as soon as deletion is requested"""
+    
+    db_session.add(User(id="tombstoned-user", deleted_at=datetime.now(timezone.utc)))
+    db_session.commit()
+    
+    resp = client.post("/v1/sessions/start", json={"user_id": "tombstoned-user"})
+    assert resp.status_code == 410
+
+
+def test_unknown_deletion_job(client):
+    resp = client.get("/v1/account/delete/no-such-job")
+    assert resp.status_code == 404
+
+
+def _seed_export_history(seed_history, db_session, user_id):
+    started = datetime(2025, 5, 1, 9, 0, tzinfo=timezone.utc)
+    seed_history(
+        db_session, user_id, [started, started + timedelta(days=1)], session_ids=[f"{user_id}-a", f"{user_id}-b"],
+        ended=[True, False], metrics=[5, 0],
+        metric=lambda i: {"hr": 100 + i, "rep": i, "error_flags": ["depth"] if i == 2 else None}
+    )
+
+
+def test_export_streams_ndjson(client, db_session, monkeypatch, seed_history):
+    """Export is read in chunks and covers sessions without metrics"""
+    
+    monkeypatch.setattr(settings, "account_export_chunk_size", 2)
+    _seed_export_history(seed_history, db_session, "export-user")
+    
+    resp = client.get("/v1/account/export", params={"user_id": "export-user"})
+    assert resp.status_code == 200
+    assert resp.headers["content-type"].startswith("application/x-ndjson")
+    
+    records = [json.loads(line) for line in resp.text.splitlines()]
+    assert [r["type"] for r in records] == ["session"] + ["metric"] * 5 + ["session"]
+    assert records[0]["session_id"] == "export-user-a"
+    assert [r["hr"] for r in records[1:6]] == [100, 101, 102, 103, 104]
+    assert records[3]["error_flags"] == ["depth"]
+    assert records[-1] == {
+        "type": "session", "session_id": "export-user-b",
+        "started_at": "2025-05-02T09:00:00+00:00", "ended_at": None
+    }
+
+
+def test_export_csv_gzip(client, db_session, seed_history):
+    _seed_export_history(seed_history, db_session, "export-csv-user")
+    
+    resp = client.get("/v1/account/export", params={"user_id": "export-csv-user", "format": "csv", "gzip": True})
+    assert resp.status_code == 200
+    assert resp.headers["content-encoding"] == "gzip"
+    
+    rows = list(csv.DictReader(io.StringIO(resp.text)))
+    assert len(rows) == 6
+    assert rows[2]["error_flags"] == "depth"
+    assert rows[5]["session_id"] == "export-csv-user-b" and rows[5]["t"] == ""
+
+
+def test_gzip_chunks_emit_each_chunk_immediately():
+    
+    chunks = [b"header\n", b"row 1\n", b"row 2\n"]
+    stream = gzip_chunks(iter(chunks))
+    decompressor = zlib.decompressobj(31)
+    # Every chunk is decodable as soon as it is yielded, before the stream ends
+    received = [decompressor.decompress(next(stream)) for _ in chunks]
+    assert received == chunks
+    assert gzip.decompress(b"".join(gzip_chunks(iter(chunks)))) == b"".join(chunks)
+
+
+def test_export_unknown_user(client):
+    assert client.get("/v1/account/export", params={"user_id": "nobody"}).status_code == 404
@@ -0,0 +1,114 @@
+from datetime import datetime, timezone, timedelta
+
+from app.active_sessions import ActiveSessions, active_sessions
+from app.db.models import User, Session, SessionMetric, SessionSummary, PersonalizationEvent, UserTrainingState
+from app.observability.queries import assert_max_queries
+from app.workers.sessions import close_stale_sessions
+
+
+def test_registry_counts_recent_heartbeats():
+    registry = ActiveSessions()
+    registry.heartbeat("a", at=1000.0)
+    registry.heartbeat("b", at=1500.0)
+    registry.heartbeat("a", at=900.0)  # Out-of-order beats never move a session back
+    
+    assert registry.count(window=200, now=1600.0) == 1
+    assert registry.count(window=700, now=1600.0) == 2
+    
+    registry.discard(["b"])
+    registry.prune(before=1001.0)
+    assert registry.count(window=10_000, now=1600.0) == 0
+
+
+def test_sweeper_closes_stale_sessions_at_last_metric(db_session):
+    now = datetime(2025, 4, 1, 12, 0, tzinfo=timezone.utc)
+    started = now - timedelta(hours=2)
+    last_metric = started + timedelta(minutes=20)
+    
+    db_session.add(User(id="sweep-user"))
+    db_session.add_all([
+        Session(id="sweep-crashed", user_id="sweep-user", started_at=started),
+        Session(id="sweep-empty", user_id="sweep-user", started_at=started),
+        Session(id="sweep-live", user_id="sweep-user", started_at=started),
+    ])
+    db_session.add_all([
+        SessionMetric(session_id="sweep-crashed", t=started + timedelta(minutes=m), hr=120, rep=1)
+        for m in range(0, 21, 5)
+    ])
+    db_session.add(SessionMetric(session_id="sweep-live", t=now - timedelta(minutes=1), hr=130))
+    db_session.commit()
+    active_sessions.heartbeat("sweep-crashed", at=last_metric.timestamp())
+    
+    closed = close_stale_sessions(db_session, now=now, stale_after=900)
+    
+    assert sorted(closed) == ["sweep-crashed", "sweep-empty"]
+    db_session.expire_all()
+    crashed = db_session.get(Session, "sweep-crashed")
+    assert crashed.ended_at.replace(tzinfo=timezone.utc) == last_metric
+    assert db_session.get(Session, "sweep-empty").ended_at.replace(tzinfo=timezone.utc) == started
+    assert db_session.get(Session, "sweep-live").ended_at is None
+    assert db_session.get(SessionSummary, "sweep-crashed").total_reps == 5
+    assert db_session.get(PersonalizationEvent, "sweep-user") is not None
+    assert "sweep-crashed" not in active_sessions._beats
+    
+    # Nothing left to close
+    assert close_stale_sessions(db_session, now=now, stale_after=900) == []
+
+
+def test_sweeper_query_count_does_not_grow_with_sessions(db_session):
+    now = datetime(2025, 4, 2, 12, 0, tzinfo=timezone.utc)
+    started = now - timedelta(hours=2)
+    
+    def crashed_sessions(prefix, count):
+        db_session.add_all([User(id=f"{prefix}-{u}") for u in range(count)])
+        for i in range(count):
+            for user in range(count):
+                session_id = f"{prefix}-{user}-{i}"
+                db_session.add(Session(id=session_id, user_id=f"{prefix}-{user}", started_at=started))
+                db_session.add(SessionMetric(session_id=session_id, t=started + timedelta(minutes=i), hr=120, rep=2))
+        db_session.commit()
+    
+    close_stale_sessions(db_session, now=now, stale_after=900)  # Sessions left open by other tests
+    crashed_sessions("sweep-small", 1)
+    with assert_max_queries(20) as small:
+        assert len(close_stale_sessions(db_session, now=now, stale_after=900)) == 1
+    
+    crashed_sessions("sweep-large", 6)
+    with assert_max_queries(small.count) as large:
+        assert len(close_stale_sessions(db_session, now=now, stale_after=900)) == 36
+    
+    db_session.expire_all()
+    state = db_session.get(UserTrainingState, "sweep-large-3")
+    assert state.sessions_count == 6
+    assert state.updated_at.replace(tzinfo=timezone.utc) == started + timedelta(minutes=5)
+    assert db_session.get(SessionSummary, "sweep-large-3-5").total_reps == 2
+    assert db_session.query(PersonalizationEvent).filter(PersonalizationEvent.user_id.like("sweep-large-%")).count() == 6
+
+
+def test_active_endpoint_tracks_start_and_end(client):
+    before = client.get("/v1/sessions/active").json()["active_sessions"]
+    
+    session_id = client.post("/v1/sessions/start", json={"user_id": "active-user"}).json()["session_id"]
+    assert client.get("/v1/sessions/active").json()["active_sessions"] == before + 1
+    
+    client.post("/v1/sessions/end", json={"session_id": session_id})
+    assert client.get("/v1/sessions/active").json()["active_sessions"] == before
+
+
+class _DownRedis:
+    def __getattr__(self, name):
+        def fail(*args, **kwargs):
+            raise ConnectionError("redis is down")
+        return fail
+
+
+def test_active_endpoint_survives_redis_outage(client, db_session, monkeypatch):
+    from app.api.v1.routers import sessions as sessions_router
+    monkeypatch.setattr(sessions_router, "active_sessions", ActiveSessions(redis_client=_DownRedis()))
+    open_sessions = db_session.query(Session).filter(Session.ended_at.is_(None)).count()
+    
+    session_id = client.post("/v1/sessions/start", json={"user_id": "redis-down-user"}).json()["session_id"]
+    resp = client.get("/v1/sessions/active")
+    assert resp.status_code == 200
+    assert resp.json()["active_sessions"] == open_sessions + 1
+    client.post("/v1/sessions/end", json={"session_id": session_id})
@@ -48,3 +48,28 @@ def test_metrics_batch_and_plan(client):
     assert "items" in plan
     assert len(plan["items"]) >= 1
     assert plan["items"][0]["workout"] == "squat"
+
+
+def test_session_start_is_single_statement_on_postgres():
+    """On Postgres the user upsert and session insert are one CTE statement"""
+    from types import SimpleNamespace
+    from sqlalchemy.dialects import postgresql
+    from app.api.v1.routers.sessions import start_session_statements
+    
+    pg_db = SimpleNamespace(get_bind=lambda: SimpleNamespace(dialect=postgresql.dialect()))
+    statements = start_session_statements(pg_db, "user-1", "session-1", datetime.now(timezone.utc))
+    
+    assert len(statements) == 1
+    sql = str(statements[0].compile(dialect=postgresql.dialect()))
+    assert sql.startswith("WITH new_user AS")
+    assert "ON CONFLICT (id) DO NOTHING" in sql
+    assert "RETURNING sessions.id" in sql
+
+
+def test_session_start_reuses_existing_user(client):
+    first = client.post("/v1/sessions/start", json={"user_id": "repeat-user"})
+    second = client.post("/v1/sessions/start", json={"user_id": "repeat-user"})
+    
+    assert first.status_code == 200
+    assert second.status_code == 200
+    assert first.json()["session_id"] != second.json()["session_id"]
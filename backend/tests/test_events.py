@@ -0,0 +1,98 @@
+from datetime import datetime, timezone, timedelta
+
+import pytest
+
+from app.config import settings
+from app.db.models import PersonalizationEvent, UserPlan
+from app.workers import personalize
+from app.workers.events import claim_due_events, complete_events, slot_for_user
+from app.workers.personalize import process_due_events
+
+
+def test_session_end_events_are_coalesced(client, workout, db_session):
+    """Several sessions inside the debounce window leave one pending event"""
+    
+    before = datetime.now(timezone.utc)
+    workout("event-user-1")
+    workout("event-user-1")
+    
+    events = db_session.query(PersonalizationEvent).filter_by(user_id="event-user-1").all()
+    assert len(events) == 1
+    
+    # Not due yet
+    assert "event-user-1" not in claim_due_events(db_session, before)
+
+
+def test_due_events_recompute_plans(client, workout, db_session):
+    workout("event-user-2")
+    
+    later = datetime.now(timezone.utc) + timedelta(seconds=settings.repersonalize_debounce_seconds + 1)
+    summary = process_due_events(db_session, later)
+    
+    assert summary["successful_updates"] >= 1
+    assert db_session.get(PersonalizationEvent, "event-user-2") is None
+    
+    plan = db_session.get(UserPlan, "event-user-2")
+    assert plan is not None
+    assert "depth" in plan.plan["focus_areas"]
+
+
+def test_failed_recompute_keeps_events(client, workout, db_session, monkeypatch):
+    workout("event-user-3")
+    later = datetime.now(timezone.utc) + timedelta(seconds=settings.repersonalize_debounce_seconds + 1)
+    
+    def crash(*args, **kwargs):
+        raise RuntimeError("worker died")
+    
+    monkeypatch.setattr(personalize, "personalize_users", crash)
+    with pytest.raises(RuntimeError):
+        process_due_events(db_session, later)
+    monkeypatch.undo()
+    
+    # Leased, not lost: due again once the lease runs out
+    assert db_session.get(PersonalizationEvent, "event-user-3") is not None
+    assert "event-user-3" not in claim_due_events(db_session, later)
+    after_lease = datetime.now(timezone.utc) + timedelta(seconds=settings.repersonalize_lease_seconds + 1)
+    process_due_events(db_session, after_lease)
+    assert db_session.get(PersonalizationEvent, "event-user-3") is None
+    assert db_session.get(UserPlan, "event-user-3") is not None
+
+
+def test_session_ending_during_run_keeps_its_event(client, workout, db_session):
+    workout("event-user-4")
+    later = datetime.now(timezone.utc) + timedelta(seconds=settings.repersonalize_debounce_seconds + 1)
+    
+    claims = claim_due_events(db_session, later, user_ids=["event-user-4"])
+    workout("event-user-4")
+    complete_events(db_session, claims)
+    
+    db_session.expire_all()
+    assert db_session.get(PersonalizationEvent, "event-user-4") is not None
+    
+    # Its lease is released, so the next claim picks it up again
+    assert "event-user-4" in claim_due_events(db_session, user_ids=["event-user-4"])
+
+
+def test_sweep_skips_leased_events(client, workout, db_session):
+    workout("event-user-5")
+    later = datetime.now(timezone.utc) + timedelta(seconds=settings.repersonalize_debounce_seconds + 1)
+    
+    claims = claim_due_events(db_session, later, user_ids=["event-user-5"])
+    assert list(claims) == ["event-user-5"]
+    # The nightly sweep claims regardless of due time, but not under a lease
+    assert "event-user-5" not in claim_due_events(db_session)
+    complete_events(db_session, claims)
+
+
+def test_slot_claims_filter_in_sql(client, workout, db_session, monkeypatch):
+    monkeypatch.setattr(settings, "personalization_slots", 3)
+    user_ids = [f"event-slot-user-{i}" for i in range(6)]
+    for user_id in user_ids:
+        workout(user_id)
+    slot = slot_for_user(user_ids[0])
+    
+    claims = claim_due_events(db_session, slot=slot, user_ids=user_ids)
+    assert sorted(claims) == sorted(u for u in user_ids if slot_for_user(u) == slot)
+    assert db_session.get(PersonalizationEvent, user_ids[0]).slot == slot
+    complete_events(db_session, claims)
+    complete_events(db_session, claim_due_events(db_session, user_ids=user_ids))
@@ -0,0 +1,72 @@
+import threading
+from datetime import datetime, timezone, timedelta
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.config import settings
+from app.db.models import Base, UserPlan, PersonalizationRunResult
+from app.workers import local, personalize
+
+
+def test_run_personalization_on_local_pool(tmp_path, monkeypatch, seed_history):
+    url = f"sqlite:///{tmp_path / 'local.db'}"
+    engine = create_engine(url)
+    Base.metadata.create_all(engine)
+    factory = sessionmaker(bind=engine)
+    started = datetime.now(timezone.utc) - timedelta(hours=1)
+    metric = lambda i: {"hr": 120.0, "hrv": 45.0, "rep": 12, "error_flags": ["depth"]}
+    with factory() as db:
+        for i in range(9):
+            seed_history(db, f"local-user-{i}", [started], ended=True, metrics=1, metric=metric)
+    
+    monkeypatch.setattr(settings, "task_backend", "local")
+    monkeypatch.setattr(settings, "local_workers", 2)
+    monkeypatch.setattr(personalize, "SessionLocal", factory)
+    monkeypatch.setattr(personalize, "PERSONALIZE_CHUNK_SIZE", 4)
+    
+    local.get_executor(url)
+    try:
+        result = personalize.run_personalization()
+    finally:
+        local.shutdown()
+    
+    assert result["processed_users"] == 9
+    assert result["successful_updates"] == 9
+    # Shard timings are merged into the run's
+    assert {"select_users", "load", "analyze", "store"} <= set(result["stages_seconds"])
+    with factory() as db:
+        assert db.query(UserPlan).count() == 9
+        assert db.query(PersonalizationRunResult).filter_by(run_id=result["run_id"]).count() == 9
+
+
+def test_celery_is_the_default_backend():
+    assert settings.task_backend == "celery"
+    assert not local.parallel_available()
+
+
+def test_cli_arguments_are_parsed_as_json():
+    assert local._argument("2") == 2
+    assert local._argument("null") is None
+    assert local._argument("athlete-1") == "athlete-1"
+
+
+def test_local_schedule_runs_due_entries():
+    clock = [datetime(2025, 1, 1, tzinfo=timezone.utc)]
+    stop = threading.Event()
+    ticks = []
+    
+    def tick(label):
+        ticks.append((label, clock[0]))
+        if len(ticks) == 2:
+            raise RuntimeError("a failing run does not stop the schedule")
+    
+    def wait(seconds):
+        clock[0] += timedelta(seconds=seconds)
+        if clock[0] >= datetime(2025, 1, 1, 0, 0, 16, tzinfo=timezone.utc):
+            stop.set()
+    
+    schedule = {"tick": {"task": "tests.tick", "schedule": 5, "args": ("tick",)}}
+    local.run_schedule(schedule, stop, 1.0, tasks={"tests.tick": tick}, now=lambda: clock[0], wait=wait)
+    
+    assert [(label, at.second) for label, at in ticks] == [("tick", 5), ("tick", 10), ("tick", 15)]
@@ -0,0 +1,142 @@
+from datetime import datetime, timezone
+
+import pytest
+
+from app.observability.metrics import METRIC_ROWS_INGESTED
+from app.observability.registry import Registry
+
+
+def test_histogram_exposition_is_cumulative():
+    registry = Registry()
+    latency = registry.histogram("req_seconds", "Latency", ("router",), buckets=(0.1, 1.0))
+    for value in (0.05, 0.5, 0.5, 3.0):
+        latency.observe(value, "plans")
+    
+    text = registry.render()
+    assert "# TYPE req_seconds histogram" in text
+    assert 'req_seconds_bucket{router="plans",le="0.1"} 1' in text
+    assert 'req_seconds_bucket{router="plans",le="1"} 3' in text
+    assert 'req_seconds_bucket{router="plans",le="+Inf"} 4' in text
+    assert 'req_seconds_sum{router="plans"} 4.05' in text
+    assert 'req_seconds_count{router="plans"} 4' in text
+
+
+def test_registry_rejects_conflicting_definitions():
+    registry = Registry()
+    counter = registry.counter("events_total", "Events", ("kind",))
+    assert registry.counter("events_total", "Events", ("kind",)) is counter
+    with pytest.raises(ValueError):
+        registry.gauge("events_total", "Events")
+    with pytest.raises(ValueError):
+        counter.inc(1)
+
+
+def test_metrics_endpoint_reports_routes_and_ingest(client):
+    before = METRIC_ROWS_INGESTED.value()
+    session_id = client.post("/v1/sessions/start", json={"user_id": "observed-user"}).json()["session_id"]
+    now = datetime.now(timezone.utc).isoformat()
+    client.post("/v1/metrics/batch", json={
+        "session_id": session_id,
+        "metrics": [{"t": now, "hr": 120 + i} for i in range(3)]
+    })
+    
+    resp = client.get("/metrics")
+    assert resp.status_code == 200
+    assert resp.headers["content-type"].startswith("text/plain; version=0.0.4")
+    assert 'aicoach_http_request_duration_seconds_count{router="sessions",method="POST",status="200"}' in resp.text
+    assert 'aicoach_http_request_duration_seconds_count{router="metrics",method="POST",status="200"}' in resp.text
+    assert "aicoach_http_requests_in_flight 1" in resp.text  # the scrape itself
+    assert METRIC_ROWS_INGESTED.value() == before + 3
+
+
+def test_stack_sampler_collapses_busy_threads():
+    import threading
+    from app.observability.profiling import StackSampler
+    
+    done = threading.Event()
+    
+    def spin():
+        while not done.is_set():
+            sum(range(1000))
+    
+    worker = threading.Thread(target=spin)
+    worker.start()
+    sampler = StackSampler("job", interval=0.001, thread_ids={worker.ident})
+    for _ in range(5):
+        sampler.sample()
+    done.set()
+    worker.join()
+    
+    assert sum(sampler.stacks.values()) == 5
+    stack = next(iter(sampler.stacks))
+    assert stack.startswith("job;threading:_bootstrap")
+    assert stack.endswith("test_observability:spin")
+
+
+def test_profiled_request_reaches_flamegraph(client, monkeypatch):
+    from app.config import settings
+    monkeypatch.setattr(settings, "profiling_enabled", False)
+    monkeypatch.setattr(settings, "profile_sample_rate", 0.0)
+    monkeypatch.setattr(settings, "profile_interval_ms", 5.0)
+    monkeypatch.setattr(settings, "debug", True)
+    
+    client.delete("/v1/admin/profiling/flamegraph")
+    client.get("/healthz", headers={"X-Profile": "1"})
+    assert client.get("/v1/admin/profiling").json()["profiles"] == 0  # header ignored while disabled
+    
+    status = client.put("/v1/admin/profiling", json={"enabled": True, "sample_rate": 0.0, "interval_ms": 1.0})
+    assert status.json()["enabled"] is True
+    client.get("/healthz", headers={"X-Profile": "1"})
+    
+    assert client.get("/v1/admin/profiling").json()["profiles"] == 1
+    resp = client.get("/v1/admin/profiling/flamegraph")
+    assert resp.status_code == 200
+    for line in resp.text.splitlines():
+        stack, count = line.rsplit(" ", 1)
+        assert stack.startswith("GET /healthz;") and int(count) > 0
+
+
+def test_profiling_endpoints_need_admin_token(client, monkeypatch):
+    from app.config import settings
+    monkeypatch.setattr(settings, "debug", False)
+    monkeypatch.setattr(settings, "admin_token", "")
+    monkeypatch.setattr(settings, "profiling_enabled", False)
+    monkeypatch.setattr(settings, "profile_sample_rate", 0.0)
+    payload = {"enabled": True, "sample_rate": 1.0, "interval_ms": 1.0}
+    
+    # Without a configured token profiling is closed outside debug, reads included
+    assert client.put("/v1/admin/profiling", json=payload).status_code == 403
+    assert client.delete("/v1/admin/profiling/flamegraph").status_code == 403
+    assert client.get("/v1/admin/profiling").status_code == 403
+    assert client.get("/v1/admin/profiling/flamegraph").status_code == 403
+    
+    monkeypatch.setattr(settings, "admin_token", "s3cret")
+    assert client.put("/v1/admin/profiling", json=payload, headers={"X-Admin-Token": "wrong"}).status_code == 403
+    assert client.get("/v1/admin/profiling/flamegraph", headers={"X-Admin-Token": "wrong"}).status_code == 403
+    assert settings.profile_sample_rate == 0.0
+    
+    resp = client.put("/v1/admin/profiling", json=payload, headers={"X-Admin-Token": "s3cret"})
+    assert resp.status_code == 200 and resp.json()["sample_rate"] == 1.0
+
+
+def test_memory_profile_reports_growth_and_checkpoints(tmp_path, monkeypatch):
+    import json
+    from app.config import settings
+    from app.observability.memory import maybe_checkpoint, profile_memory
+    monkeypatch.setattr(settings, "memory_profile_dir", str(tmp_path))
+    monkeypatch.setattr(settings, "memory_checkpoint_users", 100)
+    
+    retained = []
+    with profile_memory("app.workers.personalize.run_personalization"):
+        for processed in (50, 100, 150, 350):
+            retained.append([object() for _ in range(5000)])
+            maybe_checkpoint(processed)
+    
+    reports = list(tmp_path.glob("*.json"))
+    assert len(reports) == 1
+    report = json.loads(reports[0].read_text())
+    labels = [c["label"] for c in report["checkpoints"]]
+    assert labels == ["start", "users=100", "users=350", "end"]
+    growth = report["checkpoints"][1]["top_growth"]
+    assert any("test_observability.py" in site["site"] and site["size_diff_kb"] > 0 for site in growth)
+    assert report["checkpoints"][-1]["peak_rss_mb"] > 0
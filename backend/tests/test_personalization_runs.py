@@ -0,0 +1,132 @@
+from datetime import datetime, timezone, timedelta
+
+from fastapi.testclient import TestClient
+
+from app.config import settings
+from app.db.models import PersonalizationRunResult
+from app.workers.personalize import personalize_users
+from app.main import app
+from app.workers.runs import RunResultSink, RunStats, start_run, finish_run
+
+
+def test_run_returns_counters_and_streams_outcomes(client, workout, db_session):
+    user_ids = [f"run-user-{i}" for i in range(5)]
+    for user_id in user_ids:
+        workout(user_id)
+    
+    run = start_run(db_session, "test")
+    sink = RunResultSink(db_session, run.id, batch_size=2)
+    counts = personalize_users(
+        db_session, user_ids + ["run-user-no-data"],
+        datetime.now(timezone.utc) - timedelta(days=7), sink, chunk_size=4
+    )
+    result = finish_run(db_session, run, counts)
+    
+    assert result["processed_users"] == 6
+    assert result["successful_updates"] == 6
+    assert "results" not in result
+    
+    stored = db_session.query(PersonalizationRunResult).filter_by(run_id=run.id).count()
+    assert stored == 6
+
+
+def test_run_results_keyset_pagination(client, workout, db_session):
+    user_ids = [f"page-user-{i}" for i in range(5)]
+    for user_id in user_ids:
+        workout(user_id)
+    
+    run = start_run(db_session, "test")
+    counts = personalize_users(
+        db_session, user_ids, datetime.now(timezone.utc) - timedelta(days=7), RunResultSink(db_session, run.id)
+    )
+    finish_run(db_session, run, counts)
+    
+    seen = []
+    cursor = 0
+    while cursor is not None:
+        resp = client.get(
+            f"/v1/admin/personalization/runs/{run.id}/results",
+            params={"after": cursor, "limit": 2}
+        )
+        assert resp.status_code == 200
+        page = resp.json()
+        assert len(page["items"]) <= 2
+        seen.extend(item["user_id"] for item in page["items"])
+        cursor = page["next_cursor"]
+    
+    assert sorted(seen) == user_ids
+    assert page["run"]["processed_users"] == 5
+
+
+def test_run_results_unknown_run(client):
+    resp = client.get("/v1/admin/personalization/runs/missing/results")
+    assert resp.status_code == 404
+
+
+def test_run_results_need_admin_token(db_session, monkeypatch):
+    monkeypatch.setattr(settings, "debug", False)
+    run = start_run(db_session, "guarded-test")
+    anonymous = TestClient(app)
+    
+    assert anonymous.get(f"/v1/admin/personalization/runs/{run.id}/results").status_code == 403
+    resp = anonymous.get(f"/v1/admin/personalization/runs/{run.id}/results", headers={"X-Admin-Token": "wrong"})
+    assert resp.status_code == 403
+
+
+def test_run_listing_needs_admin_token(monkeypatch):
+    monkeypatch.setattr(settings, "debug", False)
+    assert TestClient(app).get("/v1/admin/personalization/runs").status_code == 403
+
+
+def test_run_records_stage_timings_and_latency(client, workout, db_session):
+    user_ids = [f"timed-user-{i}" for i in range(3)]
+    for user_id in user_ids:
+        workout(user_id)
+    
+    run = start_run(db_session, "timed-test")
+    stats = RunStats()
+    counts = personalize_users(
+        db_session, user_ids, datetime.now(timezone.utc) - timedelta(days=7),
+        RunResultSink(db_session, run.id), chunk_size=2, stats=stats
+    )
+    result = finish_run(db_session, run, counts, stats)
+    
+    assert set(result["stages_seconds"]) == {"load", "analyze", "generate", "store"}
+    assert result["users_per_second"] > 0
+    latency = run.stats["user_latency_ms"]
+    assert latency["count"] == 3
+    assert 0 < latency["p50"] <= latency["p99"] <= latency["max"]
+    assert sum(latency["counts"]) == 3
+
+
+def test_run_stats_merge_shards():
+    a, b = RunStats(), RunStats()
+    with a.stage("analyze"):
+        pass
+    a.observe_user(0.0003)
+    b.observe_user(0.004)
+    b.observe_user(7.5)
+    a.merge(b.to_dict())
+    
+    summary = a.summary()["user_latency_ms"]
+    assert summary["count"] == 3
+    assert summary["p50"] == 5
+    assert summary["max"] == 7500
+    assert a.percentile_ms(1.0) == 7500
+
+
+def test_list_runs_newest_first_with_timings(client, db_session):
+    for i in range(3):
+        run = start_run(db_session, f"listed-test[slot={i}]")
+        finish_run(db_session, run, {"processed_users": i, "successful_updates": i, "plans_changed": 0}, RunStats())
+    
+    page = client.get("/v1/admin/personalization/runs", params={"task": "listed-test", "limit": 2}).json()
+    assert [item["task"] for item in page["items"]] == ["listed-test[slot=2]", "listed-test[slot=1]"]
+    assert page["items"][0]["duration_seconds"] is not None
+    assert page["items"][0]["stats"]["user_latency_ms"]["count"] == 0
+    
+    rest = client.get(
+        "/v1/admin/personalization/runs", params={"task": "listed-test", "before": page["next_cursor"]}
+    ).json()
+    assert [item["task"] for item in rest["items"]] == ["listed-test[slot=0]"]
+    assert rest["next_cursor"] is None
@@ -0,0 +1,172 @@
+import json
+import threading
+import time
+
+from app.cache import FENCE_ALL, PlanCache
+from app.workers.personalize import store_user_plans
+
+
+class FakeRedis:
+    """Dict-backed stand-in for the few Redis commands the cache uses"""
+    
+    def __init__(self):
+        self.data = {}
+    
+    def get(self, key):
+        return self.data.get(key)
+    
+    def set(self, key, value, ex=None):
+        self.data[key] = value
+    
+    def delete(self, *keys):
+        for key in keys:
+            self.data.pop(key, None)
+    
+    def eval(self, script, numkeys, key, value, version, ttl):
+        """Python rendering of the cache's compare-and-set script"""
+        current = self.data.get(key)
+        if current is not None:
+            decoded = json.loads(current)
+            if isinstance(decoded, dict):
+                floor = decoded.get("min_version", decoded.get("version"))
+                if floor is not None and floor > version:
+                    return 0
+        self.data[key] = value
+        return 1
+    
+    def pipeline(self, transaction=True):
+        return FakePipeline(self)
+
+
+class FakePipeline:
+    def __init__(self, redis):
+        self.redis = redis
+        self.calls = []
+    
+    def __getattr__(self, name):
+        return lambda *args, **kwargs: self.calls.append((name, args, kwargs))
+    
+    def execute(self):
+        return [getattr(self.redis, name)(*args, **kwargs) for name, args, kwargs in self.calls]
+
+
+def _value(version):
+    return {"version": version, "plan": {"intensity": 1.0}, "updated_at": "2025-01-01T00:00:00+00:00"}
+
+
+def test_read_through_and_lru_eviction():
+    cache = PlanCache(maxsize=2)
+    calls = []
+    
+    def loader(user_id):
+        calls.append(user_id)
+        return _value(1)
+    
+    cache.get("a", lambda: loader("a"))
+    cache.get("a", lambda: loader("a"))
+    assert calls == ["a"]
+    
+    cache.get("b", lambda: loader("b"))
+    cache.get("c", lambda: loader("c"))  # evicts "a"
+    cache.get("a", lambda: loader("a"))
+    assert calls == ["a", "b", "c", "a"]
+
+
+def test_ttl_expiry():
+    cache = PlanCache(ttl=0.01)
+    calls = []
+    cache.get("a", lambda: calls.append(1) or _value(1))
+    time.sleep(0.02)
+    cache.get("a", lambda: calls.append(1) or _value(1))
+    assert len(calls) == 2
+
+
+def test_concurrent_misses_coalesce():
+    """Only one loader runs for concurrent misses of the same user"""
+    
+    cache = PlanCache()
+    calls = []
+    release = threading.Event()
+    
+    def slow_loader():
+        calls.append(1)
+        release.wait(1)
+        return _value(3)
+    
+    results = []
+    threads = [
+        threading.Thread(target=lambda: results.append(cache.get("hot", slow_loader)))
+        for _ in range(8)
+    ]
+    for t in threads:
+        t.start()
+    time.sleep(0.05)
+    release.set()
+    for t in threads:
+        t.join()
+    
+    assert len(calls) == 1
+    assert [r["version"] for r in results] == [3] * 8
+
+
+def test_invalidate_and_redis_tier():
+    redis = FakeRedis()
+    cache = PlanCache(redis_client=redis)
+    
+    cache.get("a", lambda: _value(1))
+    assert "aicoach:plan:a" in redis.data
+    
+    # A second process with a cold local tier is served from Redis
+    other = PlanCache(redis_client=redis)
+    assert other.get("a", lambda: _value(99))["version"] == 1
+    
+    cache.invalidate({"a": 2})
+    assert cache.get("a", lambda: _value(2))["version"] == 2
+    assert json.loads(redis.data["aicoach:plan:a"])["version"] == 2
+
+
+def test_redis_tier_refuses_plan_loaded_before_invalidation():
+    """A reader that loaded the old plan must not write it back after the new one is stored"""
+    
+    redis = FakeRedis()
+    cache = PlanCache(redis_client=redis)
+    
+    def load_then_race():
+        stale = _value(1)
+        # The worker stores version 2 and invalidates between the load and the write
+        cache.invalidate({"a": 2})
+        return stale
+    
+    assert cache.get("a", load_then_race)["version"] == 1
+    
+    other = PlanCache(redis_client=redis)
+    assert other.get("a", lambda: _value(2))["version"] == 2
+
+
+def test_unversioned_invalidation_fences_writes():
+    redis = FakeRedis()
+    cache = PlanCache(redis_client=redis)
+    cache.get("a", lambda: _value(3))
+    
+    cache.invalidate(["a"])
+    assert json.loads(redis.data["aicoach:plan:a"]) == {"min_version": FENCE_ALL}
+    
+    other = PlanCache(redis_client=redis)
+    assert other.get("a", lambda: None) is None
+    assert json.loads(redis.data["aicoach:plan:a"]) == {"min_version": FENCE_ALL}
+
+
+def test_plan_endpoint_sees_new_version_after_store(client, db_session):
+    """Writing a new plan invalidates the cached read"""
+    
+    plan = {"intensity": 1.0, "focus_areas": ["form"], "recommended_reps": 15, "rest_periods": 45, "notes": ""}
+    store_user_plans(db_session, {"cached-plan-user": plan})
+    
+    first = client.get("/v1/plans/today", params={"user_id": "cached-plan-user"}).json()
+    assert first["version"] == 1
+    
+    store_user_plans(db_session, {"cached-plan-user": dict(plan, intensity=0.95)})
+    
+    second = client.get("/v1/plans/today", params={"user_id": "cached-plan-user"}).json()
+    assert second["version"] == 2
+    assert second["items"][0]["intensity"] == 0.95
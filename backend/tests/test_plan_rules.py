@@ -0,0 +1,149 @@
+import json
+import random
+
+import numpy as np
+import pytest
+
+from app.workers.plan_rules import DEFAULT_PLAN_RULES, PlanRules, load_plan_rules
+from app.workers.personalize import generate_personalized_plan, generate_personalized_plans
+
+
+def reference_plan(analysis: dict) -> dict:
+    """The if-chain implementation the rule table replaced"""
+    
+    if "error" in analysis:
+        return {
+            "intensity": 1.0,
+            "focus_areas": ["form"],
+            "recommended_reps": 15,
+            "rest_periods": 60,
+            "notes": "Building baseline data"
+        }
+    
+    base_intensity = 1.0
+    focus_areas = []
+    
+    if analysis["error_rate"] > 0.3:
+        base_intensity *= 0.95
+        focus_areas.append("form")
+    elif analysis["error_rate"] < 0.1:
+        base_intensity *= 1.025
+        focus_areas.append("progression")
+    
+    if analysis["hrv_baseline"]:
+        if analysis["hrv_baseline"] < 30:
+            base_intensity *= 0.95
+            focus_areas.append("recovery")
+        elif analysis["hrv_baseline"] > 50:
+            base_intensity *= 1.025
+    
+    acwr = analysis.get("acute_chronic_ratio")
+    if acwr is not None and acwr > 1.5:
+        base_intensity *= 0.95
+        focus_areas.append("recovery")
+    
+    common_errors = analysis.get("common_errors", {})
+    if "depth" in common_errors:
+        focus_areas.append("depth")
+    if "valgus" in common_errors:
+        focus_areas.append("knee_alignment")
+    if "tempo_fast" in common_errors or "tempo_slow" in common_errors:
+        focus_areas.append("tempo_control")
+    
+    base_intensity = max(0.8, min(1.2, base_intensity))
+    
+    recent_reps_per_session = analysis["total_reps"] / analysis["total_sessions"]
+    recommended_reps = max(10, min(25, int(recent_reps_per_session * base_intensity)))
+    
+    return {
+        "intensity": round(base_intensity, 3),
+        "focus_areas": sorted(set(focus_areas)),
+        "recommended_reps": recommended_reps,
+        "rest_periods": 60 if base_intensity > 1.0 else 45,
+        "notes": f"Based on {analysis['total_sessions']} sessions, {analysis['error_rate']:.1%} error rate"
+    }
+
+
+def _random_analysis(rng: random.Random) -> dict:
+    if rng.random() < 0.05:
+        return {"error": "No sessions found"}
+    errors = ["depth", "valgus", "tempo_fast", "tempo_slow", "other"]
+    sessions = rng.randint(1, 10)
+    return {
+        "total_sessions": sessions,
+        "total_reps": rng.randint(0, 40 * sessions),
+        "hrv_baseline": rng.choice([None, 0.0, 30.0, 50.0, rng.uniform(15, 70)]),
+        "error_rate": rng.choice([0.0, 0.1, 0.3, rng.random()]),
+        "common_errors": {e: 1 for e in errors if rng.random() < 0.3},
+        "acute_chronic_ratio": rng.choice([None, 1.5, rng.uniform(0.5, 2.5)])
+    }
+
+
+def test_rule_table_matches_reference_implementation():
+    rng = random.Random(42)
+    analyses = [_random_analysis(rng) for _ in range(5000)]
+    
+    assert generate_personalized_plans(analyses) == [reference_plan(a) for a in analyses]
+
+
+def test_scalar_plan_matches_reference_implementation():
+    rng = random.Random(7)
+    analyses = [_random_analysis(rng) for _ in range(5000)]
+    
+    assert [generate_personalized_plan(a) for a in analyses] == [reference_plan(a) for a in analyses]
+
+
+def test_default_plans_are_independent():
+    rules = PlanRules(DEFAULT_PLAN_RULES)
+    first, second = rules.generate([{"error": "no data"}, {"error": "no data"}])
+    first["focus_areas"].append("mutated")
+    first["intensity"] = 0.1
+    assert second == DEFAULT_PLAN_RULES["default_plan"]
+    assert rules.plan({"error": "no data"}) == DEFAULT_PLAN_RULES["default_plan"]
+
+
+def test_evaluate_is_columnar():
+    rules = load_plan_rules()
+    n = 1000
+    columns = {
+        "has_data": np.ones(n, dtype=bool),
+        "total_reps": np.full(n, 60.0),
+        "total_sessions": np.full(n, 4),
+        "error_rate": np.linspace(0, 1, n),
+        "hrv_baseline": np.full(n, 45.0),
+        "acute_chronic_ratio": np.full(n, np.nan),
+        **{"error:" + name: np.zeros(n, dtype=bool) for name in rules.error_names}
+    }
+    
+    out = rules.evaluate(columns)
+    
+    assert out["intensity"].shape == (n,)
+    assert out["intensity"][0] == 1.025
+    assert out["intensity"][-1] == 0.95
+    assert out["focus"].shape == (n, len(rules.focus_tags))
+
+
+def test_rules_load_from_json(tmp_path):
+    table = json.loads(json.dumps(DEFAULT_PLAN_RULES))
+    table["intensity_clamp"] = [0.9, 1.1]
+    path = tmp_path / "rules.json"
+    path.write_text(json.dumps(table))
+    
+    rules = load_plan_rules(str(path))
+    plan = rules.generate([{
+        "total_sessions": 2,
+        "total_reps": 20,
+        "hrv_baseline": 20.0,
+        "error_rate": 0.8,
+        "common_errors": {},
+        "acute_chronic_ratio": 2.0
+    }])[0]
+    
+    assert plan["intensity"] == 0.9
+
+
+def test_unknown_operator_rejected():
+    table = json.loads(json.dumps(DEFAULT_PLAN_RULES))
+    table["intensity_rules"][0]["op"] = "~"
+    with pytest.raises(ValueError, match="operator"):
+        PlanRules(table)
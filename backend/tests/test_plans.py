@@ -0,0 +1,62 @@
+from app.db.models import UserPlan
+from app.workers.personalize import store_user_plans
+
+
+def _plan(intensity=1.0):
+    return {
+        "intensity": intensity,
+        "focus_areas": ["form"],
+        "recommended_reps": 15,
+        "rest_periods": 45,
+        "notes": "Based on 3 sessions, 20.0% error rate"
+    }
+
+
+def test_store_user_plans_versions_and_skips_unchanged(db_session):
+    """Changed plans bump the version, identical plans are not rewritten"""
+    
+    changed = store_user_plans(db_session, {"plan-user-a": _plan(), "plan-user-b": _plan()})
+    assert changed == 2
+    
+    # Same content again: nothing written
+    changed = store_user_plans(db_session, {"plan-user-a": _plan(), "plan-user-b": _plan()})
+    assert changed == 0
+    
+    changed = store_user_plans(db_session, {"plan-user-a": _plan(0.95), "plan-user-b": _plan()})
+    assert changed == 1
+    
+    db_session.expire_all()
+    assert db_session.get(UserPlan, "plan-user-a").version == 2
+    assert db_session.get(UserPlan, "plan-user-b").version == 1
+
+
+def test_store_user_plans_chunks(db_session):
+    """Plans spanning several chunks are all stored"""
+    
+    plans = {f"chunk-user-{i}": _plan() for i in range(7)}
+    assert store_user_plans(db_session, plans, chunk_size=3) == 7
+    assert db_session.query(UserPlan).filter(UserPlan.user_id.like("chunk-user-%")).count() == 7
+
+
+def test_today_plan_serves_stored_plan(client, db_session):
+    """Stored plans are served by /v1/plans/today"""
+    
+    store_user_plans(db_session, {"plan-api-user": _plan(1.025)})
+    
+    resp = client.get("/v1/plans/today", params={"user_id": "plan-api-user"})
+    assert resp.status_code == 200
+    data = resp.json()
+    assert data["version"] == 1
+    assert data["items"][0]["intensity"] == 1.025
+    assert data["items"][0]["focus_areas"] == ["form"]
+    assert data["items"][0]["recommended_reps"] == 15
+
+
+def test_today_plan_default_for_unknown_user(client):
+    """Users without a stored plan get the default plan"""
+    
+    resp = client.get("/v1/plans/today", params={"user_id": "no-plan-user"})
+    assert resp.status_code == 200
+    data = resp.json()
+    assert data["version"] is None
+    assert data["items"][0]["intensity"] == 1.0
@@ -0,0 +1,71 @@
+from datetime import datetime, timezone, timedelta
+
+import pytest
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+
+from app.config import settings
+from app.db.models import User
+from app.observability.queries import QueryBudgetExceeded, assert_max_queries, param_shape
+from app.workers.personalize import personalize_users
+
+
+def test_budget_helper_fails_with_statement_listing(db_session):
+    with pytest.raises(QueryBudgetExceeded) as exc:
+        with assert_max_queries(2):
+            for i in range(3):
+                db_session.get(User, f"missing-{i}")
+    assert "3 queries exceeded the budget of 2" in str(exc.value)
+    assert "3 x SELECT" in str(exc.value)
+
+
+def test_param_shape_hides_values():
+    assert param_shape({"user_id": "u1", "limit": 5}) == "{limit, user_id}"
+    assert param_shape(("a", "b")) == "(2 positional)"
+    assert param_shape([("a",), ("b",)], executemany=True) == "executemany x2 of (1 positional)"
+
+
+def test_failed_statement_does_not_leak_its_start_time(db_session):
+    connection = db_session.connection()
+    with pytest.raises(OperationalError):
+        connection.execute(text("SELECT * FROM no_such_table"))
+    assert connection.info.get("query_start") == []
+    db_session.rollback()
+
+
+def _seed_population(seed_history, db, prefix, users):
+    now = datetime.now(timezone.utc)
+    metric = lambda i: {"hr": 120 + i, "hrv": 45, "rep": i, "error_flags": ["depth"] if i == 0 else None}
+    user_ids = [f"{prefix}-{u}" for u in range(users)]
+    for user_id in user_ids:
+        seed_history(db, user_id, [now - timedelta(days=1), now - timedelta(days=2)], metrics=3, metric=metric)
+    return user_ids
+
+
+def test_personalization_queries_do_not_grow_with_users(db_session, seed_history):
+    since = datetime.now(timezone.utc) - timedelta(days=7)
+    few = _seed_population(seed_history, db_session, "budget-few", 2)
+    many = _seed_population(seed_history, db_session, "budget-many", 25)
+    
+    with assert_max_queries(10) as small:
+        personalize_users(db_session, few, since)
+    with assert_max_queries(small.count) as large:
+        counts = personalize_users(db_session, many, since)
+    
+    assert counts["successful_updates"] == 25
+    assert large.count == small.count
+
+
+def test_ingest_batch_budget(client, monkeypatch):
+    monkeypatch.setattr(settings, "debug", True)
+    session_id = client.post("/v1/sessions/start", json={"user_id": "budget-ingest"}).json()["session_id"]
+    now = datetime.now(timezone.utc)
+    
+    resp = client.post("/v1/metrics/batch", json={
+        "session_id": session_id,
+        "metrics": [{"t": (now + timedelta(seconds=i)).isoformat(), "hr": 120} for i in range(200)]
+    })
+    assert resp.status_code == 200
+    # Rows are written with batched INSERTs, not one statement per row
+    assert int(resp.headers["x-db-queries"]) <= 2
+    assert float(resp.headers["x-db-time-ms"]) >= 0
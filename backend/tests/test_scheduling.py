@@ -0,0 +1,102 @@
+import time
+from collections import Counter
+
+from sqlalchemy.orm import sessionmaker
+
+from app.celery_app import personalization_schedule
+from app.db.models import TaskLock
+from app.workers import personalize
+from app.workers.locks import DatabaseLock, task_lock, task_locks
+from app.workers.personalize import slot_for_user
+
+
+def test_database_lock_excludes_concurrent_holders(db_session):
+    factory = sessionmaker(bind=db_session.get_bind())
+    first = DatabaseLock(factory, "test-lock", ttl=60)
+    second = DatabaseLock(factory, "test-lock", ttl=60)
+    
+    assert first.acquire()
+    assert not second.acquire()
+    first.release()
+    assert second.acquire()
+    second.release()
+
+
+def test_expired_lock_can_be_taken_over(db_session):
+    factory = sessionmaker(bind=db_session.get_bind())
+    stale = DatabaseLock(factory, "expiring-lock", ttl=0)
+    assert stale.acquire()
+    time.sleep(0.01)
+    
+    fresh = DatabaseLock(factory, "expiring-lock", ttl=60)
+    assert fresh.acquire()
+    
+    # The stale holder's release must not drop the new holder's lock
+    stale.release()
+    assert not DatabaseLock(factory, "expiring-lock", ttl=60).acquire()
+    fresh.release()
+
+
+def test_run_is_skipped_while_slot_is_locked(db_session, monkeypatch):
+    factory = sessionmaker(bind=db_session.get_bind())
+    monkeypatch.setattr(personalize, "SessionLocal", factory)
+    
+    with task_lock("personalization:slot:2", factory) as acquired:
+        assert acquired
+        result = personalize.run_personalization(slot=2)
+    
+    assert result["skipped"] is True
+
+
+def test_full_run_and_slot_runs_exclude_each_other(db_session, monkeypatch):
+    factory = sessionmaker(bind=db_session.get_bind())
+    monkeypatch.setattr(personalize, "SessionLocal", factory)
+    monkeypatch.setattr(personalize.settings, "personalization_slots", 3)
+    
+    with task_lock("personalization:slot:1", factory):
+        assert personalize.run_personalization()["skipped"] is True
+    # The slot locks taken before the busy one were released again
+    with task_locks(["personalization:slot:0", "personalization:slot:2"], factory) as acquired:
+        assert acquired
+    
+    with task_locks([f"personalization:slot:{s}" for s in range(3)], factory):
+        assert personalize.run_personalization(slot=2)["skipped"] is True
+
+
+def test_held_locks_are_extended(db_session):
+    factory = sessionmaker(bind=db_session.get_bind())
+    lock = DatabaseLock(factory, "extended-lock", ttl=1)
+    assert lock.acquire()
+    first_expiry = db_session.get(TaskLock, "extended-lock").expires_at
+    time.sleep(0.01)
+    
+    assert lock.extend()
+    db_session.expire_all()
+    assert db_session.get(TaskLock, "extended-lock").expires_at > first_expiry
+    lock.release()
+    assert not lock.extend()
+    
+    with task_locks(["renewed-lock"], factory, ttl=1) as acquired:
+        assert acquired
+        start = db_session.get(TaskLock, "renewed-lock").expires_at
+        time.sleep(0.5)
+        db_session.expire_all()
+        assert db_session.get(TaskLock, "renewed-lock").expires_at > start
+    db_session.expire_all()
+    assert db_session.get(TaskLock, "renewed-lock") is None
+
+
+def test_users_spread_across_slots():
+    slots = Counter(slot_for_user(f"user-{i}", 6) for i in range(6000))
+    
+    assert set(slots) == set(range(6))
+    assert min(slots.values()) > 800
+    assert slot_for_user("user-42", 6) == slot_for_user("user-42", 6)
+
+
+def test_beat_schedule_staggers_slots():
+    schedule = personalization_schedule(3, 23)
+    
+    hours = [entry["schedule"].hour for entry in schedule.values()]
+    assert hours == [{23}, {0}, {1}]
+    assert [entry["args"] for entry in schedule.values()] == [(0,), (1,), (2,)]
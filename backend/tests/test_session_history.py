@@ -0,0 +1,65 @@
+from datetime import datetime, timezone, timedelta
+
+
+def _starts(count):
+    # Pairs of sessions share a start time so the id breaks ties
+    base = datetime(2025, 3, 1, 8, 0, tzinfo=timezone.utc)
+    return [base + timedelta(hours=i // 2) for i in range(count)]
+
+
+def test_keyset_pagination_walks_all_sessions(client, db_session, seed_history):
+    seed_history(db_session, "history-user", _starts(11), ended=True)
+    
+    seen = []
+    cursor = None
+    while True:
+        params = {"limit": 4}
+        if cursor:
+            params["cursor"] = cursor
+        resp = client.get("/v1/users/history-user/sessions", params=params)
+        assert resp.status_code == 200
+        page = resp.json()
+        seen.extend(item["session_id"] for item in page["items"])
+        cursor = page["next_cursor"]
+        if cursor is None:
+            break
+    
+    assert seen == [f"history-user-s{i:02d}" for i in reversed(range(11))]
+
+
+def test_time_range_filter(client, db_session, seed_history):
+    seed_history(db_session, "range-user", _starts(6), ended=True)
+    
+    resp = client.get("/v1/users/range-user/sessions", params={
+        "since": "2025-03-01T09:00:00+00:00",
+        "until": "2025-03-01T10:00:00+00:00"
+    })
+    
+    assert [item["session_id"] for item in resp.json()["items"]] == ["range-user-s03", "range-user-s02"]
+
+
+def test_history_includes_session_summary(client):
+    session_id = client.post("/v1/sessions/start", json={"user_id": "summary-user"}).json()["session_id"]
+    now = datetime.now(timezone.utc).isoformat()
+    client.post("/v1/metrics/batch", json={
+        "session_id": session_id,
+        "metrics": [
+            {"t": now, "hr": 120, "rep": 4, "rom": 0.8},
+            {"t": now, "hr": 140, "rep": 6, "rom": 0.6},
+        ]
+    })
+    client.post("/v1/sessions/end", json={"session_id": session_id})
+    
+    item = client.get("/v1/users/summary-user/sessions").json()["items"][0]
+    assert item["session_id"] == session_id
+    assert item["metric_count"] == 2
+    assert item["total_reps"] == 10
+    assert item["avg_hr"] == 130
+
+
+def test_history_errors(client):
+    assert client.get("/v1/users/nobody-here/sessions").status_code == 404
+    
+    client.post("/v1/sessions/start", json={"user_id": "cursor-user"})
+    resp = client.get("/v1/users/cursor-user/sessions", params={"cursor": "not-a-cursor"})
+    assert resp.status_code == 400
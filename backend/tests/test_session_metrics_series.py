@@ -0,0 +1,81 @@
+from datetime import datetime, timezone
+
+import numpy as np
+
+from app.analytics.downsample import lttb, time_bucket
+
+
+def test_lttb_keeps_endpoints_and_size():
+    x = np.arange(1000, dtype=np.float64)
+    y = np.sin(x / 50.0)
+    y[437] = 10.0  # A spike must survive downsampling
+    
+    sx, sy = lttb(x, y, 100)
+    
+    assert len(sx) == 100
+    assert sx[0] == 0 and sx[-1] == 999
+    assert np.all(np.diff(sx) > 0)
+    assert 10.0 in sy
+
+
+def test_lttb_returns_short_series_unchanged():
+    x = np.arange(5, dtype=np.float64)
+    sx, sy = lttb(x, x * 2, 10)
+    assert list(sx) == list(x)
+
+
+def test_time_bucket_averages_and_skips_missing():
+    x = np.array([0.0, 1.0, 2.0, 3.0, 10.0])
+    hr = np.array([100.0, 110.0, np.nan, 130.0, 90.0])
+    
+    starts, means, counts = time_bucket(x, {"hr": hr}, 2.0)
+    
+    assert list(starts) == [0.0, 2.0, 10.0]
+    assert list(means["hr"]) == [105.0, 130.0, 90.0]
+    assert list(counts) == [2, 2, 1]
+
+
+def _seed_metrics(seed_history, db, session_id, samples):
+    seed_history(
+        db, f"{session_id}-user", [datetime(2025, 3, 1, 8, 0, tzinfo=timezone.utc)], session_ids=[session_id],
+        metrics=samples, metric=lambda i: {"hr": 100 + i % 20, "rom": 0.5, "tempo": None if i % 2 else 1.2}
+    )
+
+
+def test_metrics_endpoint_lttb(client, db_session, seed_history):
+    _seed_metrics(seed_history, db_session, "series-session", 300)
+    
+    resp = client.get("/v1/sessions/series-session/metrics", params={"points": 50})
+    assert resp.status_code == 200
+    body = resp.json()
+    assert body["mode"] == "lttb"
+    assert body["source_points"] == 300
+    assert len(body["series"]["hr"]) == 50
+    # tempo has only 150 samples; missing values are not charted
+    assert len(body["series"]["tempo"]) == 50
+
+
+def test_metrics_endpoint_buckets(client, db_session, seed_history):
+    _seed_metrics(seed_history, db_session, "bucket-session", 120)
+    
+    resp = client.get("/v1/sessions/bucket-session/metrics", params={"bucket": 60})
+    assert resp.status_code == 200
+    body = resp.json()
+    assert body["mode"] == "bucket"
+    assert body["bucket_seconds"] == 60
+    assert [p["value"] for p in body["series"]["rom"]] == [0.5, 0.5]
+    assert [p["value"] for p in body["series"]["hr"]] == [109.5, 109.5]
+
+
+def test_metrics_endpoint_widens_tiny_buckets(client, db_session, seed_history):
+    _seed_metrics(seed_history, db_session, "tiny-bucket-session", 400)
+    
+    for params in ({"bucket": 0.001, "points": 50}, {"mode": "bucket", "points": 50}):
+        body = client.get("/v1/sessions/tiny-bucket-session/metrics", params=params).json()
+        assert body["mode"] == "bucket"
+        assert len(body["series"]["hr"]) <= 50
+        assert body["bucket_seconds"] >= 399 / 49
+
+
+def test_metrics_endpoint_unknown_session(client):
+    assert client.get("/v1/sessions/nope/metrics").status_code == 404
@@ -0,0 +1,135 @@
+from datetime import datetime, timezone, timedelta
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.config import settings
+from app.db.models import PersonalizationEvent, User
+from app.main import app
+from app.observability import tracing
+from app.workers.events import claim_due_events, enqueue_repersonalization
+
+
+@pytest.fixture
+def tracing_on(monkeypatch):
+    monkeypatch.setattr(settings, "tracing_enabled", True)
+    monkeypatch.setattr(settings, "trace_sample_rate", 1.0)
+    tracing.spans.clear()
+    yield
+    tracing.spans.clear()
+
+
+def test_spans_nest_and_continue_remote_parent(tracing_on):
+    parent = "00-" + "a" * 32 + "-" + "b" * 16 + "-01"
+    with tracing.trace("job", parent) as root:
+        with tracing.span("step", n=1) as step:
+            assert tracing.current_traceparent() == step.traceparent
+    
+    recorded = tracing.spans.trace("a" * 32)
+    assert [s["name"] for s in recorded] == ["job", "step"]
+    assert recorded[0]["parent_id"] == "b" * 16
+    assert recorded[1]["parent_id"] == root.span_id
+    assert recorded[1]["attributes"] == {"n": 1}
+
+
+def test_inbound_parents_respect_flags_and_sample_rate(client, tracing_on, monkeypatch):
+    unsampled = "00-" + "c" * 32 + "-" + "d" * 16 + "-00"
+    sampled = "00-" + "e" * 32 + "-" + "f" * 16 + "-01"
+    
+    assert "x-trace-id" not in client.get("/healthz", headers={"traceparent": unsampled}).headers
+    with tracing.trace("job", unsampled) as root:
+        assert root is None
+    
+    # Clients cannot force recording past the sample rate
+    monkeypatch.setattr(settings, "trace_sample_rate", 0.0)
+    assert "x-trace-id" not in client.get("/healthz", headers={"traceparent": sampled}).headers
+    # Our own workers' sampled context always continues
+    with tracing.trace("job", sampled) as root:
+        assert root is not None
+    
+    monkeypatch.setattr(settings, "trace_sample_rate", 1.0)
+    assert client.get("/healthz", headers={"traceparent": sampled}).headers["x-trace-id"] == "e" * 32
+
+
+def test_nothing_recorded_when_disabled(monkeypatch):
+    monkeypatch.setattr(settings, "tracing_enabled", False)
+    tracing.spans.clear()
+    with tracing.trace("job") as root:
+        with tracing.span("step") as step:
+            pass
+    assert root is None and step is None
+    assert tracing.spans.recent_traces(10) == []
+
+
+def test_spans_are_mirrored_to_one_open_trace_file(tracing_on, tmp_path, monkeypatch):
+    import json
+    first, second = tmp_path / "first.jsonl", tmp_path / "second.jsonl"
+    monkeypatch.setattr(settings, "trace_file", str(first))
+    with tracing.trace("job"):
+        with tracing.span("step"):
+            pass
+    handle = tracing.spans._file
+    with tracing.trace("again"):
+        pass
+    assert tracing.spans._file is handle
+    
+    monkeypatch.setattr(settings, "trace_file", str(second))
+    with tracing.trace("moved"):
+        pass
+    tracing.spans.close()
+    assert handle.closed
+    assert [json.loads(line)["name"] for line in first.read_text().splitlines()] == ["step", "job", "again"]
+    assert [json.loads(line)["name"] for line in second.read_text().splitlines()] == ["moved"]
+
+
+def test_ingest_request_trace(client, tracing_on):
+    session_id = client.post("/v1/sessions/start", json={"user_id": "traced-user"}).json()["session_id"]
+    now = datetime.now(timezone.utc)
+    resp = client.post("/v1/metrics/batch", json={
+        "session_id": session_id,
+        "metrics": [{"t": (now + timedelta(seconds=i)).isoformat(), "hr": 120} for i in range(10)]
+    })
+    trace_id = resp.headers["x-trace-id"]
+    
+    listing = client.get("/v1/admin/traces").json()["items"]
+    assert any(t["trace_id"] == trace_id and t["root"] == "POST /v1/metrics/batch" for t in listing)
+    
+    trace = client.get(f"/v1/admin/traces/{trace_id}").json()["spans"]
+    by_id = {s["span_id"]: s for s in trace}
+    names = [s["name"] for s in trace]
+    for name in ("POST /v1/metrics/batch", "metrics.ingest_batch", "orm.flush", "db.commit", "db.query"):
+        assert name in names
+    # The INSERT runs inside the flush, inside the commit, inside the handler
+    insert = next(s for s in trace if s["name"] == "db.query" and s["attributes"]["statement"].startswith("INSERT"))
+    chain = []
+    span = insert
+    while span["parent_id"] in by_id:
+        span = by_id[span["parent_id"]]
+        chain.append(span["name"])
+    assert chain == ["orm.flush", "db.commit", "metrics.ingest_batch", "POST /v1/metrics/batch"]
+
+
+def test_events_carry_trace_context_to_worker(db_session, tracing_on):
+    db_session.add(User(id="traced-event-user"))
+    db_session.commit()
+    
+    with tracing.trace("POST /v1/sessions/end") as request_span:
+        enqueue_repersonalization(db_session, "traced-event-user")
+        db_session.commit()
+    assert db_session.get(PersonalizationEvent, "traced-event-user").trace_context == request_span.traceparent
+    
+    with tracing.trace("process_personalization_events") as run_span:
+        claimed = claim_due_events(db_session, user_ids=["traced-event-user"])
+    assert list(claimed) == ["traced-event-user"]
+    assert run_span.links == [request_span.traceparent]
+
+
+def test_traces_need_admin_token(tracing_on, monkeypatch):
+    monkeypatch.setattr(settings, "debug", False)
+    anonymous = TestClient(app)
+    assert anonymous.get("/v1/admin/traces").status_code == 403
+    assert anonymous.get("/v1/admin/traces/" + "0" * 32).status_code == 403
+
+
+def test_unknown_trace(client):
+    assert client.get("/v1/admin/traces/" + "0" * 32).status_code == 404
@@ -0,0 +1,116 @@
+import json
+import threading
+from datetime import datetime, timezone
+
+import pytest
+
+from app.config import settings
+from app.main import app
+from app.observability import capture
+
+
+@pytest.fixture
+def capturing(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "traffic_capture_enabled", True)
+    monkeypatch.setattr(settings, "traffic_capture_dir", str(tmp_path))
+    monkeypatch.setattr(capture, "capture_log", capture.CaptureLog())
+    return tmp_path
+
+
+def test_anonymize_is_stable_and_hides_the_id():
+    assert capture.anonymize("athlete-1") == capture.anonymize("athlete-1")
+    assert capture.anonymize("athlete-1") != capture.anonymize("athlete-2")
+    assert "athlete" not in capture.anonymize("athlete-1")
+    assert capture.anonymize_body({"user_id": "a", "items": [{"user_id": "b"}]}) == {
+        "user_id": capture.anonymize("a"), "items": [{"user_id": capture.anonymize("b")}]
+    }
+
+
+def test_capture_records_ingest_with_pseudonymous_users(client, capturing):
+    session_id = client.post("/v1/sessions/start", json={"user_id": "captured-athlete"}).json()["session_id"]
+    now = datetime.now(timezone.utc).isoformat()
+    client.post("/v1/metrics/batch", json={"session_id": session_id, "metrics": [{"t": now, "hr": 130}]})
+    client.post("/v1/sessions/end", json={"session_id": session_id})
+    client.get("/v1/plans/today", params={"user_id": "captured-athlete"})
+    capture.capture_log.flush()
+
+    records = capture.read_capture([capturing])
+    assert [(r["m"], r["p"], r["st"]) for r in records] == [
+        ("POST", "/v1/sessions/start", 200),
+        ("POST", "/v1/metrics/batch", 200),
+        ("POST", "/v1/sessions/end", 200)
+    ]
+    start, batch, end = records
+    assert start["b"] == {"user_id": capture.anonymize("captured-athlete")}
+    assert start["sid"] == session_id
+    assert batch["b"]["session_id"] == session_id
+    assert batch["b"]["metrics"][0]["hr"] == 130
+    assert start["ts"] <= batch["ts"] <= end["ts"]
+    assert all(r["ms"] >= 0 for r in records)
+    assert "captured-athlete" not in (capturing / capture.capture_log.name).read_bytes().decode("latin-1")
+
+
+def test_capture_pseudonymizes_path_and_query_user_ids(client, capturing, monkeypatch):
+    monkeypatch.setattr(settings, "traffic_capture_paths", ["/v1/"])
+    client.get("/v1/users/captured-athlete/sessions", params={"limit": 5})
+    client.get("/v1/plans/today", params={"user_id": "captured-athlete"})
+    capture.capture_log.flush()
+
+    history, plan = capture.read_capture([capturing])
+    pseudonym = capture.anonymize("captured-athlete")
+    assert history["p"] == f"/v1/users/{pseudonym}/sessions"
+    assert history["q"] == "limit=5"
+    assert plan["q"] == f"user_id={pseudonym}"
+
+
+def test_no_captured_route_records_a_raw_user_id(client, capturing, monkeypatch):
+    monkeypatch.setattr(settings, "traffic_capture_paths", ["/v1/"])
+    user_id = "raw-capture-athlete"
+    session_id = client.post("/v1/sessions/start", json={"user_id": user_id}).json()["session_id"]
+    now = datetime.now(timezone.utc).isoformat()
+    client.post("/v1/metrics/batch", json={"session_id": session_id, "metrics": [{"t": now, "hr": 120}]})
+    client.post("/v1/sessions/end", json={"session_id": session_id})
+    client.get("/v1/sessions/active")
+    client.get(f"/v1/sessions/{session_id}/metrics")
+    client.get("/v1/plans/today", params={"user_id": user_id})
+    client.get(f"/v1/users/{user_id}/sessions", params={"limit": 5})
+    client.get("/v1/account/export", params={"user_id": user_id})
+    job_id = client.post("/v1/account/delete", json={"user_id": user_id}).json()["job_id"]
+    client.get(f"/v1/account/delete/{job_id}")
+    capture.capture_log.flush()
+    
+    records = capture.read_capture([capturing])
+    assert len(records) == 10
+    assert not [r for r in records if user_id in json.dumps(r)]
+
+
+def test_path_parameters_that_may_hold_user_ids_are_named_user_id():
+    # Only a parameter named user_id is pseudonymized in captured paths;
+    # a new path parameter must be checked before it is added here
+    known = {"user_id", "session_id", "job_id", "run_id", "trace_id"}
+    for path, operations in app.openapi()["paths"].items():
+        for operation in operations.values():
+            names = {p["name"] for p in operation.get("parameters", []) if p["in"] == "path"}
+            assert names <= known, f"{path} has unreviewed path parameters {names - known}"
+
+
+def test_capture_writes_on_the_writer_thread(capturing, monkeypatch):
+    monkeypatch.setattr(settings, "traffic_capture_flush_records", 2)
+    log = capture.capture_log
+    writers = []
+    write = log._write
+    monkeypatch.setattr(log, "_write", lambda records: writers.append(threading.current_thread().name) or write(records))
+    
+    for i in range(5):
+        log.add({"ts": float(i), "m": "GET", "p": "/v1/x", "q": "", "st": 200})
+    log.flush()
+    
+    assert writers == ["capture-writer"] * 3
+    assert [r["ts"] for r in capture.read_capture([capturing])] == [0.0, 1.0, 2.0, 3.0, 4.0]
+
+
+def test_capture_is_off_by_default(client, tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "traffic_capture_dir", str(tmp_path))
+    client.post("/v1/sessions/start", json={"user_id": "uncaptured-athlete"})
+    capture.capture_log.flush()
+    assert list(tmp_path.iterdir()) == []
@@ -0,0 +1,127 @@
+import math
+import statistics
+from datetime import datetime, timezone, timedelta
+
+from app.analytics.summaries import summarize_session, summarize_sessions
+from app.analytics.workload import apply_session, merge_welford, workload_snapshot
+from app.db.models import UserTrainingState
+from app.workers.personalize import generate_personalized_plan
+
+
+def _summary(reps, hrv=(), hr=None):
+    hrv = list(hrv)
+    mean = statistics.mean(hrv) if hrv else None
+    return {
+        "metric_count": len(hrv),
+        "total_reps": reps,
+        "hrv_count": len(hrv),
+        "hrv_mean": mean,
+        "hrv_m2": sum((x - mean) ** 2 for x in hrv) if hrv else 0.0,
+        "avg_hr": hr
+    }
+
+
+def test_merge_welford_matches_batch_statistics():
+    a = [40.0, 42.5, 39.0, 45.0]
+    b = [50.0, 48.0, 52.5]
+    
+    sa = _summary(0, a)
+    sb = _summary(0, b)
+    count, mean, m2 = merge_welford(
+        sa["hrv_count"], sa["hrv_mean"], sa["hrv_m2"],
+        sb["hrv_count"], sb["hrv_mean"], sb["hrv_m2"]
+    )
+    
+    assert count == 7
+    assert math.isclose(mean, statistics.mean(a + b))
+    assert math.isclose(m2 / (count - 1), statistics.variance(a + b))
+
+
+def test_summary_hrv_m2_is_exact_for_large_values(db_session, seed_history):
+    hrv = [1e8, 1e8 + 1, 1e8 + 2]
+    started = datetime(2025, 6, 1, 7, 0, tzinfo=timezone.utc)
+    seed_history(db_session, "m2-user", [started, started], session_ids=["m2-session", "m2-empty"],
+                 metrics=[3, 0], metric=lambda i: {"hrv": hrv[i], "rep": 1})
+    
+    summary = summarize_session(db_session, "m2-session")
+    assert summary["hrv_count"] == 3 and summary["hrv_mean"] == 1e8 + 1
+    # sum(x²) - n·mean² gives 0.0 here; the deviations give the exact M2
+    assert summary["hrv_m2"] == 2.0
+    assert summarize_sessions(db_session, ["m2-session", "m2-empty"])["m2-empty"]["hrv_m2"] == 0.0
+
+
+def test_acute_chronic_ratio_spikes_after_heavy_week():
+    start = datetime(2025, 1, 1, tzinfo=timezone.utc)
+    state = UserTrainingState(user_id="workload-user")
+    
+    # Twelve weeks of steady training so the chronic load settles, then a heavy week
+    day = 0
+    for day in range(0, 84, 2):
+        apply_session(state, _summary(20, [45.0], 120.0), start + timedelta(days=day))
+    steady = workload_snapshot(state, start + timedelta(days=day))
+    
+    for extra in range(1, 8):
+        apply_session(state, _summary(80, [38.0], 140.0), start + timedelta(days=day + extra))
+    spiked = workload_snapshot(state, start + timedelta(days=day + 7))
+    
+    assert 0.8 < steady["acute_chronic_ratio"] < 1.3
+    assert spiked["acute_chronic_ratio"] > 1.5
+    assert spiked["hr_trend"] > 0
+    assert state.sessions_count == 49
+
+
+def test_end_session_updates_training_state(client, db_session):
+    user_id = "workload-api-user"
+    session_id = client.post("/v1/sessions/start", json={"user_id": user_id}).json()["session_id"]
+    now = datetime.now(timezone.utc).isoformat()
+    client.post("/v1/metrics/batch", json={
+        "session_id": session_id,
+        "metrics": [
+            {"t": now, "hr": 120, "hrv": 40.0, "rep": 5},
+            {"t": now, "hr": 130, "hrv": 44.0, "rep": 7},
+        ]
+    })
+    client.post("/v1/sessions/end", json={"session_id": session_id})
+    
+    state = db_session.get(UserTrainingState, user_id)
+    assert state.sessions_count == 1
+    assert state.acute_load == 12
+    assert state.hrv_count == 2
+    assert math.isclose(state.hrv_mean, 42.0)
+    assert math.isclose(state.hr_acute, 125.0)
+
+
+def test_plan_backs_off_on_load_spike():
+    analysis = {
+        "total_sessions": 4,
+        "total_reps": 60,
+        "hrv_baseline": 45.0,
+        "error_rate": 0.2,
+        "common_errors": {},
+        "acute_chronic_ratio": 1.8
+    }
+    
+    plan = generate_personalized_plan(analysis)
+    
+    assert plan["intensity"] < 1.0
+    assert "recovery" in plan["focus_areas"]
+
+
+def test_older_session_does_not_rewind_the_clock():
+    now = datetime(2025, 3, 1, tzinfo=timezone.utc)
+    in_order = UserTrainingState(user_id="ordered")
+    apply_session(in_order, _summary(70, hr=140.0), now - timedelta(days=3))
+    apply_session(in_order, _summary(100, hr=150.0), now)
+    
+    # The same sessions, the older one folded in last (a swept crashed session)
+    late = UserTrainingState(user_id="late")
+    apply_session(late, _summary(100, hr=150.0), now)
+    apply_session(late, _summary(70, hr=140.0), now - timedelta(days=3))
+    
+    assert late.updated_at == now
+    assert math.isclose(late.acute_load, in_order.acute_load)
+    assert math.isclose(late.chronic_load, in_order.chronic_load)
+    assert late.hr_acute == 150.0
+    
+    snapshot = workload_snapshot(late, now + timedelta(days=1))
+    assert math.isclose(snapshot["acute_load"], workload_snapshot(in_order, now + timedelta(days=1))["acute_load"])
@@ -15,6 +15,7 @@ from typing import List, Optional
 
 # Simple in-memory storage for demo
 sessions_db = {}
+active_session_ids = set()  # sessions without ended_at, so /stats needn't scan sessions_db
 metrics_db = []
 users_db = set()
 
@@ -92,6 +93,7 @@ def start_session(payload: SessionStartRequest):
         "started_at": now,
         "ended_at": None
     }
+    active_session_ids.add(session_id)
     users_db.add(payload.user_id)
     
     return SessionStartResponse(session_id=session_id, started_at=now)
@@ -102,6 +104,7 @@ def end_session(payload: SessionEndRequest):
     
     if payload.session_id in sessions_db:
         sessions_db[payload.session_id]["ended_at"] = now
+        active_session_ids.discard(payload.session_id)
     
     return SessionEndResponse(session_id=payload.session_id, ended_at=now)
 
@@ -137,6 +140,7 @@ def delete_account(payload: AccountDeleteRequest):
     user_sessions = [sid for sid, data in sessions_db.items() if data["user_id"] == payload.user_id]
     for session_id in user_sessions:
         del sessions_db[session_id]
+        active_session_ids.discard(session_id)
     
     # Remove metrics
     global metrics_db
@@ -157,7 +161,7 @@ def get_stats():
         "total_users": len(users_db),
         "total_sessions": len(sessions_db),
         "total_metrics": len(metrics_db),
-        "active_sessions": len([s for s in sessions_db.values() if s["ended_at"] is None])
+        "active_sessions": len(active_session_ids)
     }
 
 if __name__ == "__main__":